@@ -1,33 +1,154 @@
 import os
-import json
-import shutil
-import subprocess
 import time
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response
+import uuid
+import subprocess
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, g, session
+from werkzeug.http import is_resource_modified
 from werkzeug.utils import secure_filename
 
 # Import our modules
 from config import (
-    CONFIG_FILE, UPLOAD_FOLDER, WORKSPACES_DIR, 
-    load_config, save_config, load_tasks, save_tasks
+    CONFIG_FILE, UPLOAD_FOLDER,
+    load_config, save_config
+)
+from task_cache import (
+    task_repository, get_task, update_task, remove_task
 )
-from claude_cli import (
-    run_claude_command, run_claude_command_streaming, 
-    get_output_file_path, read_streaming_output
+from artifact_store import ARTIFACT_FILES, artifact_size, read_artifact, stream_artifact, delete_artifacts
+from jobs import job_queue, submit_job, get_job, task_lock
+from task_actions import (
+    start_task_job, action_job, action_streaming_job, followup_job,
+    diff_job, complete_streaming_job, push_job, restore_workspace_job
 )
-from git_utils import get_git_diff, create_git_branch_and_push
-from utils import allowed_file, get_priority_order, process_csv_file
+from git_mirror import update_mirror, get_mirror_status
+from workspace_pool import workspace_pool
+from workspace_manager import workspace_manager, get_bundle_path
+from scheduler import agent_scheduler
+from stream_broker import HEARTBEAT_INTERVAL, stream_broker, run_pending
+from claude_cli import get_output_file_path, get_stderr_file_path
+from process_io import get_process_stats, read_stderr_tail
+from resource_governor import resource_monitor
+from output_summary import get_summary
+from log_retention import COMPRESSED_SUFFIX, log_retention, log_size
+from diff_service import (
+    DEFAULT_FILES_PER_PAGE, DEFAULT_LINES_PER_PAGE, DiffError, list_diff_files, paginate_files, get_file_diff
+)
+from diff_cache import cached_diff, diff_cache
+from task_query import FACET_FIELDS, DEFAULT_LIMIT, QueryError, task_query
+from batches import (DEFAULT_BATCH_PARALLELISM, DEFAULT_PROMPT_TEMPLATE, select_tasks, start_batch, get_batch_status,
+                     validate_prompt_template)
+from csv_import import import_csv_job
+from utils import allowed_file
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REQUEST_DURATION, registry as metrics_registry
+from page_cache import page_cache
 
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
 
+@app.before_request
+def start_background_services():
+    # Started on the first request so the debug reloader's parent process stays idle
+    workspace_pool.start()
+    agent_scheduler.start()
+    log_retention.start()
+    workspace_manager.start()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.monotonic()
+
+@app.after_request
+def record_request_duration(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Labelled by the route pattern so task ids do not create a series each
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_DURATION.observe(time.monotonic() - started, route=route, method=request.method,
+                                 status=response.status_code)
+    return response
+
+# Gauges read from each component when /metrics is scraped
+metrics_registry.gauge('claude_processes_running', 'Claude processes whose output is being read',
+                       lambda: len(get_process_stats()))
+metrics_registry.gauge('agent_slots_in_use', 'Agent runs holding a scheduler slot',
+                       lambda: agent_scheduler.stats()['running'])
+metrics_registry.gauge('agent_runs_queued', 'Agent runs waiting for a scheduler slot',
+                       lambda: agent_scheduler.stats()['queued'])
+metrics_registry.gauge('sse_connections_open', 'Open live output (SSE) connections',
+                       lambda: sum(stream['subscribers'] for stream in stream_broker.stats().values()))
+metrics_registry.gauge('workspace_disk_bytes', 'Disk used by task workspaces',
+                       lambda: workspace_manager.stats()['total_size'])
+
+def conditional_page(key, parts, render):
+    """
+    Respond with 304 if the browser has the current version of a page, else
+    with its cached or freshly rendered body. parts describes everything the
+    page shows (see page_cache.py).
+    """
+    if session.get('_flashes'):
+        # Pending flash messages are shown once; that rendering must not be reused
+        response = Response(render(), mimetype='text/html')
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    
+    etag, last_modified = page_cache.validate(key, parts)
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        page_cache.record_not_modified()
+        return validated(Response(status=304), etag, last_modified)
+    return validated(Response(page_cache.get_or_render(key, etag, render), mimetype='text/html'), etag, last_modified)
+
+def validated(response, etag, last_modified):
+    """Add the validators of a conditional GET response"""
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # Browsers must revalidate instead of guessing a freshness lifetime from Last-Modified
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def job_summary(job):
+    """The fields of a job that pages show"""
+    return {field: job.get(field) for field in ('id', 'kind', 'status', 'message')} if job else None
+
 @app.route('/')
 def index():
-    tasks = load_tasks()
-    # Sort tasks by priority (High, Medium, Low)
-    tasks = sorted(tasks, key=lambda x: get_priority_order(x.get('priority', 'Medium')))
+    # Rows are fetched a page at a time from /api/tasks
     config = load_config()
-    return render_template('index.html', tasks=tasks, config=config)
+    import_job = get_job(request.args.get('import_job') or '')
+    
+    def render():
+        return render_template('index.html', facets=task_query.facets(), config=config, import_job=import_job,
+                               default_prompt_template=config.get('batch_prompt_template', DEFAULT_PROMPT_TEMPLATE))
+    
+    return conditional_page(('index', request.args.get('import_job')),
+                            [task_repository.version(), config, job_summary(import_job)], render)
+
+@app.route('/api/tasks')
+def list_tasks():
+    """A page of tasks filtered by ?status=&priority=&assignee=&state= (repeatable) and ?q=.
+
+    Sorted by ?sort= (priority, created, ticket, status or assignee; prefix '-'
+    for descending). Archived tasks are included with ?archived=1. Pass the
+    returned next_cursor as ?cursor= for the next page.
+    """
+    # A result only depends on the query string and the task list version
+    etag, last_modified = page_cache.validate(('api_tasks', request.query_string), [task_repository.version()])
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        page_cache.record_not_modified()
+        return validated(Response(status=304), etag, last_modified)
+    
+    filters = {field: request.args.getlist(field) for field in FACET_FIELDS}
+    try:
+        limit = int(request.args.get('limit') or DEFAULT_LIMIT)
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+    try:
+        result = task_query.query(filters, q=request.args.get('q', ''),
+                                  sort=request.args.get('sort') or 'priority',
+                                  cursor=request.args.get('cursor'), limit=limit,
+                                  archived=request.args.get('archived') == '1')
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    return validated(jsonify(result), etag, last_modified)
 
 @app.route('/config', methods=['GET', 'POST'])
 def config():
@@ -43,12 +164,63 @@ def config():
         # Handle skip permissions setting
         config['skip_permissions'] = 'skip_permissions' in request.form
         
+        # Handle repository mirror settings
+        config['use_mirror'] = 'use_mirror' in request.form
+        config['mirror_fetch_interval'] = int(request.form.get('mirror_fetch_interval') or 60)
+        config['workspace_pool_size'] = int(request.form.get('workspace_pool_size') or 0)
+        config['workspace_pool_low_water'] = int(request.form.get('workspace_pool_low_water') or 0)
+        
+        # Handle agent concurrency limit
+        config['max_concurrent_agents'] = max(1, int(request.form.get('max_concurrent_agents') or 1))
+        config['batch_parallelism'] = max(1, int(request.form.get('batch_parallelism') or 1))
+        
+        # Handle output log retention
+        config['log_compress_after_hours'] = max(0.0, float(request.form.get('log_compress_after_hours') or 0))
+        config['log_delete_after_days'] = max(0.0, float(request.form.get('log_delete_after_days') or 0))
+        config['workspace_disk_budget_gb'] = max(0.0, float(request.form.get('workspace_disk_budget_gb') or 0))
+        
+        # Handle agent resource limits
+        config['agent_nice'] = min(19, max(0, int(request.form.get('agent_nice') or 0)))
+        config['agent_ionice_class'] = int(request.form.get('agent_ionice_class') or 0)
+        config['agent_memory_limit_mb'] = max(0, int(request.form.get('agent_memory_limit_mb') or 0))
+        config['agent_max_open_files'] = max(0, int(request.form.get('agent_max_open_files') or 0))
+        config['agent_cpu_affinity'] = request.form.get('agent_cpu_affinity', '').strip()
+        
+        # Handle the Claude simulator used for offline load testing
+        config['claude_simulator'] = 'claude_simulator' in request.form
+        config['simulator_events'] = max(1, int(request.form.get('simulator_events') or 60))
+        config['simulator_rate'] = max(0.0, float(request.form.get('simulator_rate') or 0))
+        config['simulator_event_size'] = max(1, int(request.form.get('simulator_event_size') or 400))
+        config['simulator_edit_files'] = max(0, int(request.form.get('simulator_edit_files') or 0))
+        config['simulator_failure_rate'] = min(1.0, max(0.0, float(request.form.get('simulator_failure_rate') or 0)))
+        config['simulator_hang_rate'] = min(1.0, max(0.0, float(request.form.get('simulator_hang_rate') or 0)))
+        
         save_config(config)
         flash('Configuration updated successfully', 'success')
         return redirect(url_for('index'))
     
     config = load_config()
-    return render_template('config.html', config=config)
+    mirror_status = get_mirror_status(config.get('github_repo'))
+    return render_template('config.html', config=config, mirror_status=mirror_status,
+                           pool_stats=workspace_pool.stats(), scheduler_stats=agent_scheduler.stats(),
+                           batch_parallelism=config.get('batch_parallelism', DEFAULT_BATCH_PARALLELISM),
+                           log_retention_stats=log_retention.stats(),
+                           workspace_stats=workspace_manager.stats())
+
+@app.route('/config/mirror/fetch', methods=['POST'])
+def fetch_mirror():
+    """Create or refresh the local mirror of the configured repository"""
+    config = load_config()
+    if not config.get('github_repo'):
+        flash('GitHub repository not configured', 'error')
+        return redirect(url_for('config'))
+    
+    try:
+        update_mirror(config['github_repo'], force=True)
+        flash('Repository mirror updated', 'success')
+    except subprocess.CalledProcessError as e:
+        flash(f'Error updating mirror: {e.stderr}', 'error')
+    return redirect(url_for('config'))
 
 @app.route('/upload_csv', methods=['POST'])
 def upload_csv():
@@ -63,88 +235,174 @@ def upload_csv():
         return redirect(url_for('index'))
     
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
+        # Unique name so concurrent uploads of the same file do not collide
+        filename = f"{uuid.uuid4().hex}-{secure_filename(file.filename)}"
         filepath = os.path.join(UPLOAD_FOLDER, filename)
         file.save(filepath)
         
-        # Load configuration and existing tasks
-        config = load_config()
-        tasks = load_tasks()
-        existing_tickets = {task['ticket'] for task in tasks}
-        
-        try:
-            new_tasks, new_tasks_count, skipped_tasks_count, error_rows = process_csv_file(
-                filepath, config, existing_tickets
-            )
-            
-            # Add new tasks to existing tasks
-            tasks.extend(new_tasks)
-            save_tasks(tasks)
-            
-            # Log any errors
-            if error_rows:
-                print(f"Errors in CSV rows: {error_rows}")
-            
-            # Show appropriate message based on results
-            if new_tasks_count > 0:
-                if skipped_tasks_count > 0:
-                    flash(f'Added {new_tasks_count} new tasks from CSV. Skipped {skipped_tasks_count} tasks due to assignee filtering.', 'success')
-                else:
-                    flash(f'Added {new_tasks_count} new tasks from CSV', 'success')
-            else:
-                if skipped_tasks_count > 0:
-                    flash(f'No tasks added. Skipped {skipped_tasks_count} tasks due to assignee filtering.', 'warning')
-                else:
-                    flash('No new tasks found in CSV', 'warning')
-            
-        except Exception as e:
-            flash(f'Error processing CSV: {str(e)}', 'error')
-            print(f"CSV processing error: {str(e)}")
-        finally:
-            # Clean up the uploaded file
-            os.remove(filepath)
-        
-        return redirect(url_for('index'))
+        # Imported in the background; the home page follows the job's progress
+        job = submit_job('import', import_csv_job, None, filepath, 'start_imported' in request.form,
+                         'upsert' in request.form, 'archive_missing' in request.form)
+        return redirect(url_for('index', import_job=job.id))
     
     flash('Invalid file type. Please upload a CSV file.', 'error')
     return redirect(url_for('index'))
 
+def get_active_job(task):
+    """The task's queued or running job, if any"""
+    job = get_job(task['job_id']) if task.get('job_id') else None
+    return job if job and job['status'] in ('queued', 'running') else None
+
+def get_claude_stderr(task_id):
+    """Recent stderr lines of the task's latest streaming run"""
+    return '\n'.join(read_stderr_tail(get_stderr_file_path(get_output_file_path(task_id))))
+
+def file_version(path):
+    """(path, mtime, size) of a log file, plain or compressed, or None if there is none"""
+    for candidate in (path, path + COMPRESSED_SUFFIX):
+        try:
+            stat = os.stat(candidate)
+            return (candidate, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            continue
+    return None
+
+def task_page(template, task):
+    """Render a task page, or answer 304 if the browser's copy is still current"""
+    task_id = task['id']
+    job = get_active_job(task)
+    queue = agent_scheduler.queue_info(task_id)
+    stderr_path = get_stderr_file_path(get_output_file_path(task_id))
+    # Artifacts are referenced from the task record with their size and update time
+    parts = [task, job_summary(job), file_version(stderr_path),
+             {field: queue[field] for field in ('position', 'queue_length', 'running', 'max_concurrent')}
+             if queue else None]
+    
+    def render():
+        return render_template(template, task=task, job=job, queue=queue,
+                               claude_stderr=get_claude_stderr(task_id),
+                               claude_output=read_artifact(task, 'claude_output'),
+                               git_diff_size=artifact_size(task, 'git_diff'))
+    
+    return conditional_page((template, task_id), parts, render)
+
 @app.route('/task/<task_id>', methods=['GET'])
 def task_detail(task_id):
-    tasks = load_tasks()
-    task = next((t for t in tasks if t['id'] == task_id), None)
+    task = get_task(task_id)
     
     if not task:
         flash('Task not found', 'error')
         return redirect(url_for('index'))
     
-    return render_template('task_detail.html', task=task)
+    workspace_manager.touch(task_id)
+    return task_page('task_detail.html', task)
 
 @app.route('/task/<task_id>/streaming', methods=['GET'])
 def task_detail_streaming(task_id):
-    tasks = load_tasks()
-    task = next((t for t in tasks if t['id'] == task_id), None)
+    task = get_task(task_id)
     
     if not task:
         flash('Task not found', 'error')
         return redirect(url_for('index'))
     
-    return render_template('task_detail_streaming.html', task=task)
+    workspace_manager.touch(task_id)
+    return task_page('task_detail_streaming.html', task)
+
+@app.route('/task/<task_id>/artifacts/<name>', methods=['GET'])
+def task_artifact(task_id, name):
+    """Stream a stored artifact (claude_output or git_diff) straight from disk"""
+    task = get_task(task_id)
+    
+    if task is None or name not in ARTIFACT_FILES:
+        return jsonify({'error': 'Artifact not found'}), 404
+    
+    return Response(stream_artifact(task, name), mimetype='text/plain')
+
+@app.route('/task/<task_id>/queue', methods=['GET'])
+def task_queue_status(task_id):
+    """Report a queued task's position and estimated wait for an agent slot"""
+    task = get_task(task_id)
+    
+    if task is None:
+        return jsonify({'error': 'Task not found'}), 404
+    
+    info = agent_scheduler.queue_info(task_id) or {'queued': False}
+    info['status'] = task['status']
+    return jsonify(info)
+
+@app.route('/task/<task_id>/summary', methods=['GET'])
+def task_summary(task_id):
+    """Report the output summary (text, tool calls, result) of the task's streaming run, even while it runs"""
+    task = get_task(task_id)
+
+    if task is None:
+        return jsonify({'error': 'Task not found'}), 404
+
+    summary = get_summary(get_output_file_path(task_id))
+    if summary is None:
+        return jsonify({'error': 'No streaming output for this task'}), 404
+
+    result = summary.to_dict(include_text=request.args.get('text', '1') != '0')
+    result['status'] = task['status']
+    return jsonify(result)
+
+@app.route('/task/<task_id>/resources', methods=['GET'])
+def task_resources(task_id):
+    """Report the live resource usage of the task's Claude process, or the totals of its last run"""
+    if get_task(task_id) is None:
+        return jsonify({'error': 'Task not found'}), 404
+    
+    usage = resource_monitor.usage(get_output_file_path(task_id))
+    if usage is None:
+        return jsonify({'error': 'No Claude run recorded for this task'}), 404
+    return jsonify(usage)
+
+@app.route('/task/<task_id>/kill', methods=['POST'])
+def kill_task_process(task_id):
+    """Stop the task's Claude process and everything it started"""
+    if get_task(task_id) is None:
+        flash('Task not found', 'error')
+        return redirect(url_for('index'))
+    
+    if resource_monitor.kill(get_output_file_path(task_id)):
+        flash('Stopping the Claude process and its children', 'success')
+    else:
+        flash('No Claude process is running for this task', 'warning')
+    return redirect(url_for('task_detail_streaming', task_id=task_id))
 
 @app.route('/task/<task_id>/update_prompt', methods=['POST'])
 def update_prompt(task_id):
-    tasks = load_tasks()
-    task_index = next((i for i, t in enumerate(tasks) if t['id'] == task_id), None)
+    task = update_task(task_id, {'prompt': request.form['prompt']})
     
-    if task_index is None:
+    if task is None:
         flash('Task not found', 'error')
         return redirect(url_for('index'))
     
-    tasks[task_index]['prompt'] = request.form['prompt']
-    save_tasks(tasks)
     flash('Prompt updated successfully', 'success')
     return redirect(url_for('task_detail', task_id=task_id))
 
+def submit_task_job(task, kind, fn, *args):
+    """Submit a background job for a task unless one is already in progress"""
+    # Held from the check to recording the job id, so concurrent requests cannot both submit
+    with task_lock(task['id']):
+        current = get_task(task['id']) or task
+        if job_queue.is_active(current.get('job_id')):
+            return None
+        job = submit_job(kind, fn, task['id'], task['id'], *args)
+        update_task(task['id'], {'job_id': job.id})
+    workspace_manager.touch(task['id'])
+    return job
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Report the state of a background job"""
+    job = get_job(job_id)
+    
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify(job)
+
 @app.route('/task/<task_id>/start', methods=['POST'])
 def start_task(task_id):
     """Start a task with live streaming output"""
@@ -153,165 +411,175 @@ def start_task(task_id):
         flash('GitHub repository not configured', 'error')
         return redirect(url_for('task_detail', task_id=task_id))
     
-    tasks = load_tasks()
-    task_index = next((i for i, t in enumerate(tasks) if t['id'] == task_id), None)
+    task = get_task(task_id)
     
-    if task_index is None:
+    if task is None:
         flash('Task not found', 'error')
         return redirect(url_for('index'))
     
-    task = tasks[task_index]
-    
     if not task['prompt']:
         flash('Please add a prompt before starting the task', 'error')
         return redirect(url_for('task_detail', task_id=task_id))
     
-    # Create workspace directory
-    workspace_dir = os.path.join(WORKSPACES_DIR, task_id)
-    if os.path.exists(workspace_dir):
-        shutil.rmtree(workspace_dir)
-    os.makedirs(workspace_dir)
-    
-    # Clone repository
-    try:
-        subprocess.run(f'git clone {config["github_repo"]} .', shell=True, check=True, cwd=workspace_dir)
-    except subprocess.CalledProcessError as e:
-        flash(f'Error cloning repository: {e}', 'error')
-        return redirect(url_for('task_detail', task_id=task_id))
-    
-    # Get output file path
-    output_file_path = get_output_file_path(task_id)
-    
-    # Start Claude streaming process with skip permissions setting
-    skip_permissions = config.get('skip_permissions', False)
-    process = run_claude_command_streaming(task['prompt'], workspace_dir, output_file_path, skip_permissions)
-    
-    if process is None:
-        flash('Failed to start Claude process', 'error')
+    if task['status'] == 'queued':
+        flash('Task is already queued', 'error')
         return redirect(url_for('task_detail', task_id=task_id))
     
-    # Update task status
-    tasks[task_index]['status'] = 'streaming'
-    tasks[task_index]['workspace_dir'] = workspace_dir
-    save_tasks(tasks)
-    
-    flash('Task started successfully', 'success')
+    if submit_task_job(task, 'start', start_task_job) is None:
+        flash('Task already has a job in progress', 'error')
+    else:
+        flash('Task is starting', 'success')
     return redirect(url_for('task_detail', task_id=task_id))
 
 @app.route('/task/<task_id>/action', methods=['POST'])
 def action_task(task_id):
-    config = load_config()
-    tasks = load_tasks()
-    task_index = next((i for i, t in enumerate(tasks) if t['id'] == task_id), None)
+    task = get_task(task_id)
     
-    if task_index is None:
+    if task is None:
         flash('Task not found', 'error')
         return redirect(url_for('index'))
     
-    task = tasks[task_index]
-    
     if task['status'] != 'started':
         flash('Task must be started before it can be actioned', 'error')
         return redirect(url_for('task_detail', task_id=task_id))
     
-    # Run Claude in action mode with skip permissions setting
-    skip_permissions = config.get('skip_permissions', False)
-    claude_output = run_claude_command(task['prompt'], 'action', task['workspace_dir'], skip_permissions)
-    
-    # Get git diff
-    git_diff = get_git_diff(task['workspace_dir'])
-    
-    # Update task
-    tasks[task_index]['status'] = 'actioned'
-    tasks[task_index]['claude_output'] += "\n\n--- ACTION OUTPUT ---\n\n" + claude_output
-    tasks[task_index]['git_diff'] = git_diff
-    save_tasks(tasks)
-    
-    flash('Task actioned successfully', 'success')
+    if submit_task_job(task, 'action', action_job) is None:
+        flash('Task already has a job in progress', 'error')
+    else:
+        flash('Action queued', 'success')
     return redirect(url_for('task_detail', task_id=task_id))
 
 @app.route('/task/<task_id>/followup', methods=['POST'])
 def followup_prompt(task_id):
-    config = load_config()
-    tasks = load_tasks()
-    task_index = next((i for i, t in enumerate(tasks) if t['id'] == task_id), None)
+    task = get_task(task_id)
     
-    if task_index is None:
+    if task is None:
         flash('Task not found', 'error')
         return redirect(url_for('index'))
     
-    task = tasks[task_index]
-    
     if task['status'] != 'actioned':
         flash('Task must be actioned before adding a follow-up prompt', 'error')
         return redirect(url_for('task_detail', task_id=task_id))
     
-    followup_prompt = request.form['followup_prompt']
+    if submit_task_job(task, 'followup', followup_job, request.form['followup_prompt']) is None:
+        flash('Task already has a job in progress', 'error')
+    else:
+        flash('Follow-up prompt queued', 'success')
+    return redirect(url_for('task_detail', task_id=task_id))
+
+@app.route('/task/<task_id>/diff', methods=['POST'])
+def refresh_diff(task_id):
+    task = get_task(task_id)
+    
+    if task is None:
+        flash('Task not found', 'error')
+        return redirect(url_for('index'))
     
-    # Run Claude with the follow-up prompt with skip permissions setting
-    skip_permissions = config.get('skip_permissions', False)
-    claude_output = run_claude_command(followup_prompt, 'action', task['workspace_dir'], skip_permissions)
+    if not task.get('workspace_dir') or not os.path.exists(task['workspace_dir']):
+        flash('Task has no workspace', 'error')
+        return redirect(url_for('task_detail', task_id=task_id))
     
-    # Get updated git diff
-    git_diff = get_git_diff(task['workspace_dir'])
+    if submit_task_job(task, 'diff', diff_job) is None:
+        flash('Task already has a job in progress', 'error')
+    else:
+        flash('Diff refresh queued', 'success')
+    return redirect(url_for('task_detail', task_id=task_id))
+
+@app.route('/task/<task_id>/diff/files', methods=['GET'])
+def diff_files(task_id):
+    """List the files changed in the task's workspace with added/deleted line counts, a page at a time"""
+    task = get_task(task_id)
+
+    if task is None:
+        return jsonify({'error': 'Task not found'}), 404
+
+    workspace_dir = task.get('workspace_dir')
+    try:
+        files = cached_diff(workspace_dir, 'files', lambda: list_diff_files(workspace_dir))
+    except DiffError as e:
+        return jsonify({'error': str(e)}), 404
+
+    return jsonify(paginate_files(files, request.args.get('page', 1, type=int),
+                                  request.args.get('per_page', DEFAULT_FILES_PER_PAGE, type=int)))
+
+@app.route('/task/<task_id>/diff/file', methods=['GET'])
+def diff_file(task_id):
+    """One page of lines from a single file's diff (?path=, &offset=, &limit=)"""
+    task = get_task(task_id)
+
+    if task is None:
+        return jsonify({'error': 'Task not found'}), 404
+
+    path = request.args.get('path')
+    if not path:
+        return jsonify({'error': 'No file path given'}), 400
+
+    workspace_dir = task.get('workspace_dir')
+    offset = request.args.get('offset', 0, type=int)
+    limit = request.args.get('limit', DEFAULT_LINES_PER_PAGE, type=int)
+    try:
+        return jsonify(cached_diff(workspace_dir, f'file:{offset}:{limit}:{path}',
+                                   lambda: get_file_diff(workspace_dir, path, offset, limit)))
+    except DiffError as e:
+        return jsonify({'error': str(e)}), 404
+
+@app.route('/task/<task_id>/workspace/restore', methods=['POST'])
+def restore_workspace(task_id):
+    """Recreate a workspace that was evicted to stay within the disk budget"""
+    task = get_task(task_id)
     
-    # Update task
-    tasks[task_index]['claude_output'] += "\n\n--- FOLLOW-UP OUTPUT ---\n\n" + claude_output
-    tasks[task_index]['git_diff'] = git_diff
-    save_tasks(tasks)
+    if task is None:
+        flash('Task not found', 'error')
+        return redirect(url_for('index'))
     
-    flash('Follow-up prompt processed successfully', 'success')
+    if not task.get('workspace_evicted'):
+        flash('Workspace was not evicted', 'error')
+    elif submit_task_job(task, 'restore', restore_workspace_job) is None:
+        flash('Task already has a job in progress', 'error')
+    else:
+        flash('Workspace restore queued', 'success')
     return redirect(url_for('task_detail', task_id=task_id))
 
 @app.route('/task/<task_id>/push', methods=['POST'])
 def push_changes(task_id):
-    tasks = load_tasks()
-    task_index = next((i for i, t in enumerate(tasks) if t['id'] == task_id), None)
+    task = get_task(task_id)
     
-    if task_index is None:
+    if task is None:
         flash('Task not found', 'error')
         return redirect(url_for('index'))
     
-    task = tasks[task_index]
-    
     if task['status'] != 'actioned':
         flash('Task must be actioned before pushing changes', 'error')
         return redirect(url_for('task_detail', task_id=task_id))
     
-    # Create branch, commit and push changes
-    success, message = create_git_branch_and_push(
-        task['workspace_dir'], 
-        task['ticket'], 
-        task['task']
-    )
-    
-    if success:
-        # Update task status
-        tasks[task_index]['status'] = 'completed'
-        save_tasks(tasks)
-        flash(message, 'success')
+    # Create branch, commit and push changes in the background
+    if submit_task_job(task, 'push', push_job) is None:
+        flash('Task already has a job in progress', 'error')
     else:
-        flash(message, 'error')
-    
+        flash('Push queued', 'success')
     return redirect(url_for('task_detail', task_id=task_id))
 
 @app.route('/task/<task_id>/delete', methods=['POST'])
 def delete_task(task_id):
-    tasks = load_tasks()
-    task_index = next((i for i, t in enumerate(tasks) if t['id'] == task_id), None)
+    task = get_task(task_id)
     
-    if task_index is None:
+    if task is None:
         flash('Task not found', 'error')
         return redirect(url_for('index'))
     
-    # Remove workspace directory if it exists
-    workspace_dir = tasks[task_index].get('workspace_dir')
-    if workspace_dir and os.path.exists(workspace_dir):
-        shutil.rmtree(workspace_dir)
+    # Drop any run still waiting for an agent slot
+    agent_scheduler.cancel(task_id)
+    
+    # Move the workspace aside; it is deleted in the background
+    workspace_manager.discard(task.get('workspace_dir'))
+    if os.path.exists(get_bundle_path(task_id)):
+        os.remove(get_bundle_path(task_id))
+    
+    # Remove stored output and diff
+    delete_artifacts(task)
     
     # Remove task from list
-    del tasks[task_index]
-    save_tasks(tasks)
+    remove_task(task_id)
     
     flash('Task deleted successfully', 'success')
     return redirect(url_for('index'))
@@ -323,181 +591,200 @@ def start_task_streaming(task_id):
     if not config['github_repo']:
         return jsonify({'error': 'GitHub repository not configured'}), 400
     
-    tasks = load_tasks()
-    task_index = next((i for i, t in enumerate(tasks) if t['id'] == task_id), None)
+    task = get_task(task_id)
     
-    if task_index is None:
+    if task is None:
         return jsonify({'error': 'Task not found'}), 404
     
-    task = tasks[task_index]
-    
     if not task['prompt']:
         return jsonify({'error': 'Please add a prompt before starting the task'}), 400
     
-    # Create workspace directory
-    workspace_dir = os.path.join(WORKSPACES_DIR, task_id)
-    if os.path.exists(workspace_dir):
-        shutil.rmtree(workspace_dir)
-    os.makedirs(workspace_dir)
-    
-    # Clone repository
-    try:
-        subprocess.run(f'git clone {config["github_repo"]} .', shell=True, check=True, cwd=workspace_dir)
-    except subprocess.CalledProcessError as e:
-        return jsonify({'error': f'Error cloning repository: {e}'}), 500
-    
-    # Get output file path
-    output_file_path = get_output_file_path(task_id)
-    
-    # Start Claude streaming process with skip permissions setting
-    skip_permissions = config.get('skip_permissions', False)
-    process = run_claude_command_streaming(task['prompt'], workspace_dir, output_file_path, skip_permissions)
+    if task['status'] == 'queued':
+        return jsonify({'error': 'Task is already queued'}), 409
     
-    if process is None:
-        return jsonify({'error': 'Failed to start Claude process'}), 500
+    # Workspace checkout and process launch happen in a background job
+    job = submit_task_job(task, 'start', start_task_job)
+    if job is None:
+        return jsonify({'error': 'Task already has a job in progress'}), 409
     
-    # Update task status
-    tasks[task_index]['status'] = 'streaming'
-    tasks[task_index]['workspace_dir'] = workspace_dir
-    save_tasks(tasks)
-    
-    return jsonify({'success': True, 'message': 'Task started with streaming output'})
+    return jsonify({'success': True, 'message': 'Task start queued', 'job_id': job.id,
+                    'status_url': url_for('job_status', job_id=job.id)}), 202
 
 @app.route('/task/<task_id>/action_streaming', methods=['POST'])
 def action_task_streaming(task_id):
     """Run action mode with live streaming output"""
-    config = load_config()
-    tasks = load_tasks()
-    task_index = next((i for i, t in enumerate(tasks) if t['id'] == task_id), None)
+    task = get_task(task_id)
     
-    if task_index is None:
+    if task is None:
         return jsonify({'error': 'Task not found'}), 404
     
-    task = tasks[task_index]
-    
     if task['status'] not in ['started', 'streaming']:
         return jsonify({'error': 'Task must be started before it can be actioned'}), 400
     
-    # Get output file path
-    output_file_path = get_output_file_path(task_id)
+    job = submit_task_job(task, 'action', action_streaming_job)
+    if job is None:
+        return jsonify({'error': 'Task already has a job in progress'}), 409
+    
+    return jsonify({'success': True, 'message': 'Action queued', 'job_id': job.id,
+                    'status_url': url_for('job_status', job_id=job.id)}), 202
+
+@app.route('/tasks/start_batch', methods=['POST'])
+def start_task_batch():
+    """Start all tasks matching a status/priority/assignee filter"""
+    config = load_config()
+    is_json = request.is_json
+    if is_json:
+        data = request.get_json() or {}
+        statuses = data.get('status', ['new'])
+        priorities = data.get('priority', [])
+        assignees = data.get('assignee', [])
+        limit = data.get('limit')
+        prompt_template = data.get('prompt_template')
+    else:
+        statuses = request.form.getlist('status') or ['new']
+        priorities = request.form.getlist('priority')
+        assignees = request.form.getlist('assignee')
+        limit = request.form.get('limit')
+        prompt_template = request.form.get('prompt_template')
+    
+    if not config['github_repo']:
+        error = 'GitHub repository not configured'
+    else:
+        tasks = select_tasks(statuses, priorities, assignees, int(limit) if limit else None)
+        error = None if tasks else 'No startable tasks match the selected filters'
+    
+    if error:
+        if is_json:
+            return jsonify({'error': error}), 400
+        flash(error, 'error')
+        return redirect(url_for('index'))
+    
+    if prompt_template is None:
+        prompt_template = config.get('batch_prompt_template', DEFAULT_PROMPT_TEMPLATE)
+    else:
+        try:
+            validate_prompt_template(prompt_template)
+        except ValueError as e:
+            if is_json:
+                return jsonify({'error': str(e)}), 400
+            flash(str(e), 'error')
+            return redirect(url_for('index'))
+        if prompt_template.strip() and not is_json:
+            # Remember the last template used from the UI, once it is known to render
+            config['batch_prompt_template'] = prompt_template
+            save_config(config)
+    
+    job = start_batch([task['id'] for task in tasks], prompt_template.strip() or None)
+    if is_json:
+        return jsonify({'success': True, 'job_id': job.id, 'task_count': len(tasks),
+                        'status_url': url_for('batch_status', job_id=job.id),
+                        'progress_url': url_for('batch_detail', job_id=job.id)}), 202
+    
+    flash(f'Starting {len(tasks)} tasks', 'success')
+    return redirect(url_for('batch_detail', job_id=job.id))
+
+@app.route('/batches/<job_id>', methods=['GET'])
+def batch_detail(job_id):
+    """Consolidated progress view for a batch start"""
+    job = get_job(job_id)
     
-    # Start Claude streaming process for action mode with skip permissions setting
-    skip_permissions = config.get('skip_permissions', False)
-    process = run_claude_command_streaming(task['prompt'], task['workspace_dir'], output_file_path, skip_permissions)
+    if job is None or job['kind'] != 'batch':
+        flash('Batch not found', 'error')
+        return redirect(url_for('index'))
     
-    if process is None:
-        return jsonify({'error': 'Failed to start Claude process'}), 500
+    return render_template('batch_detail.html', batch=get_batch_status(job))
+
+@app.route('/api/batches/<job_id>', methods=['GET'])
+def batch_status(job_id):
+    """Report a batch's per-task progress and current task statuses"""
+    job = get_job(job_id)
     
-    # Update task status
-    tasks[task_index]['status'] = 'actioning'
-    save_tasks(tasks)
+    if job is None or job['kind'] != 'batch':
+        return jsonify({'error': 'Batch not found'}), 404
     
-    return jsonify({'success': True, 'message': 'Action started with streaming output'})
+    return jsonify(get_batch_status(job))
 
 @app.route('/task/<task_id>/stream')
 def stream_task_output(task_id):
-    """Stream live output from Claude for a specific task"""
+    """Stream live output from Claude for a specific task.
+    
+    Resumes after the byte offset given by ?from= or the Last-Event-ID header.
+    """
+    try:
+        from_offset = max(0, int(request.args.get('from') or request.headers.get('Last-Event-ID') or 0))
+    except ValueError:
+        from_offset = 0
+    
+    # Nothing more will arrive: 204 tells the browser to stop reconnecting
+    output_file_path = get_output_file_path(task_id)
+    if (from_offset and not run_pending(task_id)
+            and log_size(output_file_path) == from_offset):
+        return Response(status=204)
+    
+    subscription = stream_broker.subscribe(task_id, from_offset)
+    if subscription is None:
+        # Shutting down: close at once so the browser reconnects to the next server
+        return Response("retry: 3000\n\n", mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
     def generate():
-        output_file_path = get_output_file_path(task_id)
-        
-        # Wait for file to be created
-        timeout = 30  # 30 seconds timeout
-        start_time = time.time()
-        while not os.path.exists(output_file_path) and (time.time() - start_time) < timeout:
-            time.sleep(0.1)
-        
-        if not os.path.exists(output_file_path):
-            yield f"data: {json.dumps({'error': 'Output file not found'})}\n\n"
-            return
-        
-        # Stream the output
-        last_position = 0
-        with open(output_file_path, 'r') as f:
-            f.seek(0)  # Start from beginning of file
-            while True:
-                f.seek(last_position)
-                lines = f.readlines()
-                
-                if lines:
-                    for line in lines:
-                        if line.strip():
-                            try:
-                                # Parse JSON line and send as SSE
-                                data = json.loads(line.strip())
-                                yield f"data: {json.dumps(data)}\n\n"
-                            except json.JSONDecodeError:
-                                # If not JSON, send as plain text
-                                yield f"data: {json.dumps({'text': line})}\n\n"
-                    
-                    last_position = f.tell()
-                else:
-                    # No new data, wait a bit
-                    time.sleep(0.1)
-                    
-                    # Check if process is still running
-                    tasks = load_tasks()
-                    task = next((t for t in tasks if t['id'] == task_id), None)
-                    if task and task['status'] not in ['streaming', 'actioning']:
-                        break
-    
-    return Response(generate(), mimetype='text/event-stream')
+        try:
+            yield "retry: 3000\n\n"
+            for event in subscription.events(timeout=HEARTBEAT_INTERVAL):
+                if event is None:
+                    # Keeps idle connections open and notices viewers that have gone away
+                    yield ": keepalive\n\n"
+                    continue
+                event_type, data, event_id = event
+                message = f"id: {event_id}\n" if event_id is not None else ""
+                if event_type != 'message':
+                    message += f"event: {event_type}\n"
+                yield f"{message}data: {data}\n\n"
+        finally:
+            subscription.close()
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/streams')
+def stream_stats():
+    """Report the live output tailers and running Claude processes"""
+    return jsonify({'streams': stream_broker.stats(), 'processes': get_process_stats(),
+                    'resources': resource_monitor.stats()})
+
+@app.route('/metrics')
+def metrics():
+    """Latency histograms and gauges in the Prometheus text format (see metrics.py)"""
+    return Response(metrics_registry.render(), content_type=METRICS_CONTENT_TYPE)
+
+@app.route('/api/task_cache')
+def task_cache_stats():
+    """Report hit/miss/reload counters for the in-memory task repository"""
+    return jsonify(dict(task_repository.stats(), query=task_query.stats()))
+
+@app.route('/api/page_cache')
+def page_cache_stats():
+    """Report size and hit/miss/304 counters of the rendered page cache"""
+    return jsonify(page_cache.stats())
+
+@app.route('/api/diff_cache')
+def diff_cache_stats():
+    """Report size and hit/miss counters of the diff result cache"""
+    return jsonify(diff_cache.stats())
 
 @app.route('/task/<task_id>/complete_streaming', methods=['POST'])
 def complete_streaming_task(task_id):
-    """Mark a streaming task as completed and get final output"""
-    tasks = load_tasks()
-    task_index = next((i for i, t in enumerate(tasks) if t['id'] == task_id), None)
+    """Mark a streaming task as completed and collect the final output and diff"""
+    task = get_task(task_id)
     
-    if task_index is None:
+    if task is None:
         return jsonify({'error': 'Task not found'}), 404
     
-    task = tasks[task_index]
-    output_file_path = get_output_file_path(task_id)
-    
-    # Read final output from file
-    final_output = ""
-    if os.path.exists(output_file_path):
-        with open(output_file_path, 'r') as f:
-            lines = f.readlines()
-            for line in lines:
-                try:
-                    data = json.loads(line.strip())
-                    
-                    # Handle Claude CLI message format
-                    if data.get('type') == 'message' and 'content' in data:
-                        # Extract text from content array
-                        for content_item in data['content']:
-                            if content_item.get('type') == 'text' and 'text' in content_item:
-                                final_output += content_item['text'] + '\n'
-                    
-                    # Handle streaming delta format (if used)
-                    elif data.get('type') == 'content_block_delta' and 'delta' in data:
-                        if 'text' in data['delta']:
-                            final_output += data['delta']['text']
-                    
-                    # Handle system messages with result
-                    elif 'result' in data:
-                        final_output += data['result'] + '\n'
-                    
-                    # Fallback for other formats
-                    elif 'content' in data and isinstance(data['content'], str):
-                        final_output += data['content']
-                    elif 'text' in data:
-                        final_output += data['text']
-                        
-                except json.JSONDecodeError:
-                    continue
-    
-    # Get git diff
-    git_diff = get_git_diff(task['workspace_dir'])
-    
-    # Update task
-    tasks[task_index]['status'] = 'actioned'
-    tasks[task_index]['claude_output'] = final_output
-    tasks[task_index]['git_diff'] = git_diff
-    save_tasks(tasks)
+    job = submit_task_job(task, 'complete', complete_streaming_job)
+    if job is None:
+        return jsonify({'error': 'Task already has a job in progress'}), 409
     
-    return jsonify({'success': True, 'output': final_output, 'git_diff': git_diff})
+    return jsonify({'success': True, 'message': 'Completion queued', 'job_id': job.id,
+                    'status_url': url_for('job_status', job_id=job.id)}), 202
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=9000)
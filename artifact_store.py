@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Per-task artifact storage
+
+Large per-task text such as the Claude output and the git diff is kept in
+files under outputs/<task_id>/ rather than inline in the task record, so the
+task list, CSV imports and status polls never have to load it. The task
+record only keeps a small reference:
+
+    task['artifacts'] = {'git_diff': {'path': 'outputs/<id>/git_diff.diff', 'size': 1234}}
+
+Tasks created before artifacts existed still carry the text inline; every
+reader falls back to that, and it can be moved out with:
+    python artifact_store.py migrate
+"""
+import os
+from datetime import datetime
+
+from config import OUTPUTS_DIR
+
+ARTIFACT_FILES = {
+    'claude_output': 'claude_output.txt',
+    'git_diff': 'git_diff.diff',
+}
+
+CHUNK_SIZE = 64 * 1024
+
+
+def get_artifact_path(task_id, name):
+    """Get the path of an artifact file for a specific task"""
+    if name not in ARTIFACT_FILES:
+        raise ValueError(f"Unknown artifact '{name}'")
+    output_dir = os.path.join(OUTPUTS_DIR, task_id)
+    os.makedirs(output_dir, exist_ok=True)
+    return os.path.join(output_dir, ARTIFACT_FILES[name])
+
+
+def _artifact_updates(task, name, path):
+    """Task field updates that point the record at an artifact file"""
+    artifacts = dict(task.get('artifacts') or {})
+    artifacts[name] = {
+        'path': path,
+        'size': os.path.getsize(path),
+        'updated_at': datetime.now().isoformat()
+    }
+    # Blank any inline copy left over from before artifacts were stored separately
+    return {'artifacts': artifacts, name: ''}
+
+
+def write_artifact(task, name, text):
+    """Replace an artifact and return the task updates that reference it"""
+    path = get_artifact_path(task['id'], name)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text or '')
+    os.replace(tmp_path, path)
+    return _artifact_updates(task, name, path)
+
+
+def append_artifact(task, name, text):
+    """Append to an artifact and return the task updates that reference it"""
+    path = get_artifact_path(task['id'], name)
+    if not has_artifact_file(task, name):
+        # Start the file from any inline text the task still carries
+        with open(path, 'w') as f:
+            f.write(task.get(name) or '')
+    with open(path, 'a') as f:
+        f.write(text)
+    return _artifact_updates(task, name, path)
+
+
+def has_artifact_file(task, name):
+    ref = (task.get('artifacts') or {}).get(name)
+    return bool(ref) and os.path.exists(ref['path'])
+
+
+def artifact_size(task, name):
+    """Size of an artifact in bytes without reading it"""
+    if has_artifact_file(task, name):
+        return task['artifacts'][name]['size']
+    return len(task.get(name) or '')
+
+
+def read_artifact(task, name):
+    """Read an artifact into memory (only for pages that display it)"""
+    if has_artifact_file(task, name):
+        with open(task['artifacts'][name]['path'], 'r') as f:
+            return f.read()
+    return task.get(name) or ''
+
+
+def stream_artifact(task, name, chunk_size=CHUNK_SIZE):
+    """Yield an artifact in chunks straight from disk"""
+    if not has_artifact_file(task, name):
+        text = task.get(name) or ''
+        if text:
+            yield text
+        return
+    with open(task['artifacts'][name]['path'], 'r') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def delete_artifacts(task):
+    """Remove every artifact file belonging to a task"""
+    for ref in (task.get('artifacts') or {}).values():
+        if os.path.exists(ref['path']):
+            os.remove(ref['path'])
+
+
+def migrate_inline_artifacts(repository):
+    """Move inline claude_output/git_diff text out of every task record"""
+    migrated = 0
+    for task in repository.all():
+        updates = {}
+        for name in ARTIFACT_FILES:
+            if task.get(name):
+                updates.update(write_artifact(dict(task, **updates), name, task[name]))
+        if updates:
+            repository.update(task['id'], updates)
+            migrated += 1
+    return migrated
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Manage Claude Task Manager task artifacts')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('migrate', help='Move inline claude_output/git_diff text into artifact files')
+
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        from task_cache import task_repository
+        migrated = migrate_inline_artifacts(task_repository)
+        print(f"Moved artifacts out of {migrated} task records")
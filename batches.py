@@ -0,0 +1,221 @@
+"""
+Batch task starts
+
+Starts every task matching a status/priority/assignee filter without opening
+each one. A batch runs as a background job ('batch') that feeds the selected
+tasks, highest priority first, through the same pipeline as the START button:
+
+    prepare workspace -> fill in prompt -> hand to the agent scheduler
+
+batch_parallelism tasks (config.json, default 4) are prepared at once, so later
+tasks are being checked out while earlier ones wait for or hold an agent slot.
+Tasks without a prompt get one from the batch's prompt template. Per-task
+progress is kept in memory while the batch runs and shown on /batches/<job_id>;
+the job record only gets the stage counts (at most once a second) until the
+full per-task list is saved as the job's result when the batch finishes.
+"""
+import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import load_config, load_tasks
+from task_cache import get_task, update_task
+from jobs import job_queue, submit_job, task_lock
+from task_actions import start_task_job
+from utils import get_priority_order
+
+DEFAULT_BATCH_PARALLELISM = 4
+DEFAULT_PROMPT_TEMPLATE = (
+    "Work on ticket {ticket}: {task}\n\n"
+    "Ticket link: {link}\n\n"
+    "Make the necessary code changes in this repository."
+)
+BUSY_STATUSES = ('queued', 'streaming', 'actioning')
+FINISHED_STAGES = ('scheduled', 'failed', 'skipped')
+PROGRESS_INTERVAL = 1.0  # seconds between progress writes to the job record
+
+# Batch job id -> BatchProgress of the batches still running
+_active = {}
+_active_lock = threading.Lock()
+
+
+PLACEHOLDER = re.compile(r'\{(\w+)\}')
+SAMPLE_TASK = {'id': 'sample', 'ticket': 'ABC-123', 'task': 'Sample task', 'link': 'https://example.com/ABC-123',
+               'priority': 'Medium', 'status': 'new', 'assignee': 'someone'}
+
+
+def render_prompt(template, task):
+    """Fill a prompt template with the task's fields ({ticket}, {task}, {link}, ...).
+
+    Only {name} placeholders naming a text field of the task are replaced; any
+    other braces (JSON examples, unknown names, a lone brace) are left as written.
+    """
+    fields = {key: value for key, value in task.items() if isinstance(value, str)}
+    return PLACEHOLDER.sub(lambda match: fields.get(match.group(1), match.group(0)), template)
+
+
+def validate_prompt_template(template):
+    """Raise ValueError if the template cannot be rendered for a task"""
+    try:
+        render_prompt(template, SAMPLE_TASK)
+    except Exception as e:
+        raise ValueError(f'Invalid prompt template: {e}')
+
+
+def _matches(value, allowed):
+    return not allowed or (value or '').strip().lower() in {item.strip().lower() for item in allowed}
+
+
+def select_tasks(statuses=None, priorities=None, assignees=None, limit=None):
+    """Tasks matching the filters that can be started, highest priority and oldest first.
+
+    Each filter is a list of accepted values (case-insensitive); an empty filter
+    matches everything. Tasks that are already running or queued, and archived
+    tasks, are never selected.
+    """
+    selected = [
+        task for task in load_tasks()
+        if task.get('status') not in BUSY_STATUSES
+        and not task.get('archived_at')
+        and not job_queue.is_active(task.get('job_id'))
+        and _matches(task.get('status'), statuses)
+        and _matches(task.get('priority'), priorities)
+        and _matches(task.get('assignee'), assignees)
+    ]
+    selected.sort(key=lambda task: (get_priority_order(task.get('priority') or 'Medium'),
+                                    task.get('created_at', '')))
+    return selected[:limit] if limit else selected
+
+
+class BatchProgress:
+    """Per-task pipeline stage for a batch, published through the batch job"""
+
+    def __init__(self, job, tasks):
+        self.job = job
+        self._lock = threading.Lock()
+        self.items = [{'task_id': task['id'], 'ticket': task.get('ticket'), 'stage': 'pending',
+                       'job_id': None, 'error': None} for task in tasks]
+        self._by_id = {item['task_id']: item for item in self.items}
+        self._counts = {'pending': len(self.items)}
+        self._published_at = 0.0
+        self._publish(force=True)
+
+    def set(self, task_id, stage, **fields):
+        with self._lock:
+            item = self._by_id[task_id]
+            self._counts[item['stage']] -= 1
+            self._counts[stage] = self._counts.get(stage, 0) + 1
+            item.update(stage=stage, **fields)
+            self._publish()
+
+    def summary(self):
+        with self._lock:
+            return {'total': len(self.items), 'counts': self._live_counts(),
+                    'tasks': [dict(item) for item in self.items]}
+
+    def _live_counts(self):
+        return {stage: count for stage, count in self._counts.items() if count}
+
+    def _publish(self, force=False):
+        """Write the stage counts to the job record, at most every PROGRESS_INTERVAL seconds"""
+        now = time.monotonic()
+        if not force and now - self._published_at < PROGRESS_INTERVAL:
+            return
+        self._published_at = now
+        counts = self._live_counts()
+        done = sum(count for stage, count in counts.items() if stage in FINISHED_STAGES)
+        self.job.progress(f"{done} of {len(self.items)} tasks processed",
+                          result={'total': len(self.items), 'counts': counts})
+
+
+def _start_one(progress, task_id, prompt_template):
+    try:
+        _prepare_and_start(progress, task_id, prompt_template)
+    except Exception as e:
+        print(f"DEBUG: Batch could not start task {task_id}: {e}")
+        progress.set(task_id, 'failed', error=str(e) or e.__class__.__name__)
+
+
+def _prepare_and_start(progress, task_id, prompt_template):
+    task = get_task(task_id)
+    if task is None:
+        progress.set(task_id, 'skipped', error='Task not found')
+        return
+    if not task.get('prompt') and not prompt_template:
+        progress.set(task_id, 'skipped', error='Task has no prompt')
+        return
+
+    # Run the task's own start job here so its page shows progress as usual;
+    # created under the task's lock like jobs submitted from the task page
+    with task_lock(task_id):
+        task = get_task(task_id) or task
+        if task['status'] in BUSY_STATUSES or job_queue.is_active(task.get('job_id')):
+            progress.set(task_id, 'skipped', error='Task is already in progress')
+            return
+        if not task.get('prompt'):
+            update_task(task_id, {'prompt': render_prompt(prompt_template, task)})
+        job = job_queue.create('start', task_id)
+        update_task(task_id, {'job_id': job.id})
+    progress.set(task_id, 'preparing', job_id=job.id)
+    record = job_queue.run(job, start_task_job, task_id)
+
+    if record['status'] == 'failed':
+        progress.set(task_id, 'failed', error=record['error'])
+    else:
+        progress.set(task_id, 'scheduled')
+
+
+def run_batch_job(job, task_ids, prompt_template):
+    """Start each task in turn with batch_parallelism tasks in flight"""
+    parallelism = max(1, int(load_config().get('batch_parallelism', DEFAULT_BATCH_PARALLELISM)))
+    progress = BatchProgress(job, [get_task(task_id) or {'id': task_id} for task_id in task_ids])
+    with _active_lock:
+        # Forget batches that have finished since; their result is on the job record
+        for job_id in [job_id for job_id in _active if not job_queue.is_active(job_id)]:
+            del _active[job_id]
+        _active[job.id] = progress
+
+    with ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix='batch') as executor:
+        futures = {executor.submit(_start_one, progress, task_id, prompt_template): task_id
+                   for task_id in task_ids}
+    for future, task_id in futures.items():
+        if future.exception():
+            print(f"DEBUG: Batch {job.id} lost track of task {task_id}: {future.exception()}")
+
+    summary = progress.summary()
+    print(f"DEBUG: Batch {job.id} finished: {summary['counts']}")
+    # Saved as the job's result, the one write of the full per-task list
+    return summary
+
+
+def start_batch(task_ids, prompt_template=None):
+    """Submit a batch job starting the given tasks in order"""
+    return submit_job('batch', run_batch_job, None, list(task_ids), prompt_template)
+
+
+def get_batch_status(batch_job):
+    """A batch job's progress with each task's current status"""
+    with _active_lock:
+        progress = _active.get(batch_job['id'])
+        if progress and batch_job['status'] not in ('queued', 'running'):
+            del _active[batch_job['id']]
+            progress = None
+    if progress:
+        summary = progress.summary()
+    else:
+        summary = dict(batch_job.get('result') or {'total': 0, 'counts': {}})
+    tasks = []
+    for item in summary.get('tasks', []):
+        task = get_task(item['task_id'])
+        tasks.append(dict(item, status=task['status'] if task else 'deleted',
+                          priority=task.get('priority') if task else None,
+                          task=task.get('task') if task else None))
+    summary['tasks'] = tasks
+    statuses = {}
+    for item in tasks:
+        statuses[item['status']] = statuses.get(item['status'], 0) + 1
+    summary['statuses'] = statuses
+    summary['job'] = {key: batch_job.get(key) for key in
+                      ('id', 'status', 'message', 'created_at', 'started_at', 'finished_at', 'error')}
+    return summary
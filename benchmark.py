@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the hot paths of Claude Task Manager
+
+Builds synthetic task stores of each requested size and times:
+
+    store.*    save_tasks, load_tasks (cold and cached) and single task updates
+    csv.*      importing a CSV export into an empty store, and an upsert
+               re-import of the same file (nothing changed)
+    render.*   the task list page and /api/tasks pages (index rebuilt and
+               cached) and a task page with a realistic output and diff;
+               *_not_modified is a reload answered with 304
+    summary.*  parsing a whole stream-json log when a streaming task is
+               completed, and catching up from a saved summary
+    sse.*      replaying a log through the stream broker, and fanning live
+               output out to several viewers
+
+Synthetic tasks look like tasks that have been run: a prompt, artifact
+references with realistic sizes and a mix of statuses. Everything runs in a
+scratch directory, so the real tasks/, outputs/ and config.json are not
+touched.
+
+Usage:
+    python benchmark.py                                   # 1k, 10k and 100k tasks, JSON and SQLite stores
+    python benchmark.py --sizes 1000 --stores sqlite --only store,render
+    python benchmark.py --output results.json --compare baseline.json
+
+Results are written as JSON (--output, default benchmark_results.json) with
+the commit, Python version and machine they were measured on; --compare
+prints the change against an earlier results file.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import uuid
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import statistics
+import subprocess
+from datetime import datetime
+
+from generate_test_data import LINK_BASE, PRIORITIES, TICKET_PREFIXES, generate_task
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCHMARKS = ('store', 'csv', 'render', 'summary', 'sse')
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_STORES = ('json', 'sqlite')
+DEFAULT_LOG_EVENTS = (1000, 20000)
+STATUSES = ('new',) * 6 + ('streaming', 'actioned', 'actioned', 'completed')
+ASSIGNEES = ('alice', 'bob', 'carol', 'dave')
+PROMPT_LENGTH = 600
+OUTPUT_SIZE = 40 * 1024  # bytes of Claude output on the task page
+DIFF_LINES = 3000  # lines in the task page's diff
+SSE_VIEWERS = 10
+SLOWER_THRESHOLD = 1.2  # --compare flags results this much slower than the baseline
+
+
+def synthetic_task(i):
+    task_id = str(uuid.uuid4())
+    status = random.choice(STATUSES)
+    ticket = f"{random.choice(TICKET_PREFIXES)}-{i}"
+    task = {
+        'id': task_id,
+        'ticket': ticket,
+        'task': generate_task(),
+        'link': f"{LINK_BASE}{ticket}",
+        'priority': random.choice(PRIORITIES),
+        'assignee': random.choice(ASSIGNEES),
+        'state': random.choice(('Ready', 'In Progress', 'Review')),
+        'status': status,
+        'prompt': ' '.join(random.choice(('fix', 'the', 'login', 'form', 'test', 'handler', 'and'))
+                           for _ in range(PROMPT_LENGTH // 5)),
+        'created_at': datetime.now().isoformat(),
+        'workspace_dir': os.path.join('workspaces', task_id),
+        'source_hash': uuid.uuid4().hex,
+    }
+    if status != 'new':
+        task['artifacts'] = {
+            'claude_output': {'path': f'outputs/{task_id}/claude_output.txt', 'size': random.randint(2000, 80000),
+                              'updated_at': task['created_at']},
+            'git_diff': {'path': f'outputs/{task_id}/git_diff.diff', 'size': random.randint(1000, 200000),
+                         'updated_at': task['created_at'], 'fingerprint': uuid.uuid4().hex},
+        }
+    return task
+
+
+def synthetic_log(path, events):
+    """Write a stream-json log of assistant text, tool calls with results, and a final result"""
+    with open(path, 'w') as f:
+        f.write(json.dumps({'type': 'system', 'subtype': 'init', 'session_id': 'bench'}) + '\n')
+        for i in range(events - 2):
+            kind = i % 3
+            if kind == 0:
+                event = {'type': 'assistant', 'message': {'content': [
+                    {'type': 'text', 'text': f'Looking at step {i}. ' * 8}]}}
+            elif kind == 1:
+                event = {'type': 'assistant', 'message': {'content': [
+                    {'type': 'tool_use', 'id': f'tool_{i}', 'name': 'Read', 'input': {'file_path': f'src/module_{i}.py'}}]}}
+            else:
+                event = {'type': 'user', 'message': {'content': [
+                    {'type': 'tool_result', 'tool_use_id': f'tool_{i - 1}', 'content': 'x = 1\n' * 300}]}}
+            f.write(json.dumps(event) + '\n')
+        f.write(json.dumps({'type': 'result', 'subtype': 'success', 'result': 'Done', 'num_turns': events}) + '\n')
+
+
+def synthetic_diff(lines):
+    out = []
+    for i in range(0, lines, 20):
+        out.append(f'diff --git a/src/file_{i}.py b/src/file_{i}.py\n--- a/src/file_{i}.py\n+++ b/src/file_{i}.py\n'
+                   f'@@ -1,10 +1,10 @@\n')
+        out.extend(f'+line {j} changed\n' if j % 2 else f'-line {j}\n' for j in range(16))
+    return ''.join(out)
+
+
+def write_csv(path, count):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Ticket', 'Task', 'Link', 'Priority', 'Assign', 'State'])
+        for i in range(count):
+            ticket = f"{random.choice(TICKET_PREFIXES)}-{i}"
+            writer.writerow([ticket, generate_task(), f"{LINK_BASE}{ticket}", random.choice(PRIORITIES),
+                             random.choice(ASSIGNEES), 'Ready'])
+
+
+class Runner:
+    """Times benchmarks and collects their results"""
+
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.results = []
+
+    def measure(self, name, fn, setup=None, items=None, unit='items', repeat=None, **params):
+        """Run fn repeat times (setup before each, untimed) and record the median"""
+        runs = []
+        for _ in range(repeat or self.repeat):
+            if setup:
+                setup()
+            started = time.perf_counter()
+            fn()
+            runs.append(time.perf_counter() - started)
+        median = statistics.median(runs)
+        result = {
+            'name': name,
+            'params': params,
+            'seconds': median,
+            'min_seconds': min(runs),
+            'runs': runs,
+        }
+        if items:
+            result['items'] = items
+            result['unit'] = unit
+            result['per_second'] = items / median if median else None
+        self.results.append(result)
+        rate = f"  {result['per_second']:,.0f} {unit}/s" if items and median else ''
+        labels = ' '.join(f'{key}={value}' for key, value in params.items())
+        print(f"{name:<32} {labels:<28} {median * 1000:>10.2f} ms{rate}")
+        return result
+
+
+def use_store(backend):
+    """Point the app at an empty store of the given backend"""
+    from config import TASKS_FILE, TASKS_DB, save_config
+    from task_store import reset_task_store
+    from task_cache import task_repository
+
+    for path in (TASKS_FILE, TASKS_DB, TASKS_DB + '-wal', TASKS_DB + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+    with open(TASKS_FILE, 'w') as f:
+        f.write('[]')
+    save_config({'task_store': backend, 'assignees': [], 'github_repo': ''})
+    reset_task_store()
+    task_repository.invalidate()
+
+
+def bench_store(runner, backend, tasks):
+    from config import load_tasks, save_tasks
+    from task_cache import task_repository, update_task
+
+    use_store(backend)
+    params = {'store': backend, 'tasks': len(tasks)}
+    runner.measure('store.save_tasks', lambda: save_tasks(tasks), items=len(tasks), unit='tasks', **params)
+    runner.measure('store.load_tasks', load_tasks, setup=task_repository.invalidate,
+                   items=len(tasks), unit='tasks', **params)
+    load_tasks()
+    runner.measure('store.load_tasks_cached', load_tasks, **params)
+
+    ids = [task['id'] for task in random.sample(tasks, min(20, len(tasks)))]
+
+    def update_some():
+        for task_id in ids:
+            update_task(task_id, {'state': random.choice(('Ready', 'Review'))})
+    runner.measure('store.update_task', update_some, items=len(ids), unit='updates', **params)
+
+
+def bench_csv(runner, backend, size, scratch):
+    from csv_import import import_csv
+
+    path = os.path.join(scratch, 'import.csv')
+    write_csv(path, size)
+    params = {'store': backend, 'tasks': size}
+    config = {'assignees': [], 'csv_import_batch_size': 1000}
+    runner.measure('csv.import', lambda: import_csv(path, config), setup=lambda: use_store(backend),
+                   items=size, unit='rows', **params)
+    runner.measure('csv.upsert_unchanged', lambda: import_csv(path, config, upsert=True),
+                   items=size, unit='rows', **params)
+
+
+def bench_render(runner, backend, tasks, client):
+    from config import save_tasks
+    from task_cache import update_task
+    from artifact_store import write_artifact
+    from claude_cli import get_output_file_path
+    from page_cache import page_cache
+
+    use_store(backend)
+    save_tasks(tasks)
+    params = {'store': backend, 'tasks': len(tasks)}
+
+    def changed():
+        # A write makes the next list request rebuild the query index
+        update_task(tasks[0]['id'], {'state': random.choice(('Ready', 'Review'))})
+
+    def get(url):
+        response = client.get(url)
+        assert response.status_code == 200, f'{url} returned {response.status_code}'
+        return response
+
+    def revalidate(url):
+        # A reload of an unchanged page: the browser sends back the ETag it has
+        etag = client.get(url).headers['ETag']
+
+        def run():
+            response = client.get(url, headers={'If-None-Match': etag})
+            assert response.status_code == 304, f'{url} returned {response.status_code} for a current ETag'
+        return run
+
+    runner.measure('render.index', lambda: get('/'), setup=changed, **params)
+    runner.measure('render.index_cached', lambda: get('/'), **params)
+    runner.measure('render.index_not_modified', revalidate('/'), **params)
+    runner.measure('render.api_tasks', lambda: get('/api/tasks?limit=50'), setup=changed, **params)
+    runner.measure('render.api_tasks_cached', lambda: get('/api/tasks?limit=50'), **params)
+    runner.measure('render.api_tasks_not_modified', revalidate('/api/tasks?limit=50'), **params)
+    # The first request of a sort order sorts the whole list; later ones reuse it
+    runner.measure('render.api_tasks_new_sort', lambda: get('/api/tasks?limit=50&sort=-created'), setup=changed,
+                   **params)
+    runner.measure('render.api_tasks_search', lambda: get('/api/tasks?limit=50&status=new&q=login'), **params)
+
+    task = tasks[-1]
+    updates = write_artifact(task, 'claude_output', 'Claude output line\n' * (OUTPUT_SIZE // 19))
+    updates.update(write_artifact(dict(task, **updates), 'git_diff', synthetic_diff(DIFF_LINES)))
+    update_task(task['id'], dict(updates, status='actioned'))
+    synthetic_log(get_output_file_path(task['id']), 2000)
+    # Without the rendered page cache, as for the first viewer of a new version
+    runner.measure('render.task_page', lambda: get(f"/task/{task['id']}/streaming"), setup=page_cache.clear,
+                   **params)
+    runner.measure('render.task_page_not_modified', revalidate(f"/task/{task['id']}/streaming"), **params)
+
+
+def bench_summary(runner, events, scratch):
+    import output_summary
+
+    path = os.path.join(scratch, 'outputs', 'summary', 'claude_output.jsonl')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    synthetic_log(path, events)
+    size = os.path.getsize(path)
+    summary_path = output_summary.get_summary_path(path)
+
+    def remove_summary():
+        for saved in (summary_path, output_summary.get_text_path(path)):
+            if os.path.exists(saved):
+                os.remove(saved)
+
+    params = {'events': events, 'log_mb': round(size / 1024 / 1024, 1)}
+    runner.measure('summary.full_parse', lambda: output_summary.get_summary(path), setup=remove_summary,
+                   items=events, unit='events', **params)
+
+    def save_partial():
+        # As if the summary was last saved a tenth of the log ago
+        remove_summary()
+        summary = output_summary.OutputSummary(path)
+        with open(path, 'rb') as f:
+            for raw in f:
+                summary.feed(raw)
+                if summary.offset >= size * 0.9:
+                    break
+        summary.save()
+    runner.measure('summary.catch_up', lambda: output_summary.get_summary(path), setup=save_partial,
+                   items=events // 10, unit='events', **params)
+
+
+def bench_sse(runner, events, scratch):
+    from task_cache import add_tasks, update_task
+    from claude_cli import get_output_file_path
+    from stream_broker import StreamBroker
+
+    task = synthetic_task(0)
+    task['status'] = 'actioned'
+    add_tasks([task])
+    path = get_output_file_path(task['id'])
+    synthetic_log(path, events)
+    params = {'events': events}
+
+    def replay():
+        received = sum(1 for event in StreamBroker().subscribe(task['id']).events(timeout=5) if event)
+        assert received >= events, f'replayed {received} of {events} events'
+    runner.measure('sse.replay', replay, items=events, unit='events', **params)
+
+    # Live output: a writer appends lines while several viewers follow the task
+    os.remove(path)
+    update_task(task['id'], {'status': 'streaming'})
+    broker = StreamBroker()
+    counts = [0] * SSE_VIEWERS
+    delivered = threading.Semaphore(0)
+
+    def view(index, subscription):
+        for event in subscription.events(timeout=5):
+            if event is None:
+                break
+            counts[index] += 1
+            if counts[index] == events + 1:
+                delivered.release()
+
+    line = json.dumps({'type': 'assistant', 'message': {'content': [{'type': 'text', 'text': 'x' * 200}]}})
+    with open(path, 'w') as f:
+        f.write('{"type": "system"}\n')
+        f.flush()
+        viewers = [threading.Thread(target=view, args=(i, broker.subscribe(task['id']))) for i in range(SSE_VIEWERS)]
+        for viewer in viewers:
+            viewer.start()
+
+        def fan_out():
+            # Timed until every viewer has received every line
+            for i in range(events):
+                f.write(line + '\n')
+                if i % 100 == 0:
+                    f.flush()
+            f.flush()
+            for _ in viewers:
+                assert delivered.acquire(timeout=60), f'a viewer received only {min(counts)} of {events + 1} lines'
+        runner.measure('sse.fan_out', fan_out, items=events * SSE_VIEWERS, unit='deliveries', repeat=1,
+                       viewers=SSE_VIEWERS, **params)
+    update_task(task['id'], {'status': 'actioned'})
+    for viewer in viewers:
+        viewer.join(60)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    """Print each result's change against the same benchmark in an earlier results file"""
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+    previous = {(result['name'], json.dumps(result['params'], sort_keys=True)): result
+                for result in baseline['results']}
+    print(f"\nCompared with {baseline_path} ({(baseline['meta'].get('commit') or '?')[:10]}, "
+          f"{baseline['meta'].get('started_at')}):")
+    for result in results:
+        old = previous.get((result['name'], json.dumps(result['params'], sort_keys=True)))
+        if not old or not old['seconds']:
+            continue
+        ratio = result['seconds'] / old['seconds']
+        flag = '  SLOWER' if ratio >= SLOWER_THRESHOLD else ''
+        labels = ' '.join(f'{key}={value}' for key, value in result['params'].items())
+        print(f"{result['name']:<32} {labels:<28} {old['seconds'] * 1000:>10.2f} -> "
+              f"{result['seconds'] * 1000:>10.2f} ms  x{ratio:.2f}{flag}")
+
+
+def parse_list(text, cast=str):
+    return [cast(item) for item in text.split(',') if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the hot paths of Claude Task Manager')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma-separated task counts (default: %(default)s)')
+    parser.add_argument('--stores', default=','.join(DEFAULT_STORES), help='task stores (default: %(default)s)')
+    parser.add_argument('--log-events', default=','.join(map(str, DEFAULT_LOG_EVENTS)),
+                        help='events per log for the summary and sse benchmarks (default: %(default)s)')
+    parser.add_argument('--only', default=','.join(BENCHMARKS), help='benchmarks to run (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement; the median is reported')
+    parser.add_argument('--output', default='benchmark_results.json', help='where to write the results')
+    parser.add_argument('--compare', help='an earlier results file to compare with')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for the synthetic data')
+    args = parser.parse_args()
+
+    sizes = parse_list(args.sizes, int)
+    stores = parse_list(args.stores)
+    log_events = parse_list(args.log_events, int)
+    only = set(parse_list(args.only))
+    unknown = only - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    output_path = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+
+    random.seed(args.seed)
+    meta = {
+        'started_at': datetime.now().isoformat(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'args': vars(args),
+    }
+    runner = Runner(args.repeat)
+
+    scratch = tempfile.mkdtemp(prefix='task-manager-bench-')
+    cwd = os.getcwd()
+    # The app's paths (tasks/, outputs/, config.json) are relative to the working directory
+    os.chdir(scratch)
+    sys.path.insert(0, REPO_DIR)
+    try:
+        from config import TASKS_DIR, OUTPUTS_DIR
+        os.makedirs(TASKS_DIR, exist_ok=True)
+        os.makedirs(OUTPUTS_DIR, exist_ok=True)
+        client = None
+        if 'render' in only:
+            from app import app
+            client = app.test_client()
+
+        for size in sizes:
+            tasks = [synthetic_task(i) for i in range(size)]
+            for backend in stores:
+                if 'store' in only:
+                    bench_store(runner, backend, tasks)
+                if 'csv' in only:
+                    bench_csv(runner, backend, size, scratch)
+                if 'render' in only:
+                    bench_render(runner, backend, tasks, client)
+
+        use_store(stores[0] if stores else 'json')
+        for events in log_events:
+            if 'summary' in only:
+                bench_summary(runner, events, scratch)
+            if 'sse' in only:
+                bench_sse(runner, events, scratch)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    meta['finished_at'] = datetime.now().isoformat()
+    with open(output_path, 'w') as f:
+        json.dump({'meta': meta, 'results': runner.results}, f, indent=2)
+    print(f"\nResults written to {output_path}")
+    if baseline_path:
+        compare(runner.results, baseline_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,44 @@
 import os
+import sys
 import json
+import shlex
 import subprocess
-import threading
 import time
 
+import process_io
+import output_summary
+from config import load_config
+from metrics import CLAUDE_DURATION, CLAUDE_FIRST_EVENT, process_outcome
+from log_retention import discard_compressed
+from resource_governor import get_limits, popen_kwargs, resource_monitor
+
+SIMULATOR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_claude.py')
+# config.json key -> fake_claude.py option
+SIMULATOR_OPTIONS = {
+    'simulator_events': '--sim-events',
+    'simulator_rate': '--sim-rate',
+    'simulator_event_size': '--sim-event-size',
+    'simulator_edit_files': '--sim-edit-files',
+    'simulator_failure_rate': '--sim-failure-rate',
+    'simulator_hang_rate': '--sim-hang-rate',
+}
+
+def get_claude_command(config=None):
+    """
+    The command that starts Claude: `claude`, or the bundled simulator
+    (fake_claude.py) when claude_simulator is set, for offline load testing.
+    """
+    if config is None:
+        config = load_config()
+    if not config.get('claude_simulator', False):
+        return 'claude'
+    parts = [shlex.quote(sys.executable), shlex.quote(SIMULATOR_PATH)]
+    for key, option in SIMULATOR_OPTIONS.items():
+        value = config.get(key)
+        if value is not None and value != '':
+            parts.append(f'{option} {shlex.quote(str(value))}')
+    return ' '.join(parts)
+
 def run_claude_command(prompt, mode, workspace_dir, skip_permissions=False):
     """
     Run Claude CLI command and return the output.
@@ -22,25 +57,33 @@ def run_claude_command(prompt, mode, workspace_dir, skip_permissions=False):
     # Add skip permissions flag if requested
     skip_flag = " --dangerously-skip-permissions" if skip_permissions else ""
     
+    config = load_config()
+    claude = get_claude_command(config)
+    
     if mode == "plan":
         # Command for running Claude in plan mode
-        cmd = f'echo "{escaped_prompt}" | claude plan{skip_flag}'
+        cmd = f'echo "{escaped_prompt}" | {claude} plan{skip_flag}'
     else:  # action mode
         # Command for running Claude in action mode
-        cmd = f'echo "{escaped_prompt}" | claude act{skip_flag}'
+        cmd = f'echo "{escaped_prompt}" | {claude} act{skip_flag}'
     
+    started = time.monotonic()
     try:
-        # Run the command in the workspace directory
+        # Run the command in the workspace directory, under the configured resource limits
+        cmd, limit_kwargs = popen_kwargs(cmd, config)
         result = subprocess.run(cmd, shell=True, check=True, cwd=workspace_dir,
-                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, **limit_kwargs)
+        CLAUDE_DURATION.observe(time.monotonic() - started, mode=mode, outcome='success')
         return result.stdout
     except subprocess.CalledProcessError as e:
+        CLAUDE_DURATION.observe(time.monotonic() - started, mode=mode, outcome=process_outcome(e.returncode))
         return f"Error running Claude: {e.stderr}"
 
-def run_claude_command_streaming(prompt, workspace_dir, output_file_path, skip_permissions=False):
+def run_claude_command_streaming(prompt, workspace_dir, output_file_path, skip_permissions=False, on_exit=None):
     """
     Run Claude CLI command in print mode with streaming output to a file.
     Uses the claude -p command with --output-format stream-json for live updates.
+    on_exit, if given, is called once the process has finished.
     """
     # Escape quotes in the prompt to prevent shell injection
     escaped_prompt = prompt.replace('"', '\\"')
@@ -49,57 +92,57 @@ def run_claude_command_streaming(prompt, workspace_dir, output_file_path, skip_p
     skip_flag = " --dangerously-skip-permissions" if skip_permissions else ""
     
     # Use claude -p with streaming JSON output - Linux compatible
-    cmd = f'claude -p "{escaped_prompt}" --output-format stream-json{skip_flag}'
+    config = load_config()
+    cmd = f'{get_claude_command(config)} -p "{escaped_prompt}" --output-format stream-json{skip_flag}'
     
     try:
         # Ensure the output directory exists
         os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
+        # The previous run's logs may have been compressed; this run replaces them
+        discard_compressed(output_file_path)
+        discard_compressed(get_stderr_file_path(output_file_path))
         
         print(f"DEBUG: Starting Claude command: {cmd}")
         print(f"DEBUG: Output file path: {output_file_path}")
         print(f"DEBUG: Working directory: {workspace_dir}")
         
-        # Open the output file for writing and run the command with stdout redirected to it
-        output_file = open(output_file_path, 'w')
+        # Drain stdout and stderr through pipes; the lines are written to the
+        # output files in batches (see process_io.py). The process leads its own
+        # process group and runs under the configured limits (see resource_governor.py)
+        cmd, limit_kwargs = popen_kwargs(cmd, config)
+        started = time.monotonic()
         process = subprocess.Popen(cmd, shell=True, cwd=workspace_dir,
-                                 stdout=output_file, stderr=subprocess.PIPE, text=True)
-        
-        # Store the file handle with the process so we can close it later
-        process.output_file = output_file
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE, **limit_kwargs)
+        resource_monitor.register(process, output_file_path, get_limits(config))
+        # Keep the output summary up to date as lines arrive (see output_summary.py)
+        summary = output_summary.start_summary(output_file_path)
+
+        first_event = []
+
+        def on_stdout(line):
+            if not first_event:
+                first_event.append(True)
+                CLAUDE_FIRST_EVENT.observe(time.monotonic() - started)
+            summary.feed(line)
+
+        def finished():
+            CLAUDE_DURATION.observe(time.monotonic() - started, mode='streaming',
+                                    outcome=process_outcome(process.returncode))
+            summary.close()
+            resource_monitor.finish(output_file_path)
+            if on_exit:
+                on_exit()
+
+        process_io.attach(process, output_file_path, get_stderr_file_path(output_file_path), finished,
+                          on_stdout=on_stdout)
         
         print(f"DEBUG: Claude process started with PID: {process.pid}")
         
-        # Start a thread to monitor the process and close the file when done
-        threading.Thread(target=monitor_process, args=(process, output_file), daemon=True).start()
-        
         return process
     except Exception as e:
         print(f"DEBUG: Error in run_claude_command_streaming: {e}")
         return None
 
-def monitor_process(process, output_file):
-    """Monitor a process and close the output file when it completes"""
-    try:
-        # Wait for the process to complete
-        process.wait()
-        print(f"DEBUG: Process {process.pid} completed with return code {process.returncode}")
-        
-        # Close the output file
-        if output_file and not output_file.closed:
-            output_file.close()
-            print(f"DEBUG: Output file closed for process {process.pid}")
-            
-        # Check for any stderr output
-        if process.stderr:
-            stderr_output = process.stderr.read()
-            if stderr_output:
-                print(f"DEBUG: Process stderr: {stderr_output}")
-                
-    except Exception as e:
-        print(f"DEBUG: Error monitoring process: {e}")
-        if output_file and not output_file.closed:
-            output_file.close()
-
 def get_output_file_path(task_id):
     """Get the path for the Claude output file for a specific task"""
     # Store output files in a separate directory to avoid committing them with code changes
@@ -107,6 +150,10 @@ def get_output_file_path(task_id):
     os.makedirs(output_dir, exist_ok=True)
     return os.path.join(output_dir, 'claude_output.jsonl')
 
+def get_stderr_file_path(output_file_path):
+    """Get the path of the stderr log kept next to a Claude output file"""
+    return os.path.join(os.path.dirname(output_file_path), 'claude_stderr.log')
+
 def read_streaming_output(output_file_path):
     """Generator function to read streaming output from Claude"""
     if not os.path.exists(output_file_path):
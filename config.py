@@ -5,13 +5,17 @@ import json
 CONFIG_FILE = 'config.json'
 TASKS_DIR = 'tasks'
 TASKS_FILE = os.path.join(TASKS_DIR, 'tasks.json')
+TASKS_DB = os.path.join(TASKS_DIR, 'tasks.db')
 UPLOAD_FOLDER = os.path.join('static', 'uploads')
 WORKSPACES_DIR = 'workspaces'
 OUTPUTS_DIR = 'outputs'
+MIRRORS_DIR = 'mirrors'
+JOBS_DIR = 'jobs'
+DIFF_CACHE_DIR = 'diff_cache'
 ALLOWED_EXTENSIONS = {'csv'}
 
 # Ensure directories exist
-for directory in [TASKS_DIR, UPLOAD_FOLDER, WORKSPACES_DIR, OUTPUTS_DIR]:
+for directory in [TASKS_DIR, UPLOAD_FOLDER, WORKSPACES_DIR, OUTPUTS_DIR, MIRRORS_DIR, JOBS_DIR, DIFF_CACHE_DIR]:
     os.makedirs(directory, exist_ok=True)
 
 # Initialize config if it doesn't exist
@@ -33,9 +37,10 @@ def save_config(config):
         json.dump(config, f)
 
 def load_tasks():
-    with open(TASKS_FILE, 'r') as f:
-        return json.load(f)
+    # Imported here because task_cache depends on the constants above
+    from task_cache import task_repository
+    return task_repository.all()
 
 def save_tasks(tasks):
-    with open(TASKS_FILE, 'w') as f:
-        json.dump(tasks, f)
+    from task_cache import task_repository
+    task_repository.save_all(tasks)
@@ -0,0 +1,297 @@
+"""
+Streaming CSV import
+
+Ticket exports can have hundreds of thousands of rows. An upload is saved to
+disk and imported by a background job that:
+
+- resolves the column layout once from the header row (case-insensitive),
+- reads the file row by row and builds tasks a chunk at a time,
+- inserts each chunk with a single add_tasks() call (one store transaction),
+- reports rows read, tasks added and the share of the file processed through
+  the job, so the browser can show progress via /jobs/<id>.
+
+Memory use is bounded by the chunk size, not the file size: only the set of
+known tickets (needed to skip duplicates) grows with the import.
+
+Each task keeps a hash of the fields its row set (source_hash). In upsert
+mode a re-exported ticket is updated only when its row's hash differs, so
+re-syncing a large export touches just the tickets that changed in Jira;
+workspaces and run history are kept. Tickets missing from the new export are
+counted as removed and can be archived (task['archived_at']), which hides
+them from the task list until they show up in an import again.
+
+Configured in config.json:
+    csv_import_batch_size  rows inserted per store transaction (default 1000)
+"""
+import os
+import csv
+import uuid
+import hashlib
+from datetime import datetime
+
+from config import WORKSPACES_DIR, load_config
+from task_cache import add_tasks, update_tasks, find_task_by_ticket, get_existing_tickets, load_tasks
+from jobs import JobError
+from batches import BUSY_STATUSES, DEFAULT_PROMPT_TEMPLATE, start_batch
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_ERROR_ROWS = 20  # error messages kept for the result; the rest are only counted
+
+# Task field -> header name in the export
+COLUMNS = {
+    'ticket': 'ticket',
+    'task': 'task',
+    'link': 'link',
+    'priority': 'priority',
+    'assignee': 'assign',
+    'state': 'state',
+}
+REQUIRED_COLUMNS = ('ticket', 'task')
+
+
+def resolve_columns(header):
+    """Map each task field to its column index (exact name first, then case-insensitive).
+
+    Fields whose column is missing map to None.
+    """
+    names = [name.strip() for name in header]
+    columns = {}
+    for field, column_name in COLUMNS.items():
+        if column_name in names:
+            columns[field] = names.index(column_name)
+        else:
+            lowered = [name.lower() for name in names]
+            columns[field] = lowered.index(column_name) if column_name in lowered else None
+    return columns
+
+
+def read_rows(reader, columns):
+    """Yield (line number, {field: stripped value}) for every data row of a csv.reader"""
+    for row in reader:
+        values = {}
+        for field, index in columns.items():
+            values[field] = row[index].strip() if index is not None and index < len(row) else ''
+        yield reader.line_num, values
+
+
+def task_fields(values):
+    """The task fields a CSV row sets, with defaults for missing values"""
+    return {
+        'ticket': values['ticket'],
+        'task': values['task'],
+        'link': values['link'],
+        'priority': values['priority'] or 'Medium',
+        'assignee': values['assignee'],
+        'state': values['state'] or 'Ready',
+    }
+
+
+def source_hash(fields):
+    """Hash of the imported fields, used to tell whether a re-exported row changed"""
+    data = '\x1f'.join(str(fields.get(field) or '') for field in COLUMNS)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def build_task(fields, row_hash):
+    task_id = str(uuid.uuid4())
+    return dict(fields, **{
+        'id': task_id,
+        'prompt': '',
+        'status': 'new',  # new, started, actioned, completed
+        'created_at': datetime.now().isoformat(),
+        'workspace_dir': os.path.join(WORKSPACES_DIR, task_id),
+        'source_hash': row_hash,
+    })
+
+
+class ImportStats:
+    """Counters for an import, reported as job progress and result"""
+
+    def __init__(self, total_bytes, upsert=False):
+        self.total_bytes = total_bytes
+        self.upsert = upsert
+        self.bytes_read = 0
+        self.rows = 0
+        self.added = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.removed = 0
+        self.archived = 0
+        self.skipped = 0
+        self.duplicates = 0
+        self.errors = 0
+        self.error_rows = []
+
+    def error(self, message):
+        self.errors += 1
+        if len(self.error_rows) < MAX_ERROR_ROWS:
+            self.error_rows.append(message)
+
+    def to_dict(self):
+        return {
+            'upsert': self.upsert,
+            'rows': self.rows,
+            'added': self.added,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'removed': self.removed,
+            'archived': self.archived,
+            'skipped': self.skipped,
+            'duplicates': self.duplicates,
+            'errors': self.errors,
+            'error_rows': list(self.error_rows),
+            'bytes_read': self.bytes_read,
+            'total_bytes': self.total_bytes,
+        }
+
+
+def _upsert_row(task, fields, row_hash, stats, updates):
+    """Queue an update for an existing task if its row changed (or it was archived)"""
+    stored_hash = task.get('source_hash') or source_hash(task)
+    if stored_hash == row_hash and not task.get('archived_at'):
+        stats.unchanged += 1
+        return
+    updates[task['id']] = dict(fields, source_hash=row_hash, archived_at=None)
+    stats.updated += 1
+
+
+def archive_missing(seen_tickets, stats, batch_size):
+    """Archive tasks whose ticket was not in the import (running tasks are only counted)"""
+    updates = {}
+    archived_at = datetime.now().isoformat()
+    for task in load_tasks():
+        if task.get('ticket') in seen_tickets or task.get('archived_at'):
+            continue
+        stats.removed += 1
+        if task.get('status') in BUSY_STATUSES:
+            continue
+        updates[task['id']] = {'archived_at': archived_at}
+        if len(updates) >= batch_size:
+            stats.archived += len(update_tasks(updates))
+            updates = {}
+    stats.archived += len(update_tasks(updates))
+
+
+def import_csv(filepath, config, on_progress=None, on_added=None, upsert=False, archive=False):
+    """Import the tasks in a CSV file in chunks; returns the ImportStats.
+
+    Rows assigned to someone who is not in the configured assignees are
+    skipped. Rows whose ticket is already known are skipped too, unless upsert
+    is set: then the task's imported fields are updated when the row's hash
+    differs from the one stored at the last import. With upsert, tasks whose
+    ticket is not in the file are counted as removed and, if archive is set,
+    archived. on_progress(stats) is called after each chunk and
+    on_added(tasks) with each inserted chunk.
+    Raises JobError if the file has no ticket or task column.
+    """
+    assignees = {assignee.strip() for assignee in config.get('assignees', [])}
+    batch_size = max(1, int(config.get('csv_import_batch_size', DEFAULT_BATCH_SIZE)))
+    existing_tickets = get_existing_tickets()
+    seen_tickets = set()  # every ticket in the file
+    imported_tickets = set()  # tickets whose row was imported
+    stats = ImportStats(os.path.getsize(filepath), upsert)
+
+    with open(filepath, 'r', encoding='utf-8-sig', newline='') as csvfile:
+        reader = csv.reader(csvfile)
+
+        def flush(chunk, updates):
+            if chunk:
+                add_tasks(chunk)
+                stats.added += len(chunk)
+                if on_added:
+                    on_added(chunk)
+            if updates:
+                update_tasks(updates)
+            # Position in the underlying binary file (ahead of the parser by at most one read buffer)
+            stats.bytes_read = csvfile.buffer.tell()
+            if on_progress:
+                on_progress(stats)
+
+        try:
+            header = next(reader, None)
+            if not header:
+                raise JobError('The CSV file is empty')
+            columns = resolve_columns(header)
+            for field in REQUIRED_COLUMNS:
+                if columns[field] is None:
+                    raise JobError(f'The CSV file has no "{COLUMNS[field].capitalize()}" column')
+
+            chunk = []
+            updates = {}
+            for line_num, values in read_rows(reader, columns):
+                stats.rows += 1
+                ticket = values['ticket']
+                if not ticket:
+                    stats.error(f'Line {line_num}: missing ticket')
+                    continue
+                # Still in the file even if the row is skipped below, so its task is never archived
+                seen_tickets.add(ticket)
+                if not values['task']:
+                    stats.error(f'Line {line_num}: missing task name')
+                    continue
+                if assignees and values['assignee'] not in assignees:
+                    stats.skipped += 1
+                    continue
+                if ticket in imported_tickets or (ticket in existing_tickets and not upsert):
+                    stats.duplicates += 1
+                    continue
+                imported_tickets.add(ticket)
+
+                fields = task_fields(values)
+                row_hash = source_hash(fields)
+                task = find_task_by_ticket(ticket) if ticket in existing_tickets else None
+                if task is not None:
+                    _upsert_row(task, fields, row_hash, stats, updates)
+                else:
+                    chunk.append(build_task(fields, row_hash))
+                if len(chunk) + len(updates) >= batch_size:
+                    flush(chunk, updates)
+                    chunk = []
+                    updates = {}
+            flush(chunk, updates)
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise JobError(f'CSV processing error after importing {stats.added} tasks: {e}')
+        stats.bytes_read = stats.total_bytes
+
+    if upsert:
+        if archive:
+            archive_missing(seen_tickets, stats, batch_size)
+        else:
+            stats.removed = sum(1 for task in load_tasks()
+                                if task.get('ticket') not in seen_tickets and not task.get('archived_at'))
+
+    if stats.skipped:
+        print(f"DEBUG: Skipped {stats.skipped} rows whose assignee is not in the configured assignees: {sorted(assignees)}")
+    if stats.errors:
+        print(f"DEBUG: {stats.errors} CSV rows could not be imported: {stats.error_rows}")
+    return stats
+
+
+def import_csv_job(job, filepath, start_imported=False, upsert=False, archive=False):
+    """Job: import an uploaded CSV file, optionally starting the new tasks as a batch"""
+    config = load_config()
+    imported_ids = []
+
+    def on_progress(stats):
+        percent = int(100 * stats.bytes_read / stats.total_bytes) if stats.total_bytes else 100
+        message = f'Imported {stats.added} of {stats.rows} rows read ({percent}%)'
+        if upsert:
+            message = (f'{stats.rows} rows read ({percent}%): {stats.added} added, '
+                       f'{stats.updated} updated, {stats.unchanged} unchanged')
+        job.progress(message, progress=stats.to_dict())
+
+    def on_added(tasks):
+        if start_imported:
+            imported_ids.extend(task['id'] for task in tasks)
+
+    try:
+        stats = import_csv(filepath, config, on_progress, on_added, upsert=upsert, archive=archive)
+    finally:
+        os.remove(filepath)
+
+    result = stats.to_dict()
+    result['batch_job_id'] = None
+    if imported_ids:
+        batch_job = start_batch(imported_ids, config.get('batch_prompt_template', DEFAULT_PROMPT_TEMPLATE))
+        result['batch_job_id'] = batch_job.id
+    return result
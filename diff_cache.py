@@ -0,0 +1,256 @@
+"""
+Diff results cached against the state of the workspace
+
+Computing a diff means reading every changed file, and it was redone after
+every action, follow-up, completion and page view even when nothing had
+changed. Results are now memoized against a fingerprint of the workspace:
+
+    <HEAD commit>:<tree of the working directory>
+
+The tree comes from `git write-tree` on a throwaway copy of the index after
+`git add -A`, so it covers staged, unstaged and untracked changes without
+touching the real index. Any edit gives a new fingerprint, so entries never go
+stale; old ones simply age out.
+
+Building that tree copies the index and runs git twice, so it is only redone
+when a stat walk of the workspace (file and directory mtimes and ctimes, sizes
+and count, plus the index) differs from the one it was built for. Walks that find files
+modified in the last couple of seconds are not trusted, since a further write
+within the filesystem's timestamp resolution would not show up.
+
+Results that are errors are not cached, so a failed diff is retried.
+
+Entries live in a bounded LRU in memory and are persisted as JSON files under
+diff_cache/ so they survive restarts.
+
+Configured in config.json:
+    diff_cache_entries  maximum number of cached results (default 500)
+    diff_cache_mb       maximum total size of cached results (default 200)
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+from collections import OrderedDict
+
+from config import DIFF_CACHE_DIR, load_config
+from metrics import DIFF_DURATION
+from offload import run_blocking
+
+DEFAULT_MAX_ENTRIES = 500
+DEFAULT_MAX_MB = 200
+MAX_TREE_MEMO = 1000  # workspaces whose last worktree tree is remembered
+RACY_SECONDS = 2  # files modified this recently make a stat walk untrustworthy
+
+
+def _git(workspace_dir, *args, env=None):
+    result = subprocess.run(['git', *args], cwd=workspace_dir, env=env, check=True,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    return result.stdout.strip()
+
+
+def worktree_tree(workspace_dir):
+    """Tree id of everything in the working directory (tracked, modified and untracked files).
+
+    Built on a copy of the index so the workspace's own index is untouched.
+    Raises subprocess.CalledProcessError if git fails.
+    """
+    git_dir = _git(workspace_dir, 'rev-parse', '--absolute-git-dir')
+    with tempfile.TemporaryDirectory() as temp_dir:
+        index_path = os.path.join(temp_dir, 'index')
+        if os.path.exists(os.path.join(git_dir, 'index')):
+            shutil.copy2(os.path.join(git_dir, 'index'), index_path)
+        env = dict(os.environ, GIT_INDEX_FILE=index_path)
+        _git(workspace_dir, 'add', '-A', env=env)
+        return _git(workspace_dir, 'write-tree', env=env)
+
+
+def worktree_stat(workspace_dir, git_dir):
+    """Summary of the stat data of everything in the working directory and the index.
+
+    Returns None if something in it was modified too recently to rely on.
+    """
+    newest = 0
+    changed = 0
+    count = 0
+    size = 0
+    stack = [workspace_dir]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name == '.git':
+                continue
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            newest = max(newest, st.st_mtime_ns)
+            changed = max(changed, st.st_ctime_ns)
+            count += 1
+            size += st.st_size
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+    try:
+        st = os.stat(os.path.join(git_dir, 'index'))
+        index = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        index = None
+    if newest / 1e9 > time.time() - RACY_SECONDS:
+        return None
+    return (newest, changed, count, size, index)
+
+
+_tree_memo = OrderedDict()  # workspace dir -> (worktree stat, tree)
+_tree_memo_lock = threading.Lock()
+
+
+def _memoized_worktree_tree(workspace_dir, git_dir):
+    """worktree_tree(), reused while the working directory's stat data is unchanged"""
+    key = os.path.abspath(workspace_dir)
+    stat = run_blocking(worktree_stat, workspace_dir, git_dir)
+    with _tree_memo_lock:
+        memo = _tree_memo.get(key)
+        if stat is not None and memo and memo[0] == stat:
+            _tree_memo.move_to_end(key)
+            return memo[1]
+    tree = worktree_tree(workspace_dir)
+    if stat is not None:
+        with _tree_memo_lock:
+            _tree_memo[key] = (stat, tree)
+            _tree_memo.move_to_end(key)
+            while len(_tree_memo) > MAX_TREE_MEMO:
+                _tree_memo.popitem(last=False)
+    return tree
+
+
+def workspace_fingerprint(workspace_dir):
+    """HEAD plus the tree of the working directory, or None if it is not a git workspace"""
+    if not workspace_dir or not os.path.isdir(workspace_dir):
+        return None
+    try:
+        git_dir, head = _git(workspace_dir, 'rev-parse', '--absolute-git-dir', 'HEAD').splitlines()
+        tree = _memoized_worktree_tree(workspace_dir, git_dir)
+    except subprocess.CalledProcessError as e:
+        print(f"DEBUG: Could not fingerprint workspace {workspace_dir}: {e.stderr}")
+        return None
+    return f"{head}:{tree}"
+
+
+class DiffCache:
+    """LRU of diff results, persisted to disk"""
+
+    def __init__(self, cache_dir=DIFF_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key hash -> {'value': ..., 'size': ...}; value None until loaded
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        # Pick up what an earlier run persisted, least recently used first
+        paths = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.endswith('.json')]
+        for path in sorted(paths, key=os.path.getmtime):
+            size = os.path.getsize(path)
+            self._entries[os.path.basename(path)[:-len('.json')]] = {'value': None, 'size': size}
+            self._size += size
+
+    def _path(self, key_hash):
+        return os.path.join(self.cache_dir, key_hash + '.json')
+
+    @staticmethod
+    def _hash(key):
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """The cached value for key, or None"""
+        key_hash = self._hash(key)
+        with self._lock:
+            entry = self._entries.get(key_hash)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key_hash)
+            if entry['value'] is None:
+                try:
+                    with open(self._path(key_hash), 'r') as f:
+                        entry['value'] = json.load(f)['value']
+                except (OSError, ValueError):
+                    self._drop(key_hash)
+                    self.misses += 1
+                    return None
+            self.hits += 1
+            return entry['value']
+
+    def put(self, key, value):
+        key_hash = self._hash(key)
+        data = json.dumps({'key': key, 'value': value})
+        config = load_config()
+        max_entries = int(config.get('diff_cache_entries', DEFAULT_MAX_ENTRIES))
+        max_size = float(config.get('diff_cache_mb', DEFAULT_MAX_MB)) * 1024 * 1024
+        if len(data) > max_size:
+            return
+        with self._lock:
+            if key_hash in self._entries:
+                self._drop(key_hash)
+            tmp_path = self._path(key_hash) + '.tmp'
+            try:
+                with open(tmp_path, 'w') as f:
+                    f.write(data)
+                os.replace(tmp_path, self._path(key_hash))
+            except OSError as e:
+                print(f"DEBUG: Could not persist diff cache entry: {e}")
+            self._entries[key_hash] = {'value': value, 'size': len(data)}
+            self._size += len(data)
+            while len(self._entries) > max_entries or self._size > max_size:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key_hash):
+        entry = self._entries.pop(key_hash)
+        self._size -= entry['size']
+        if os.path.exists(self._path(key_hash)):
+            os.remove(self._path(key_hash))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'size': self._size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+diff_cache = DiffCache()
+
+
+def cached_diff(workspace_dir, kind, compute, fingerprint=None):
+    """compute() memoized for the workspace's current state; kind names what is computed.
+
+    Pass fingerprint if it is already known. Without one (not a git workspace)
+    nothing is cached.
+    """
+    fingerprint = fingerprint or workspace_fingerprint(workspace_dir)
+    if fingerprint is None:
+        return _compute(kind, compute)
+    key = f"{os.path.abspath(workspace_dir)}|{kind}|{fingerprint}"
+    value = diff_cache.get(key)
+    if value is None:
+        value = _compute(kind, compute)
+        diff_cache.put(key, value)
+    return value
+
+
+def _compute(kind, compute):
+    # Timed per kind of diff, without the file path or page in the label
+    with DIFF_DURATION.time(kind=kind.split(':', 1)[0]):
+        return compute()
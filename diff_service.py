@@ -0,0 +1,165 @@
+"""
+Paginated per-file diffs of a task workspace
+
+Large refactors make a single `git diff` too big to ship or render at once.
+The diff service first returns a `git diff --numstat` style file list (paged),
+and each file's diff is then fetched on demand a page of lines at a time, so a
+browser never has to hold more than it shows. Changes are taken against HEAD
+and include untracked new files, which plain `git diff` leaves out.
+
+    list_diff_files(workspace_dir)                  -> [{'path', 'added', 'deleted', 'binary', 'untracked'}]
+    get_file_diff(workspace_dir, path, offset, limit) -> one page of a file's diff lines
+"""
+import os
+import subprocess
+
+DEFAULT_FILES_PER_PAGE = 100
+DEFAULT_LINES_PER_PAGE = 500
+MAX_LINES_PER_PAGE = 2000
+MAX_LINE_LENGTH = 2000  # characters kept of a single diff line (minified files etc.)
+BINARY_SNIFF_BYTES = 8000
+
+
+class DiffError(Exception):
+    """The workspace or file cannot be diffed; the message is shown to the user"""
+
+
+def _git(workspace_dir, *args):
+    result = subprocess.run(['git', '-c', 'core.quotePath=false', *args], cwd=workspace_dir,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise DiffError(result.stderr.decode('utf-8', errors='replace').strip() or 'git failed')
+    return result.stdout
+
+
+def _check_workspace(workspace_dir):
+    if not workspace_dir or not os.path.isdir(workspace_dir):
+        raise DiffError('Workspace not available')
+
+
+def list_untracked(workspace_dir):
+    """Untracked files that are not ignored, relative to the workspace"""
+    output = _git(workspace_dir, 'ls-files', '--others', '--exclude-standard', '-z')
+    return [path for path in output.decode('utf-8', errors='replace').split('\0') if path]
+
+
+def _count_untracked(workspace_dir, path):
+    """numstat-style counts for an untracked file: every line is added"""
+    with open(os.path.join(workspace_dir, path), 'rb') as f:
+        if b'\0' in f.read(BINARY_SNIFF_BYTES):
+            return None
+        f.seek(0)
+        lines = 0
+        last = b''
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            lines += chunk.count(b'\n')
+            last = chunk
+        if last and not last.endswith(b'\n'):
+            lines += 1
+        return lines
+
+
+def list_diff_files(workspace_dir):
+    """Changed files with added/deleted line counts, tracked changes first"""
+    _check_workspace(workspace_dir)
+    files = []
+    output = _git(workspace_dir, 'diff', 'HEAD', '--numstat', '--no-renames', '-z')
+    for entry in output.decode('utf-8', errors='replace').split('\0'):
+        if not entry:
+            continue
+        added, deleted, path = entry.split('\t', 2)
+        binary = added == '-'
+        files.append({
+            'path': path,
+            'added': 0 if binary else int(added),
+            'deleted': 0 if binary else int(deleted),
+            'binary': binary,
+            'untracked': False,
+        })
+
+    for path in list_untracked(workspace_dir):
+        try:
+            lines = _count_untracked(workspace_dir, path)
+        except OSError:
+            continue
+        files.append({
+            'path': path,
+            'added': lines or 0,
+            'deleted': 0,
+            'binary': lines is None,
+            'untracked': True,
+        })
+    return files
+
+
+def paginate_files(files, page=1, per_page=DEFAULT_FILES_PER_PAGE):
+    """One page of a file list plus totals for the whole diff"""
+    per_page = max(1, per_page)
+    pages = max(1, (len(files) + per_page - 1) // per_page)
+    page = min(max(1, page), pages)
+    return {
+        'files': files[(page - 1) * per_page:page * per_page],
+        'page': page,
+        'per_page': per_page,
+        'pages': pages,
+        'total_files': len(files),
+        'added': sum(f['added'] for f in files),
+        'deleted': sum(f['deleted'] for f in files),
+    }
+
+
+def _file_diff_args(workspace_dir, path):
+    """git arguments that diff one changed file"""
+    if path in list_untracked(workspace_dir):
+        return ['diff', '--no-index', '--', os.devnull, path]
+    tracked = _git(workspace_dir, 'diff', 'HEAD', '--name-only', '--no-renames', '-z', '--', path)
+    if path not in tracked.decode('utf-8', errors='replace').split('\0'):
+        raise DiffError(f'{path} has no changes')
+    return ['diff', 'HEAD', '--no-renames', '--', path]
+
+
+def get_file_diff(workspace_dir, path, offset=0, limit=DEFAULT_LINES_PER_PAGE):
+    """Lines offset..offset+limit of one file's diff.
+
+    Only the lines up to the end of the page are read from git, so later
+    pages of a huge file cost no more to produce than the first.
+    """
+    _check_workspace(workspace_dir)
+    offset = max(0, offset)
+    limit = min(max(1, limit), MAX_LINES_PER_PAGE)
+    args = _file_diff_args(workspace_dir, path)
+
+    lines = []
+    hunks = 0
+    truncated_lines = 0
+    has_more = False
+    process = subprocess.Popen(['git', '-c', 'core.quotePath=false', *args], cwd=workspace_dir,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        for number, raw in enumerate(process.stdout):
+            if number >= offset + limit:
+                has_more = True
+                break
+            if raw.startswith(b'@@'):
+                hunks += 1
+            if number < offset:
+                continue
+            line = raw.decode('utf-8', errors='replace').rstrip('\n')
+            if len(line) > MAX_LINE_LENGTH:
+                line = line[:MAX_LINE_LENGTH] + ' [line truncated]'
+                truncated_lines += 1
+            lines.append(line)
+    finally:
+        process.stdout.close()
+        process.kill()
+        process.wait()
+
+    return {
+        'path': path,
+        'offset': offset,
+        'limit': limit,
+        'lines': lines,
+        'hunks_seen': hunks,  # hunks that start before the end of this page
+        'truncated_lines': truncated_lines,
+        'next_offset': offset + len(lines) if has_more else None,
+    }
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Claude CLI simulator for offline load testing
+
+Stands in for the `claude` binary with the command lines claude_cli.py uses:
+
+    fake_claude.py -p "<prompt>" --output-format stream-json [--dangerously-skip-permissions]
+    echo "<prompt>" | fake_claude.py plan|act [--dangerously-skip-permissions]
+
+In print mode it writes a stream-json session shaped like a real one (an init
+event, assistant text, tool calls and their results, a final result event) at a
+configurable rate and size, and can edit files in the working directory so the
+diff paths have something to show. It can also fail part-way (error result,
+exit code 1) or hang until it is killed, to exercise error handling, the
+scheduler and the Stop button.
+
+The app runs it instead of `claude` when claude_simulator is set; see
+get_claude_command() in claude_cli.py, which turns the simulator_* settings
+into the --sim-* options below.
+
+Configured in config.json:
+    claude_simulator          run this simulator instead of claude (default false)
+    simulator_events          events per session (default 60)
+    simulator_rate            events per second, 0 for as fast as possible (default 10)
+    simulator_event_size      characters of text or tool output per event (default 400)
+    simulator_edit_files      files edited in the workspace per session (default 2)
+    simulator_failure_rate    share of sessions that fail part-way, 0-1 (default 0)
+    simulator_hang_rate       share of sessions that stop producing output and hang, 0-1 (default 0)
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+
+DEFAULTS = {
+    'events': 60,
+    'rate': 10.0,
+    'event_size': 400,
+    'edit_files': 2,
+    'failure_rate': 0.0,
+    'hang_rate': 0.0,
+}
+TOOLS = ('Read', 'Edit', 'Bash', 'Grep', 'Glob', 'Write')
+WORDS = ('the', 'function', 'test', 'handler', 'update', 'config', 'request', 'value', 'error', 'check',
+         'return', 'module', 'change', 'file', 'line', 'should', 'call', 'data', 'fix', 'case')
+SKIP_DIRS = {'.git', 'node_modules', '__pycache__', '.venv', 'venv'}
+MAX_EDIT_SIZE = 1024 * 1024  # files larger than this are not edited
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Simulated Claude CLI for load testing')
+    parser.add_argument('mode', nargs='?', choices=('plan', 'act'), help='text mode: read the prompt from stdin')
+    parser.add_argument('-p', '--print', dest='prompt', help='print mode prompt')
+    parser.add_argument('--output-format', default='text', choices=('text', 'json', 'stream-json'))
+    parser.add_argument('--dangerously-skip-permissions', action='store_true')
+    parser.add_argument('--verbose', action='store_true')
+    parser.add_argument('--sim-events', type=int, default=DEFAULTS['events'])
+    parser.add_argument('--sim-rate', type=float, default=DEFAULTS['rate'])
+    parser.add_argument('--sim-event-size', type=int, default=DEFAULTS['event_size'])
+    parser.add_argument('--sim-edit-files', type=int, default=DEFAULTS['edit_files'])
+    parser.add_argument('--sim-failure-rate', type=float, default=DEFAULTS['failure_rate'])
+    parser.add_argument('--sim-hang-rate', type=float, default=DEFAULTS['hang_rate'])
+    parser.add_argument('--sim-seed', type=int, help='seed for repeatable sessions')
+    # Other flags the real CLI accepts are ignored
+    args, _ = parser.parse_known_args(argv)
+    return args
+
+
+def filler(rng, size):
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)[:size]
+
+
+def pick_files(rng, root, count):
+    """Up to count small text files under root (new files are created if there are too few)"""
+    candidates = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if name not in SKIP_DIRS]
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                if os.path.getsize(path) <= MAX_EDIT_SIZE:
+                    candidates.append(os.path.relpath(path, root))
+            except OSError:
+                continue
+        if len(candidates) >= 200:
+            break
+    rng.shuffle(candidates)
+    files = candidates[:count]
+    files += [f'simulated_change_{i}.txt' for i in range(count - len(files))]
+    return files
+
+
+def edit_file(path, text):
+    """Append a line to a text file (binary files are left alone); returns False if it was skipped"""
+    try:
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                if b'\0' in f.read(8192):
+                    return False
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(f'\n{text}\n')
+        return True
+    except OSError:
+        return False
+
+
+class Session:
+    """Writes one simulated stream-json session to stdout"""
+
+    def __init__(self, args, rng, out=sys.stdout):
+        self.args = args
+        self.rng = rng
+        self.out = out
+        self.session_id = str(uuid.uuid4())
+        self.started = time.time()
+        self.turns = 0
+        self.tool_seq = 0
+
+    def emit(self, event):
+        self.out.write(json.dumps(event) + '\n')
+        self.out.flush()
+        if self.args.sim_rate > 0:
+            time.sleep(1.0 / self.args.sim_rate)
+
+    def assistant(self, content):
+        self.turns += 1
+        self.emit({'type': 'assistant', 'session_id': self.session_id,
+                   'message': {'id': f'msg_{uuid.uuid4().hex[:24]}', 'role': 'assistant', 'content': content}})
+
+    def tool_call(self, name, tool_input, output, is_error=False):
+        self.tool_seq += 1
+        tool_id = f'toolu_{self.tool_seq:06d}'
+        self.assistant([{'type': 'tool_use', 'id': tool_id, 'name': name, 'input': tool_input}])
+        self.emit({'type': 'user', 'session_id': self.session_id,
+                   'message': {'role': 'user', 'content': [
+                       {'type': 'tool_result', 'tool_use_id': tool_id, 'content': output, 'is_error': is_error}]}})
+
+    def result(self, text, is_error=False):
+        self.emit({
+            'type': 'result',
+            'subtype': 'error_during_execution' if is_error else 'success',
+            'is_error': is_error,
+            'duration_ms': int((time.time() - self.started) * 1000),
+            'num_turns': self.turns,
+            'result': text,
+            'session_id': self.session_id,
+            'total_cost_usd': 0,
+        })
+
+    def plan(self):
+        """The sequence of events: mostly text and reads, with the file edits spread through it"""
+        steps = max(1, self.args.sim_events - 2)
+        edits = pick_files(self.rng, os.getcwd(), self.args.sim_edit_files) if self.args.sim_edit_files > 0 else []
+        kinds = ['edit'] * len(edits) + ['text', 'tool'] * steps
+        kinds = kinds[:max(steps, len(edits))]
+        self.rng.shuffle(kinds)
+        return kinds, edits
+
+    def run(self, prompt):
+        """Returns the exit code"""
+        args = self.args
+        size = max(1, args.sim_event_size)
+        self.emit({'type': 'system', 'subtype': 'init', 'session_id': self.session_id, 'cwd': os.getcwd(),
+                   'model': 'claude-simulator', 'tools': list(TOOLS),
+                   'permissionMode': 'bypassPermissions' if args.dangerously_skip_permissions else 'default'})
+        kinds, edits = self.plan()
+        fail_at = self.rng.randrange(len(kinds)) if self.rng.random() < args.sim_failure_rate else None
+        hang_at = self.rng.randrange(len(kinds)) if self.rng.random() < args.sim_hang_rate else None
+
+        for step, kind in enumerate(kinds):
+            if step == hang_at:
+                sys.stderr.write('simulator: hanging until killed\n')
+                sys.stderr.flush()
+                while True:
+                    time.sleep(60)
+            if step == fail_at:
+                sys.stderr.write('simulator: API Error: 529 overloaded (simulated)\n')
+                sys.stderr.flush()
+                self.result('API Error: 529 overloaded (simulated)', is_error=True)
+                return 1
+            if kind == 'text':
+                self.assistant([{'type': 'text', 'text': filler(self.rng, size)}])
+            elif kind == 'tool':
+                name = self.rng.choice(('Read', 'Grep', 'Bash'))
+                self.tool_call(name, {'pattern' if name == 'Grep' else 'command' if name == 'Bash' else 'file_path':
+                                      filler(self.rng, 40)}, filler(self.rng, size))
+            else:
+                path = edits.pop()
+                changed = edit_file(path, f'# {filler(self.rng, 60)}')
+                self.tool_call('Edit', {'file_path': path, 'old_string': '', 'new_string': filler(self.rng, 60)},
+                               'File updated' if changed else 'Could not edit file', is_error=not changed)
+
+        self.result(f'Finished: {prompt[:200]}')
+        return 0
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    rng = random.Random(args.sim_seed)
+
+    if args.mode:
+        # Text mode (plan/act): the prompt comes on stdin, the answer is plain text
+        prompt = sys.stdin.read().strip()
+        time.sleep(args.sim_events / args.sim_rate if args.sim_rate > 0 else 0)
+        if rng.random() < args.sim_failure_rate:
+            sys.stderr.write('simulator: API Error: 529 overloaded (simulated)\n')
+            return 1
+        if args.mode == 'act' and args.sim_edit_files > 0:
+            for path in pick_files(rng, os.getcwd(), args.sim_edit_files):
+                edit_file(path, f'# {filler(rng, 60)}')
+        print(f'Simulated {args.mode} for: {prompt[:200]}\n\n{filler(rng, args.sim_event_size)}')
+        return 0
+
+    if args.prompt is None:
+        sys.stderr.write('simulator: only print mode (-p) and plan/act are supported\n')
+        return 2
+    if args.output_format != 'stream-json':
+        with open(os.devnull, 'w') as devnull:
+            code = Session(args, rng, out=devnull).run(args.prompt)
+        print(f'Finished: {args.prompt[:200]}' if not code else 'API Error: 529 overloaded (simulated)')
+        return code
+    return Session(args, rng).run(args.prompt)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
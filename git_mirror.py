@@ -0,0 +1,164 @@
+"""
+Local mirror cache for task workspaces
+
+Instead of running a full network clone for every task, each configured
+repository is kept as a bare mirror under mirrors/ that is updated with an
+incremental fetch. Task workspaces are then created as --shared clones of the
+mirror: the objects are borrowed from the mirror, so creating a workspace only
+costs a checkout. The workspace's origin is pointed back at the real
+repository so pushes go upstream as before.
+
+Because workspaces borrow objects from the mirror, the mirror is configured
+never to prune unreachable objects.
+"""
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import threading
+import subprocess
+from datetime import datetime
+
+from config import MIRRORS_DIR
+
+DEFAULT_FETCH_INTERVAL = 60  # seconds before a mirror is fetched again
+
+_mirror_locks = {}
+_mirror_locks_lock = threading.Lock()
+
+
+def _get_lock(mirror_dir):
+    with _mirror_locks_lock:
+        return _mirror_locks.setdefault(mirror_dir, threading.Lock())
+
+
+def run_git(command, cwd=None):
+    return subprocess.run(f'git {command}', shell=True, check=True, cwd=cwd,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+def get_mirror_dir(repo_url):
+    """Get the mirror directory for a repository URL"""
+    name = re.sub(r'[^A-Za-z0-9._-]+', '_', repo_url.rstrip('/').split('/')[-1])
+    if name.endswith('.git'):
+        name = name[:-4]
+    digest = hashlib.sha1(repo_url.encode('utf-8')).hexdigest()[:10]
+    return os.path.join(MIRRORS_DIR, f'{name}-{digest}.git')
+
+
+def _stats_path(mirror_dir):
+    return mirror_dir + '.json'
+
+
+def _load_stats(mirror_dir):
+    try:
+        with open(_stats_path(mirror_dir), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_stats(mirror_dir, stats):
+    with open(_stats_path(mirror_dir), 'w') as f:
+        json.dump(stats, f)
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for filename in files:
+            try:
+                total += os.path.getsize(os.path.join(root, filename))
+            except OSError:
+                pass
+    return total
+
+
+def update_mirror(repo_url, fetch_interval=DEFAULT_FETCH_INTERVAL, force=False):
+    """Create the bare mirror, or fetch into it if it is older than fetch_interval"""
+    mirror_dir = get_mirror_dir(repo_url)
+    with _get_lock(mirror_dir):
+        stats = _load_stats(mirror_dir)
+        started = time.time()
+
+        if not os.path.exists(os.path.join(mirror_dir, 'HEAD')):
+            if os.path.exists(mirror_dir):
+                shutil.rmtree(mirror_dir)
+            print(f"DEBUG: Creating mirror of {repo_url} in {mirror_dir}")
+            run_git(f'clone --bare "{repo_url}" "{mirror_dir}"')
+            # Track branches and tags only (skips e.g. GitHub pull request refs)
+            run_git('config remote.origin.fetch "+refs/heads/*:refs/heads/*"', cwd=mirror_dir)
+            run_git('config --add remote.origin.fetch "+refs/tags/*:refs/tags/*"', cwd=mirror_dir)
+            run_git('config gc.pruneExpire never', cwd=mirror_dir)
+            stats = {'repo_url': repo_url, 'created_at': datetime.now().isoformat()}
+        elif not force and started - stats.get('last_fetch_time', 0) < fetch_interval:
+            return mirror_dir
+        else:
+            run_git('fetch --prune origin', cwd=mirror_dir)
+
+        stats['last_fetch_time'] = time.time()
+        stats['last_fetch_at'] = datetime.now().isoformat()
+        stats['last_fetch_seconds'] = round(time.time() - started, 3)
+        stats['size_bytes'] = _dir_size(mirror_dir)
+        _save_stats(mirror_dir, stats)
+        return mirror_dir
+
+
+def clone_from_mirror(repo_url, workspace_dir, fetch_interval=DEFAULT_FETCH_INTERVAL):
+    """Create a workspace as a --shared clone of the repository's mirror"""
+    mirror_dir = update_mirror(repo_url, fetch_interval)
+    started = time.time()
+    run_git(f'clone --shared "{os.path.abspath(mirror_dir)}" "{workspace_dir}"')
+    run_git(f'remote set-url origin "{repo_url}"', cwd=workspace_dir)
+    record_workspace_creation(repo_url, time.time() - started)
+
+
+def record_workspace_creation(repo_url, seconds):
+    """Remember how long the latest workspace took to create"""
+    mirror_dir = get_mirror_dir(repo_url)
+    with _get_lock(mirror_dir):
+        stats = _load_stats(mirror_dir)
+        stats['last_workspace_seconds'] = round(seconds, 3)
+        stats['last_workspace_at'] = datetime.now().isoformat()
+        stats['workspaces_created'] = stats.get('workspaces_created', 0) + 1
+        _save_stats(mirror_dir, stats)
+
+
+def prepare_workspace(config, workspace_dir):
+    """Create a fresh checkout of the configured repository in workspace_dir.
+
+    Raises subprocess.CalledProcessError if cloning fails.
+    """
+    if os.path.exists(workspace_dir):
+        shutil.rmtree(workspace_dir)
+
+    repo_url = config['github_repo']
+    if config.get('use_mirror', True):
+        clone_from_mirror(repo_url, workspace_dir, config.get('mirror_fetch_interval', DEFAULT_FETCH_INTERVAL))
+    else:
+        os.makedirs(workspace_dir)
+        subprocess.run(f'git clone {repo_url} .', shell=True, check=True, cwd=workspace_dir)
+
+
+def get_mirror_status(repo_url):
+    """Summarise a repository's mirror for the configuration page"""
+    if not repo_url:
+        return None
+    mirror_dir = get_mirror_dir(repo_url)
+    stats = _load_stats(mirror_dir)
+    status = {
+        'path': mirror_dir,
+        'exists': os.path.exists(os.path.join(mirror_dir, 'HEAD')),
+        'last_fetch_at': stats.get('last_fetch_at'),
+        'last_fetch_seconds': stats.get('last_fetch_seconds'),
+        'fetch_age_seconds': None,
+        'size_mb': round(stats.get('size_bytes', 0) / (1024 * 1024), 1),
+        'last_workspace_seconds': stats.get('last_workspace_seconds'),
+        'last_workspace_at': stats.get('last_workspace_at'),
+        'workspaces_created': stats.get('workspaces_created', 0),
+    }
+    if 'last_fetch_time' in stats:
+        status['fetch_age_seconds'] = int(time.time() - stats['last_fetch_time'])
+    return status
@@ -1,13 +1,24 @@
+import os
 import subprocess
 
+from diff_service import DiffError, list_untracked
+
+DIFF_ERROR_PREFIX = "Error getting git diff"
+
 def get_git_diff(workspace_dir):
-    """Get git diff for the workspace"""
+    """Get git diff for the workspace, including untracked new files"""
     try:
-        result = subprocess.run('git diff', shell=True, check=True, cwd=workspace_dir,
+        result = subprocess.run('git diff HEAD', shell=True, check=True, cwd=workspace_dir,
                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        return result.stdout
-    except subprocess.CalledProcessError as e:
-        return f"Error getting git diff: {e.stderr}"
+        diff = result.stdout
+        # Untracked files are not part of `git diff`; show them as new files
+        for path in list_untracked(workspace_dir):
+            untracked = subprocess.run(['git', 'diff', '--no-index', '--', os.devnull, path], cwd=workspace_dir,
+                                      stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors='replace')
+            diff += untracked.stdout
+        return diff
+    except (subprocess.CalledProcessError, DiffError) as e:
+        return f"{DIFF_ERROR_PREFIX}: {getattr(e, 'stderr', None) or e}"
 
 def create_git_branch_and_push(workspace_dir, ticket, task_description):
     """Create a git branch, commit changes, and push"""
@@ -0,0 +1,81 @@
+"""
+Gunicorn settings for serving Claude Task Manager in production
+
+    gunicorn -c gunicorn.conf.py app:app
+
+run.py starts Flask's development server, where every open /task/<id>/stream
+connection holds a thread. Here requests run on gevent greenlets instead: an
+idle SSE viewer is a greenlet waiting on its subscription queue, so thousands
+of viewers fit in one worker. The worker monkey-patches the standard library
+before the app is imported, so the job queue, scheduler, tailers and process
+reader threads become greenlets too, and Claude subprocesses are read and
+waited on cooperatively.
+
+Greenlets share one OS thread, so work that never waits on I/O would hold up
+every stream. The CPU-bound and unwrapped blocking sections (log compression,
+workspace and worktree walks, task index rebuilds) go through
+offload.run_blocking(), which runs them on gevent's native thread pool. The
+timeout is generous because a worker killed for missing heartbeats loses its
+in-memory job queue and leaves agent process groups running.
+
+The job queue, agent scheduler, stream broker and resource monitor keep their
+state in the worker process, so run a single worker and raise the connection
+limit rather than the worker count.
+
+On SIGTERM (docker stop) or SIGINT the worker stops accepting connections and
+ends every live output stream (stream_broker.drain()); browsers reconnect with
+their Last-Event-ID once the server is back. Ordinary requests in flight get
+up to the graceful timeout to finish.
+
+Configured through environment variables:
+    PORT                         port to listen on (default 9000)
+    GUNICORN_WORKERS             worker processes (default 1, see above)
+    GUNICORN_WORKER_CONNECTIONS  concurrent connections per worker, SSE streams included (default 1000)
+    GUNICORN_GRACEFUL_TIMEOUT    seconds in-flight requests get after SIGTERM (default 30)
+    GUNICORN_TIMEOUT             seconds without a heartbeat before a worker is killed and restarted (default 120)
+"""
+import os
+import signal
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '9000')}"
+workers = int(os.environ.get('GUNICORN_WORKERS', '1'))
+worker_class = 'gevent'
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', '1000'))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+# A killed worker loses queued jobs and leaves agent process groups running, so be generous
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+# Idle keep-alive connections are held this long, which also bounds how long shutdown waits for them
+keepalive = 2
+accesslog = '-'
+# The app must be imported after gevent has patched the worker
+preload_app = False
+
+
+def on_starting(server):
+    if workers > 1:
+        print(f"DEBUG: GUNICORN_WORKERS={workers}: jobs, the agent scheduler and live streams are per worker, "
+              "so a request may not see work started by another one")
+
+
+def _drain_streams():
+    # Imported here: the app is only loaded inside the (patched) worker
+    from stream_broker import stream_broker
+    stream_broker.drain()
+
+
+def post_worker_init(worker):
+    """Drain live streams on SIGTERM before the worker waits for requests to finish"""
+    import gevent
+    handle_exit = worker.handle_exit
+
+    def drain_and_exit(sig, frame):
+        handle_exit(sig, frame)
+        # Signal handlers must not block; drain on a greenlet
+        gevent.spawn(_drain_streams)
+
+    signal.signal(signal.SIGTERM, drain_and_exit)
+
+
+def worker_int(worker):
+    """SIGINT/SIGQUIT exits at once; end the streams first so browsers reconnect cleanly"""
+    _drain_streams()
@@ -0,0 +1,228 @@
+"""
+Background job queue
+
+Slow operations (cloning a workspace, running Claude, computing a diff,
+pushing) are submitted as jobs so the HTTP request that triggers them can
+return immediately. Each job has an id and a persisted state under jobs/:
+
+    queued -> running -> succeeded | failed
+
+The browser follows progress through the /jobs/<id> endpoint. Jobs that were
+queued or running when the server stopped are marked as failed on startup.
+Files of finished jobs are deleted after job_retention_days (config.json,
+default 7; 0 keeps them).
+
+task_lock(task_id) serialises work that must not overlap for one task, such as
+checking for and submitting its job, or evicting its workspace.
+"""
+import os
+import json
+import time
+import uuid
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from config import JOBS_DIR, load_config
+
+DEFAULT_JOB_WORKERS = 4
+DEFAULT_JOB_RETENTION_DAYS = 7
+PRUNE_INTERVAL = 3600  # seconds between sweeps of old job files
+ACTIVE_STATUSES = ('queued', 'running')
+
+_task_locks = {}
+_task_locks_lock = threading.Lock()
+
+
+def task_lock(task_id):
+    """The lock for work on one task that must not run concurrently"""
+    with _task_locks_lock:
+        lock = _task_locks.get(task_id)
+        if lock is None:
+            lock = _task_locks[task_id] = threading.RLock()
+        return lock
+
+
+class JobError(Exception):
+    """Raised by a job function to fail the job with a user-facing message"""
+
+
+class Job:
+    """A unit of background work and its persisted state"""
+
+    def __init__(self, kind, task_id=None, record=None):
+        self.record = record or {
+            'id': str(uuid.uuid4()),
+            'kind': kind,
+            'task_id': task_id,
+            'status': 'queued',
+            'message': 'Queued',
+            'created_at': datetime.now().isoformat(),
+            'started_at': None,
+            'finished_at': None,
+            'result': None,
+            'error': None,
+        }
+        self._lock = threading.Lock()
+
+    @property
+    def id(self):
+        return self.record['id']
+
+    def _save(self):
+        path = os.path.join(JOBS_DIR, f'{self.id}.json')
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.record, f)
+        os.replace(tmp_path, path)
+
+    def update(self, **fields):
+        with self._lock:
+            self.record.update(fields)
+            self._save()
+
+    def progress(self, message, **fields):
+        """Report progress to anyone following the job"""
+        self.update(message=message, **fields)
+
+    def to_dict(self):
+        with self._lock:
+            return dict(self.record)
+
+
+class JobQueue:
+    """Runs jobs on a bounded thread pool and keeps recent jobs in memory"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._jobs = {}
+        self._pruned_at = 0.0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                workers = int(load_config().get('job_workers', DEFAULT_JOB_WORKERS))
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+                self._recover_interrupted()
+            return self._executor
+
+    def _recover_interrupted(self):
+        """Fail jobs that were left queued or running by a previous server process"""
+        for filename in os.listdir(JOBS_DIR):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(JOBS_DIR, filename), 'r') as f:
+                    record = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            if record.get('status') in ACTIVE_STATUSES and record['id'] not in self._jobs:
+                Job(record['kind'], record=record).update(
+                    status='failed',
+                    error='Interrupted by server restart',
+                    message='Interrupted by server restart',
+                    finished_at=datetime.now().isoformat()
+                )
+
+    def prune(self, max_age_days=None):
+        """Delete the files of finished jobs older than max_age_days; returns how many"""
+        if max_age_days is None:
+            max_age_days = float(load_config().get('job_retention_days', DEFAULT_JOB_RETENTION_DAYS))
+        if max_age_days <= 0:
+            return 0
+        cutoff = time.time() - max_age_days * 86400
+        with self._lock:
+            active = set(self._jobs)
+        removed = 0
+        for filename in os.listdir(JOBS_DIR):
+            if not filename.endswith('.json') or filename[:-len('.json')] in active:
+                continue
+            path = os.path.join(JOBS_DIR, filename)
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                with open(path, 'r') as f:
+                    if json.load(f).get('status') in ACTIVE_STATUSES:
+                        continue
+                os.remove(path)
+                removed += 1
+            except (OSError, json.JSONDecodeError):
+                continue
+        if removed:
+            print(f"DEBUG: Removed {removed} finished job files")
+        return removed
+
+    def _prune_if_due(self):
+        with self._lock:
+            if time.monotonic() - self._pruned_at < PRUNE_INTERVAL and self._pruned_at:
+                return
+            self._pruned_at = time.monotonic()
+        try:
+            self.prune()
+        except OSError as e:
+            print(f"DEBUG: Could not prune job files: {e}")
+
+    def create(self, kind, task_id=None):
+        """Register a new queued job without scheduling it"""
+        self._get_executor()
+        self._prune_if_due()
+        job = Job(kind, task_id)
+        job.update()
+        with self._lock:
+            self._jobs[job.id] = job
+        return job
+
+    def submit(self, kind, fn, task_id=None, *args, **kwargs):
+        """Queue fn(job, *args, **kwargs) and return the Job"""
+        job = self.create(kind, task_id)
+        self._get_executor().submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def run(self, job, fn, *args, **kwargs):
+        """Run a created job's fn(job, *args, **kwargs) on the calling thread"""
+        self._run(job, fn, args, kwargs)
+        return job.to_dict()
+
+    def _run(self, job, fn, args, kwargs):
+        job.update(status='running', message='Running', started_at=datetime.now().isoformat())
+        try:
+            result = fn(job, *args, **kwargs)
+            job.update(status='succeeded', result=result, message='Done',
+                       finished_at=datetime.now().isoformat())
+        except JobError as e:
+            job.update(status='failed', error=str(e), message=str(e), finished_at=datetime.now().isoformat())
+        except Exception as e:
+            print(f"DEBUG: Job {job.id} ({job.record['kind']}) failed: {e}")
+            job.update(status='failed', error=f'Unexpected error: {e}', message='Failed',
+                       finished_at=datetime.now().isoformat())
+        finally:
+            # Finished jobs are served from disk
+            with self._lock:
+                self._jobs.pop(job.id, None)
+
+    def get(self, job_id):
+        """Return a job's state, from memory or from disk"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job:
+            return job.to_dict()
+        path = os.path.join(JOBS_DIR, f'{os.path.basename(job_id)}.json')
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def is_active(self, job_id):
+        job = self.get(job_id) if job_id else None
+        return bool(job) and job['status'] in ACTIVE_STATUSES
+
+
+job_queue = JobQueue()
+
+
+def submit_job(kind, fn, task_id=None, *args, **kwargs):
+    return job_queue.submit(kind, fn, task_id, *args, **kwargs)
+
+def get_job(job_id):
+    return job_queue.get(job_id)
@@ -0,0 +1,169 @@
+"""
+Compression and retention of Claude output logs
+
+The raw logs of a streaming run (claude_output.jsonl and claude_stderr.log in
+outputs/<task_id>/) go through three tiers:
+
+    hot       plain files, while the task runs and for a while after
+    warm      gzip-compressed (<name>.gz) once the task has been idle long enough
+    expired   deleted once older than the retention TTL (if one is set)
+
+A background thread sweeps outputs/ every few minutes. Readers go through
+open_log() and log_size(), which find either form, so old tasks can still be
+streamed and completed; gzip is decompressed as it is read and offsets are
+always positions in the uncompressed log. The final output, diff and
+summary (summary.json, summary.txt) are artifacts and are kept.
+
+Configured in config.json:
+    log_compress_after_hours  compress logs of inactive tasks this long after their last write (default 1)
+    log_delete_after_days     delete logs this long after their last write (default 0, keep forever)
+"""
+import os
+import gzip
+import time
+import shutil
+import struct
+import threading
+
+from config import OUTPUTS_DIR, load_config
+from task_cache import get_task_status
+from offload import run_blocking
+
+LOG_FILES = ('claude_output.jsonl', 'claude_stderr.log')
+COMPRESSED_SUFFIX = '.gz'
+SWEEP_INTERVAL = 300  # seconds between retention passes
+ACTIVE_STATUSES = ('queued', 'streaming', 'actioning')
+
+
+def _compressed_path(path):
+    return path + COMPRESSED_SUFFIX
+
+
+def find_log(path):
+    """The file holding a log, plain or compressed, or None"""
+    if os.path.exists(path):
+        return path
+    if os.path.exists(_compressed_path(path)):
+        return _compressed_path(path)
+    return None
+
+
+def is_compressed(path):
+    return not os.path.exists(path) and os.path.exists(_compressed_path(path))
+
+
+def open_log(path):
+    """Open a log for binary reading, decompressing on the fly if it has been compressed"""
+    if is_compressed(path):
+        return gzip.open(_compressed_path(path), 'rb')
+    return open(path, 'rb')
+
+
+def log_size(path):
+    """Uncompressed size of a log in bytes, or None if there is none"""
+    if os.path.exists(path):
+        return os.path.getsize(path)
+    if os.path.exists(_compressed_path(path)):
+        # gzip stores the uncompressed size (mod 4 GiB) in its last four bytes
+        with open(_compressed_path(path), 'rb') as f:
+            f.seek(-4, os.SEEK_END)
+            return struct.unpack('<I', f.read(4))[0]
+    return None
+
+
+def discard_compressed(path):
+    """Remove the compressed copy of a log that a new run is about to replace"""
+    if os.path.exists(_compressed_path(path)):
+        os.remove(_compressed_path(path))
+
+
+def compress_log(path):
+    """Replace a plain log with its gzip copy; returns the bytes saved"""
+    compressed_path = _compressed_path(path)
+    tmp_path = compressed_path + '.tmp'
+    stat = os.stat(path)
+    with open(path, 'rb') as src, gzip.open(tmp_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    # Keep the original modification time so the delete TTL counts from the last write
+    os.utime(tmp_path, (stat.st_atime, stat.st_mtime))
+    os.replace(tmp_path, compressed_path)
+    os.remove(path)
+    return stat.st_size - os.path.getsize(compressed_path)
+
+
+class LogRetention:
+    """Periodically compresses and expires the logs under outputs/"""
+
+    def __init__(self, outputs_dir=OUTPUTS_DIR):
+        self.outputs_dir = outputs_dir
+        self._lock = threading.Lock()
+        self._thread = None
+        self.compressed = 0
+        self.deleted = 0
+        self.bytes_saved = 0
+        self.last_sweep = None
+        self.last_error = None
+
+    def start(self):
+        """Start the background sweep thread (idempotent)"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.sweep()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"DEBUG: Log retention error: {e}")
+            time.sleep(SWEEP_INTERVAL)
+
+    def sweep(self):
+        """Compress and delete logs that have aged into the next tier"""
+        # Imported here because process_io reads logs through this module
+        from process_io import get_process_io
+
+        config = load_config()
+        compress_after = float(config.get('log_compress_after_hours', 1)) * 3600
+        delete_after = float(config.get('log_delete_after_days', 0)) * 86400
+        now = time.time()
+
+        for task_id in os.listdir(self.outputs_dir):
+            task_dir = os.path.join(self.outputs_dir, task_id)
+            if not os.path.isdir(task_dir):
+                continue
+            if get_task_status(task_id) in ACTIVE_STATUSES:
+                continue
+            if get_process_io(os.path.join(task_dir, LOG_FILES[0])):
+                continue
+
+            for name in LOG_FILES:
+                path = os.path.join(task_dir, name)
+                stored = find_log(path)
+                if stored is None:
+                    continue
+                age = now - os.path.getmtime(stored)
+                if delete_after and age >= delete_after:
+                    os.remove(stored)
+                    self.deleted += 1
+                    print(f"DEBUG: Deleted expired log {stored}")
+                elif stored == path and age >= compress_after:
+                    self.bytes_saved += run_blocking(compress_log, path)
+                    self.compressed += 1
+                    print(f"DEBUG: Compressed log {path}")
+        self.last_sweep = now
+
+    def stats(self):
+        return {
+            'compressed': self.compressed,
+            'deleted': self.deleted,
+            'bytes_saved': self.bytes_saved,
+            'last_sweep': self.last_sweep,
+            'last_error': self.last_error,
+        }
+
+
+log_retention = LogRetention()
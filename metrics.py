@@ -0,0 +1,172 @@
+"""
+Metrics in the Prometheus text exposition format
+
+/metrics serves the numbers below so a local Prometheus (or curl) can scrape
+them; nothing is pushed anywhere and no client library is needed.
+
+Histograms are observed where the work happens:
+
+    http_request_duration_seconds{route,method,status}  time to produce a response
+                                                         (for SSE streams, until the stream starts)
+    workspace_clone_duration_seconds{source}            workspace checkout: "pool" or "clone"
+    claude_process_duration_seconds{mode,outcome}       Claude process runtime; outcome is
+                                                         "success", "error" or "killed"
+    claude_first_event_seconds                          process start to its first stdout line
+    diff_computation_duration_seconds{kind}             git diffs computed on a diff cache miss
+    git_push_duration_seconds{outcome}                  branch, commit and push of a task
+
+Gauges are read from the owning component when /metrics is scraped (see the
+registrations in app.py): running and queued agents, open SSE connections and
+workspace disk usage.
+"""
+import math
+import time
+import threading
+from contextlib import contextmanager
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Seconds; spans fast requests up to hour-long agent runs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label combination"""
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [bucket counts, sum, count]
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with block (also when it raises)"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def count(self, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            return series[2] if series else 0
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((key, (list(buckets), total, count)) for key, (buckets, total, count) in self._series.items())
+        for key, (buckets, total, count) in series:
+            for bound, bucket_count in zip(self.buckets, buckets):
+                labels = _format_labels(self.label_names, key, ('le', _format_value(bound)))
+                lines.append(f'{self.name}_bucket{labels} {bucket_count}')
+            labels = _format_labels(self.label_names, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Gauge:
+    """A value read from a callback at scrape time"""
+
+    def __init__(self, name, documentation, read):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge']
+        try:
+            value = self.read()
+        except Exception as e:
+            # A failing component should not take the rest of the metrics down with it
+            print(f"DEBUG: Could not read gauge {self.name}: {e}")
+            return lines
+        lines.append(f'{self.name} {_format_value(value)}')
+        return lines
+
+
+class Registry:
+    """The metrics served by /metrics, in registration order"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'Metric {metric.name} is already registered')
+            self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def gauge(self, name, documentation, read):
+        return self._register(Gauge(name, documentation, read))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_DURATION = registry.histogram(
+    'http_request_duration_seconds', 'Time to produce a response, per route (streams: until the stream starts)',
+    ('route', 'method', 'status'))
+CLONE_DURATION = registry.histogram(
+    'workspace_clone_duration_seconds', 'Time to check out a task workspace, from the pool or by cloning',
+    ('source',))
+CLAUDE_DURATION = registry.histogram(
+    'claude_process_duration_seconds', 'Runtime of Claude processes', ('mode', 'outcome'))
+CLAUDE_FIRST_EVENT = registry.histogram(
+    'claude_first_event_seconds', 'Time from starting a streaming Claude process to its first output line')
+DIFF_DURATION = registry.histogram(
+    'diff_computation_duration_seconds', 'Time to compute a git diff that was not cached', ('kind',))
+PUSH_DURATION = registry.histogram(
+    'git_push_duration_seconds', 'Time to commit and push a task branch', ('outcome',))
+
+
+def process_outcome(returncode):
+    """Outcome label for a process exit code"""
+    if returncode == 0:
+        return 'success'
+    return 'killed' if returncode is not None and returncode < 0 else 'error'
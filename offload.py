@@ -0,0 +1,40 @@
+"""
+Blocking work kept off the gevent hub
+
+In production the app runs on gunicorn's gevent worker (see gunicorn.conf.py).
+The worker monkey-patches the standard library, so the app's threads are
+greenlets sharing one OS thread and event loop (the hub). Sockets, pipes,
+subprocesses, locks, queues and sleeps yield to other greenlets while they
+wait, but pure CPU work and system calls gevent does not wrap (walking a
+directory tree, gzip, building the task index) run on the hub and stall every
+live stream and request until they return.
+
+run_blocking() hands such work to the hub's pool of native threads and waits
+for it cooperatively. Without gevent (Flask's development server, the tests,
+benchmark.py), or when already on a native thread, it just calls the function.
+
+A function passed to run_blocking() runs on another OS thread: it must not take
+the app's locks or use other greenlet-based primitives.
+"""
+import sys
+
+
+def _threadpool():
+    """The hub's native thread pool, or None if work can run where it is"""
+    if 'gevent' not in sys.modules:
+        return None
+    from gevent import monkey
+    from gevent._hub_local import get_hub_if_exists
+    if not monkey.is_module_patched('threading'):
+        return None
+    # Native pool threads have no hub of their own
+    hub = get_hub_if_exists()
+    return hub.threadpool if hub is not None else None
+
+
+def run_blocking(fn, *args, **kwargs):
+    """fn(*args, **kwargs), run so that other greenlets keep going meanwhile"""
+    pool = _threadpool()
+    if pool is None:
+        return fn(*args, **kwargs)
+    return pool.apply(fn, args, kwargs)
@@ -0,0 +1,261 @@
+"""
+Incremental summary of a Claude streaming run
+
+While a streaming process runs, every stdout line is fed to an OutputSummary as
+it is read from the pipe. The summary keeps the readable text (the same text
+the task page shows after completion), the tool calls Claude made and the final
+result event, and saves itself to outputs/<task_id>/summary.json every few
+seconds and when the process exits.
+
+Completing a task therefore no longer re-reads the whole JSONL log: it takes
+the live summary, or loads summary.json and parses only the bytes written after
+the offset it was saved at. /task/<id>/summary serves the same data while the
+task is still running.
+
+Saving never happens on the thread reading the pipe: a background saver
+writes the live summaries that changed every few seconds. The text, which only
+grows, is appended to summary.txt (only what was added since the last save);
+summary.json holds the rest and how many bytes of summary.txt belong to it, so
+text appended by a save that was cut short is ignored.
+"""
+import os
+import json
+import time
+import threading
+from datetime import datetime
+
+from log_retention import log_size, open_log
+
+SUMMARY_FILE = 'summary.json'
+TEXT_FILE = 'summary.txt'
+SAVE_INTERVAL = 5  # seconds between saves while a process is running
+INPUT_PREVIEW_LENGTH = 200  # characters of each tool call's input kept in the summary
+
+_live = {}
+_live_lock = threading.Lock()
+_saver = None
+
+
+def get_summary_path(output_file_path):
+    return os.path.join(os.path.dirname(output_file_path), SUMMARY_FILE)
+
+
+def get_text_path(output_file_path):
+    return os.path.join(os.path.dirname(output_file_path), TEXT_FILE)
+
+
+class OutputSummary:
+    """Accumulates text, tool calls and the result from stream-json lines"""
+
+    def __init__(self, output_file_path, state=None, text=''):
+        state = state or {}
+        # Summaries saved before the text moved to summary.txt kept it inline
+        text = state.get('text') or text
+        self.output_file_path = output_file_path
+        self.parts = [text] if text else []
+        self.text_length = len(text)
+        self.tool_calls = state.get('tool_calls', [])
+        self.result = state.get('result')
+        self.events = state.get('events', 0)
+        self.offset = state.get('offset', 0)  # bytes of the log consumed
+        self.complete = state.get('complete', False)
+        self._tool_index = {call['id']: call for call in self.tool_calls if call.get('id')}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._text_bytes = 0 if 'text' in state else state.get('text_bytes', 0)  # bytes of summary.txt saved
+        self._unsaved = [text] if 'text' in state and text else []  # text added since the last save
+        self._dirty = True
+
+    def feed(self, raw):
+        """Consume one raw line (bytes, including its newline) from the log"""
+        with self._lock:
+            self.offset += len(raw)
+            line = raw.decode('utf-8', errors='replace').strip()
+            if not line:
+                return
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError:
+                return
+            self._dirty = True
+            if isinstance(data, dict):
+                self.events += 1
+                self._add_event(data)
+
+    def _add_text(self, text):
+        self.parts.append(text)
+        self._unsaved.append(text)
+        self.text_length += len(text)
+
+    def _add_event(self, data):
+        # Readable text, extracted the same way the task page always has
+        if data.get('type') == 'message' and 'content' in data:
+            for content_item in data['content']:
+                if isinstance(content_item, dict) and content_item.get('type') == 'text' and 'text' in content_item:
+                    self._add_text(content_item['text'] + '\n')
+        elif data.get('type') == 'content_block_delta' and 'delta' in data:
+            if 'text' in data['delta']:
+                self._add_text(data['delta']['text'])
+        elif 'result' in data:
+            self._add_text(str(data['result']) + '\n')
+        elif 'content' in data and isinstance(data['content'], str):
+            self._add_text(data['content'])
+        elif 'text' in data:
+            self._add_text(str(data['text']))
+
+        # Tool calls and their results (top-level or nested in an assistant/user message)
+        message = data.get('message') if isinstance(data.get('message'), dict) else data
+        content = message.get('content')
+        if isinstance(content, list):
+            for item in content:
+                if not isinstance(item, dict):
+                    continue
+                if item.get('type') == 'tool_use':
+                    call = {
+                        'id': item.get('id'),
+                        'name': item.get('name'),
+                        'input_preview': json.dumps(item.get('input'))[:INPUT_PREVIEW_LENGTH],
+                        'status': 'pending',
+                    }
+                    self.tool_calls.append(call)
+                    if call['id']:
+                        self._tool_index[call['id']] = call
+                elif item.get('type') == 'tool_result' and item.get('tool_use_id') in self._tool_index:
+                    self._tool_index[item['tool_use_id']]['status'] = 'error' if item.get('is_error') else 'done'
+
+        if data.get('type') == 'result':
+            self.result = {key: data.get(key) for key in
+                           ('subtype', 'is_error', 'result', 'duration_ms', 'num_turns', 'total_cost_usd', 'session_id')
+                           if key in data}
+
+    def text(self):
+        with self._lock:
+            if len(self.parts) > 1:
+                self.parts = [''.join(self.parts)]
+            return self.parts[0] if self.parts else ''
+
+    def _metadata(self):
+        return {
+            'events': self.events,
+            'offset': self.offset,
+            'complete': self.complete,
+            'text_length': self.text_length,
+            'tool_call_count': len(self.tool_calls),
+            'tool_calls': [dict(call) for call in self.tool_calls],
+            'result': self.result,
+        }
+
+    def to_dict(self, include_text=True):
+        text = self.text() if include_text else None
+        with self._lock:
+            summary = self._metadata()
+        if include_text:
+            summary['text'] = text
+        return summary
+
+    def save(self):
+        """Append the new text to summary.txt and rewrite summary.json"""
+        with self._save_lock:
+            # The text and the rest are taken together, so the offset matches the text saved
+            with self._lock:
+                new_text = ''.join(self._unsaved).encode('utf-8')
+                self._unsaved = []
+                self._dirty = False
+                summary = self._metadata()
+            path = get_summary_path(self.output_file_path)
+            try:
+                with open(get_text_path(self.output_file_path), 'ab') as f:
+                    # Drop anything a save that did not finish left behind
+                    f.truncate(self._text_bytes)
+                    f.write(new_text)
+                self._text_bytes += len(new_text)
+                summary['text_bytes'] = self._text_bytes
+                summary['updated_at'] = datetime.now().isoformat()
+                tmp_path = path + '.tmp'
+                with open(tmp_path, 'w') as f:
+                    json.dump(summary, f)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                # e.g. the task (and its outputs directory) was deleted mid-run
+                print(f"DEBUG: Could not save output summary {path}: {e}")
+
+    def close(self):
+        """Mark the run finished and save the final summary"""
+        with self._lock:
+            self.complete = True
+        self.save()
+        with _live_lock:
+            if _live.get(os.path.abspath(self.output_file_path)) is self:
+                del _live[os.path.abspath(self.output_file_path)]
+
+    def catch_up(self):
+        """Feed any lines written to the log after this summary's offset"""
+        size = log_size(self.output_file_path)
+        if size is None or size < self.offset:
+            return
+        with open_log(self.output_file_path) as f:
+            f.seek(self.offset)
+            for raw in f:
+                self.feed(raw)
+
+
+def _save_live():
+    while True:
+        time.sleep(SAVE_INTERVAL)
+        with _live_lock:
+            summaries = list(_live.values())
+        for summary in summaries:
+            if summary._dirty:
+                summary.save()
+
+
+def start_summary(output_file_path):
+    """Begin a fresh summary for a run writing to output_file_path"""
+    global _saver
+    summary = OutputSummary(output_file_path)
+    summary.save()
+    with _live_lock:
+        _live[os.path.abspath(output_file_path)] = summary
+        if _saver is None:
+            _saver = threading.Thread(target=_save_live, daemon=True)
+            _saver.start()
+    return summary
+
+
+def get_summary(output_file_path):
+    """The summary of the latest run: live if it is still running, otherwise from disk.
+
+    A saved summary is brought up to date with the end of the log, so only the
+    lines written since its last save are parsed. Returns None if there is no log.
+    """
+    with _live_lock:
+        summary = _live.get(os.path.abspath(output_file_path))
+    if summary is not None:
+        return summary
+
+    state = None
+    text = ''
+    try:
+        with open(get_summary_path(output_file_path), 'r') as f:
+            state = json.load(f)
+        if state.get('text_bytes'):
+            with open(get_text_path(output_file_path), 'rb') as f:
+                data = f.read(state['text_bytes'])
+            if len(data) < state['text_bytes']:
+                raise ValueError('summary text is incomplete')
+            text = data.decode('utf-8', errors='replace')
+    except (FileNotFoundError, ValueError):
+        # Missing or damaged: rebuilt from the log below
+        state = None
+
+    size = log_size(output_file_path)
+    if state is None and size is None:
+        return None
+    summary = OutputSummary(output_file_path, state, text)
+    if size is not None and size != summary.offset:
+        if size < summary.offset:
+            # The saved summary belongs to an earlier run
+            summary = OutputSummary(output_file_path)
+        summary.catch_up()
+        summary.save()
+    return summary
@@ -0,0 +1,119 @@
+"""
+Validators and rendered-page caching for conditional GETs
+
+The task pages and the task list used to be re-rendered on every hit, and
+every action on a task page ends in location.reload(). Each cached page now
+describes what it shows as a list of "parts" (the task record, its active job,
+the store version, ...), which is far cheaper to gather than rendering. The
+parts are hashed into an ETag:
+
+- if the browser already has that version (If-None-Match, or If-Modified-Since
+  for clients that only send dates) the route answers 304 without rendering,
+- otherwise the rendered body is kept under the page's key, so other viewers
+  of the same version get it without re-rendering.
+
+Last-Modified is the time a page's ETag was first seen by this process. ETags
+include an id chosen at startup, so a restart (which may bring new templates)
+never matches a page rendered before it.
+
+Configured in config.json:
+    page_cache_size  rendered pages kept in memory (default 256, 0 disables body caching)
+"""
+import json
+import time
+import uuid
+import hashlib
+import threading
+from datetime import datetime, timedelta, timezone
+from collections import OrderedDict
+
+from config import load_config
+
+DEFAULT_PAGE_CACHE_SIZE = 256
+# Validators are kept for more pages than bodies; they are a few bytes each
+MAX_VALIDATORS = 10000
+BOOT_ID = uuid.uuid4().hex
+
+
+def make_etag(parts):
+    """ETag of a page showing parts (anything JSON-serialisable; other values by str())"""
+    data = json.dumps([BOOT_ID, parts], sort_keys=True, default=str)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+class PageCache:
+    """ETags with their first-seen time, and an LRU of rendered bodies, per page key"""
+
+    def __init__(self, max_entries=None):
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._validators = OrderedDict()  # key -> (etag, last modified)
+        self._bodies = OrderedDict()  # key -> (etag, body)
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def _get_max_entries(self):
+        if self._max_entries is None:
+            return int(load_config().get('page_cache_size', DEFAULT_PAGE_CACHE_SIZE))
+        return self._max_entries
+
+    def validate(self, key, parts):
+        """(etag, last modified) of the page key currently showing parts"""
+        etag = make_etag(parts)
+        with self._lock:
+            seen = self._validators.get(key)
+            if seen and seen[0] == etag:
+                self._validators.move_to_end(key)
+                return seen
+            # HTTP dates have whole seconds; a new version always gets a later date
+            last_modified = datetime.fromtimestamp(int(time.time()), timezone.utc)
+            if seen and last_modified <= seen[1]:
+                last_modified = seen[1] + timedelta(seconds=1)
+            self._validators[key] = (etag, last_modified)
+            while len(self._validators) > MAX_VALIDATORS:
+                self._validators.popitem(last=False)
+            return etag, last_modified
+
+    def get_or_render(self, key, etag, render):
+        """The body of page key at version etag, rendered only if it is not cached"""
+        with self._lock:
+            cached = self._bodies.get(key)
+            if cached and cached[0] == etag:
+                self._bodies.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+        body = render()
+        max_entries = self._get_max_entries()
+        with self._lock:
+            if max_entries > 0:
+                self._bodies[key] = (etag, body)
+                self._bodies.move_to_end(key)
+            while len(self._bodies) > max(max_entries, 0):
+                self._bodies.popitem(last=False)
+        return body
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def clear(self):
+        with self._lock:
+            self._validators.clear()
+            self._bodies.clear()
+
+    def stats(self):
+        with self._lock:
+            renders = self.hits + self.misses
+            return {
+                'pages': len(self._bodies),
+                'bytes': sum(len(body) for _, body in self._bodies.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'hit_rate': round(self.hits / renders, 4) if renders else None,
+            }
+
+
+page_cache = PageCache()
@@ -0,0 +1,205 @@
+"""
+Claude process I/O
+
+A streaming Claude process writes to pipes rather than straight to a file.
+Reader threads drain stdout and stderr continuously, so a chatty stream can
+never fill its pipe and stall the agent. Every line goes into a bounded
+in-memory ring buffer of recent events, and a writer thread persists the
+lines in batches:
+
+    stdout -> outputs/<task_id>/claude_output.jsonl
+    stderr -> outputs/<task_id>/claude_stderr.log
+
+Live viewers are woken after each batch is written (see wait_for_output) and
+read recent stderr from the ring buffer. Processes are looked up by their
+stdout path and dropped from the registry once they have exited and
+everything is on disk.
+
+Configured in config.json:
+    output_ring_buffer_size  recent lines kept in memory per process (default 1000)
+"""
+import os
+import time
+import threading
+from collections import deque
+
+from config import load_config
+from log_retention import open_log
+
+DEFAULT_RING_BUFFER_SIZE = 1000
+FLUSH_INTERVAL = 0.2  # seconds between batched writes
+FLUSH_LINES = 200  # write early once this many lines are pending
+READER_JOIN_TIMEOUT = 5  # seconds to wait for pipes to drain after the process exits
+STDERR_TAIL_LINES = 200  # stderr lines shown for a finished process
+
+_processes = {}
+_processes_lock = threading.Lock()
+
+
+class ProcessIO:
+    """Drains a process's stdout and stderr into a ring buffer and batched log files"""
+
+    def __init__(self, process, stdout_path, stderr_path, ring_size=DEFAULT_RING_BUFFER_SIZE, on_exit=None,
+                 on_stdout=None):
+        self.key = os.path.abspath(stdout_path)
+        self.process = process
+        self.paths = {'stdout': stdout_path, 'stderr': stderr_path}
+        self.on_exit = on_exit
+        self.on_stdout = on_stdout
+        self.events = deque(maxlen=ring_size)
+        self.seq = 0
+        self.line_counts = {'stdout': 0, 'stderr': 0}
+        self.bytes_written = {'stdout': 0, 'stderr': 0}
+        self.flushes = 0
+        self.finished = False
+        self.returncode = None
+        self._pending = {'stdout': [], 'stderr': []}
+        self._pending_count = 0
+        self._closing = False
+        self._lock = threading.Condition()  # guards the ring buffer and pending lines
+        self._flushed = threading.Condition()  # signalled after each batch is written
+        self._files = {name: open(path, 'wb') for name, path in self.paths.items()}
+        self._readers = []
+        self._writer = None
+
+    def start(self):
+        for name, pipe in (('stdout', self.process.stdout), ('stderr', self.process.stderr)):
+            reader = threading.Thread(target=self._read, args=(name, pipe), daemon=True)
+            reader.start()
+            self._readers.append(reader)
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+        threading.Thread(target=self._wait, daemon=True).start()
+
+    def _read(self, name, pipe):
+        try:
+            for raw in iter(pipe.readline, b''):
+                line = raw.decode('utf-8', errors='replace').rstrip('\r\n')
+                with self._lock:
+                    self.seq += 1
+                    self.events.append({'seq': self.seq, 'stream': name, 'line': line, 'time': time.time()})
+                    self.line_counts[name] += 1
+                    self._pending[name].append(raw)
+                    self._pending_count += 1
+                    if self._pending_count >= FLUSH_LINES:
+                        self._lock.notify_all()
+                if name == 'stdout' and self.on_stdout:
+                    self.on_stdout(raw)
+        except (OSError, ValueError) as e:
+            print(f"DEBUG: Error reading {name} of process {self.process.pid}: {e}")
+        finally:
+            pipe.close()
+
+    def _write_loop(self):
+        while True:
+            with self._lock:
+                self._lock.wait_for(lambda: self._closing or self._pending_count >= FLUSH_LINES,
+                                    timeout=FLUSH_INTERVAL)
+                batches = self._pending
+                self._pending = {'stdout': [], 'stderr': []}
+                self._pending_count = 0
+                closing = self._closing
+            self._flush(batches)
+            if closing:
+                return
+
+    def _flush(self, batches):
+        wrote = False
+        for name, lines in batches.items():
+            if not lines:
+                continue
+            data = b''.join(lines)
+            self._files[name].write(data)
+            self._files[name].flush()
+            self.bytes_written[name] += len(data)
+            wrote = True
+        if wrote:
+            with self._flushed:
+                self.flushes += 1
+                self._flushed.notify_all()
+
+    def _wait(self):
+        self.process.wait()
+        for reader in self._readers:
+            reader.join(READER_JOIN_TIMEOUT)
+        with self._lock:
+            self._closing = True
+            self._lock.notify_all()
+        self._writer.join()
+        for f in self._files.values():
+            f.close()
+
+        self.returncode = self.process.returncode
+        print(f"DEBUG: Process {self.process.pid} completed with return code {self.returncode} "
+              f"({self.line_counts['stdout']} stdout / {self.line_counts['stderr']} stderr lines)")
+        with self._flushed:
+            self.finished = True
+            self._flushed.notify_all()
+        _unregister(self)
+        if self.on_exit:
+            self.on_exit()
+
+    def wait_for_output(self, seen_flushes, timeout):
+        """Block until a batch newer than seen_flushes is written, the process ends, or timeout"""
+        with self._flushed:
+            self._flushed.wait_for(lambda: self.flushes != seen_flushes or self.finished, timeout)
+
+    def recent(self, stream=None, after_seq=0):
+        """Ring buffer events newer than after_seq, optionally for one stream"""
+        with self._lock:
+            return [event for event in self.events
+                    if event['seq'] > after_seq and (stream is None or event['stream'] == stream)]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pid': self.process.pid,
+                'lines': dict(self.line_counts),
+                'bytes_written': dict(self.bytes_written),
+                'buffered_events': len(self.events),
+                'flushes': self.flushes,
+                'finished': self.finished,
+            }
+
+
+def _unregister(process_io):
+    with _processes_lock:
+        if _processes.get(process_io.key) is process_io:
+            del _processes[process_io.key]
+
+
+def attach(process, stdout_path, stderr_path, on_exit=None, on_stdout=None):
+    """Start draining a process started with stdout and stderr as binary pipes.
+
+    on_stdout, if given, is called from the reader thread with each raw stdout line.
+    """
+    ring_size = int(load_config().get('output_ring_buffer_size', DEFAULT_RING_BUFFER_SIZE))
+    process_io = ProcessIO(process, stdout_path, stderr_path, ring_size, on_exit, on_stdout)
+    with _processes_lock:
+        _processes[process_io.key] = process_io
+    process_io.start()
+    return process_io
+
+
+def get_process_io(stdout_path):
+    """The running process writing to stdout_path, if any"""
+    with _processes_lock:
+        return _processes.get(os.path.abspath(stdout_path))
+
+
+def read_stderr_tail(stderr_path, lines=STDERR_TAIL_LINES):
+    """Last lines of a persisted stderr log (plain or compressed)"""
+    try:
+        f = open_log(stderr_path)
+    except FileNotFoundError:
+        return []
+    with f:
+        tail = deque(f, maxlen=lines)
+    return [raw.decode('utf-8', errors='replace').rstrip('\r\n') for raw in tail]
+
+
+def get_process_stats():
+    """I/O counters for the running processes"""
+    with _processes_lock:
+        processes = dict(_processes)
+    return {key: process_io.stats() for key, process_io in processes.items()}
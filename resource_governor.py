@@ -0,0 +1,355 @@
+"""
+Resource limits and usage for Claude processes
+
+An agent runs arbitrary commands in its workspace (test suites, builds), and
+without limits one runaway run can starve every other task and the server.
+Each Claude process is now started:
+
+- in a new session, so it leads its own process group and the whole tree
+  (shell, claude, anything it spawned) can be signalled at once,
+- with a lower CPU priority (nice) and optionally I/O priority (ionice),
+- with optional address-space and open-file limits, inherited by children,
+- optionally pinned to a set of CPUs.
+
+The limits are applied by prefixing the command with nice, prlimit, taskset
+and ionice, which set them and exec the next program, rather than by Python
+code between fork and exec (preexec_fn), which can deadlock in a process with
+as many threads as this one. A missing tool is reported and its limit skipped.
+
+While a streaming process runs, a sampler thread reads /proc for every process in its
+group and keeps the live usage (CPU %, memory, threads, open files) in memory;
+the task page polls it through /task/<id>/resources. When the process exits
+the totals and peaks are saved as resource_usage.json next to the output log.
+Blocking runs (run_claude_command) get the same limits and process group but
+are not sampled and cannot be stopped from the task page.
+
+Configured in config.json:
+    agent_nice                niceness added to agent processes (default 10, 0 leaves it)
+    agent_ionice_class        I/O scheduling class: 1 realtime, 2 best-effort, 3 idle (default 0, unchanged)
+    agent_ionice_level        priority within the best-effort/realtime class, 0-7 (default 4)
+    agent_memory_limit_mb     RLIMIT_AS per process in MB; counts virtual memory (default 0, no limit)
+    agent_max_open_files      RLIMIT_NOFILE per process (default 0, unchanged)
+    agent_cpu_affinity        CPUs agents may run on, e.g. "0-3,6" (default empty, all)
+    resource_sample_interval  seconds between usage samples (default 5)
+    agent_kill_grace_seconds  wait between SIGTERM and SIGKILL when stopping an agent (default 5)
+"""
+import os
+import json
+import time
+import shlex
+import shutil
+import signal
+import threading
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+from config import load_config
+
+DEFAULT_NICE = 10
+DEFAULT_IONICE_LEVEL = 4
+DEFAULT_SAMPLE_INTERVAL = 5
+DEFAULT_KILL_GRACE = 5
+USAGE_FILE = 'resource_usage.json'
+PROC_DIR = '/proc'
+
+
+def parse_cpu_list(text):
+    """CPU numbers in a list like "0-3,6"; raises ValueError if malformed"""
+    cpus = set()
+    for part in (text or '').replace(' ', '').split(','):
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+def get_limits(config):
+    """The resource settings from config.json, normalized"""
+    try:
+        cpus = parse_cpu_list(config.get('agent_cpu_affinity', ''))
+    except ValueError:
+        print(f"DEBUG: Ignoring malformed agent_cpu_affinity {config.get('agent_cpu_affinity')!r}")
+        cpus = set()
+    return {
+        'nice': int(config.get('agent_nice', DEFAULT_NICE)),
+        'ionice_class': int(config.get('agent_ionice_class', 0)),
+        'ionice_level': int(config.get('agent_ionice_level', DEFAULT_IONICE_LEVEL)),
+        'memory_limit_mb': int(config.get('agent_memory_limit_mb', 0)),
+        'max_open_files': int(config.get('agent_max_open_files', 0)),
+        'cpus': sorted(cpus),
+    }
+
+
+def _available(tool, setting):
+    if shutil.which(tool):
+        return True
+    print(f"DEBUG: {setting} is set but the {tool} command is not installed")
+    return False
+
+
+def limit_wrappers(limits):
+    """Commands that apply the limits and exec the rest of the command line"""
+    wrappers = []
+    if limits['nice'] and _available('nice', 'agent_nice'):
+        wrappers.append(f"nice -n {limits['nice']}")
+
+    rlimits = []
+    if limits['memory_limit_mb']:
+        rlimits.append(f"--as={limits['memory_limit_mb'] * 1024 * 1024}")
+    if limits['max_open_files']:
+        value = limits['max_open_files']
+        if resource is not None:
+            # An unprivileged process cannot raise its hard limit
+            hard = resource.getrlimit(resource.RLIMIT_NOFILE)[1]
+            if hard != resource.RLIM_INFINITY:
+                value = min(value, hard)
+        rlimits.append(f"--nofile={value}:{value}")
+    if rlimits and _available('prlimit', 'agent_memory_limit_mb/agent_max_open_files'):
+        wrappers.append('prlimit ' + ' '.join(rlimits))
+
+    if limits['cpus'] and _available('taskset', 'agent_cpu_affinity'):
+        wrappers.append('taskset -c ' + ','.join(str(cpu) for cpu in limits['cpus']))
+
+    if limits['ionice_class'] and _available('ionice', 'agent_ionice_class'):
+        ionice = f"ionice -c {limits['ionice_class']}"
+        if limits['ionice_class'] in (1, 2):
+            ionice += f" -n {limits['ionice_level']}"
+        wrappers.append(ionice)
+    return wrappers
+
+
+def wrap_command(cmd, limits):
+    """Run a shell command through the limit wrappers (unchanged if there are none)"""
+    wrappers = limit_wrappers(limits)
+    if not wrappers:
+        return cmd
+    return f"{' '.join(wrappers)} sh -c {shlex.quote(cmd)}"
+
+
+def popen_kwargs(cmd, config=None):
+    """(command, subprocess keyword arguments) that start cmd under the configured limits"""
+    limits = get_limits(config if config is not None else load_config())
+    # Each wrapper execs the next, so the process started here stays the group leader
+    return wrap_command(cmd, limits), {'start_new_session': True}
+
+
+def _read_proc_stat(pid):
+    """(pgrp, utime + stime ticks, rss pages, threads) of a process, or None if it is gone"""
+    try:
+        with open(os.path.join(PROC_DIR, str(pid), 'stat'), 'r') as f:
+            data = f.read()
+    except OSError:
+        return None
+    # The command name is in parentheses and may contain spaces
+    fields = data[data.rindex(')') + 2:].split()
+    return int(fields[2]), int(fields[11]) + int(fields[12]), int(fields[21]), int(fields[17])
+
+
+def _count_open_files(pid):
+    try:
+        return len(os.listdir(os.path.join(PROC_DIR, str(pid), 'fd')))
+    except OSError:
+        return 0
+
+
+def sample_group(pgid):
+    """Summed usage of every process in a process group, read from /proc"""
+    usage = {'processes': 0, 'cpu_ticks': 0, 'rss_bytes': 0, 'threads': 0, 'open_files': 0}
+    page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+    try:
+        pids = [int(name) for name in os.listdir(PROC_DIR) if name.isdigit()]
+    except OSError:
+        return usage
+    for pid in pids:
+        stat = _read_proc_stat(pid)
+        if stat is None or stat[0] != pgid:
+            continue
+        usage['processes'] += 1
+        usage['cpu_ticks'] += stat[1]
+        usage['rss_bytes'] += stat[2] * page_size
+        usage['threads'] += stat[3]
+        usage['open_files'] += _count_open_files(pid)
+    return usage
+
+
+class ResourceMonitor:
+    """Samples the process groups of running agents and can stop them"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._entries = {}  # output log path -> entry
+        self._ticks_per_second = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+        self.samples = 0
+        self.kills = 0
+
+    @staticmethod
+    def _key(output_file_path):
+        return os.path.abspath(output_file_path)
+
+    def start(self):
+        """Start the sampler thread (idempotent)"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            interval = float(load_config().get('resource_sample_interval', DEFAULT_SAMPLE_INTERVAL))
+            with self._lock:
+                entries = list(self._entries.values())
+            for entry in entries:
+                try:
+                    self._sample(entry)
+                except Exception as e:
+                    print(f"DEBUG: Could not sample process group {entry['pgid']}: {e}")
+            self._wake.wait(interval)
+            self._wake.clear()
+
+    def register(self, process, output_file_path, limits=None):
+        """Track a process started with start_new_session (it leads its own group)"""
+        entry = {
+            'pid': process.pid,
+            'pgid': process.pid,
+            'process': process,
+            'path': output_file_path,
+            'started_at': time.time(),
+            'limits': limits,
+            'current': None,
+            'peak_rss_bytes': 0,
+            'peak_processes': 0,
+            'peak_open_files': 0,
+            'cpu_seconds': 0.0,
+            'last': None,  # (time, cpu ticks) of the previous sample
+            'killed': None,
+        }
+        with self._lock:
+            self._entries[self._key(output_file_path)] = entry
+        self.start()
+        self._wake.set()
+        return entry
+
+    def _sample(self, entry):
+        now = time.time()
+        usage = sample_group(entry['pgid'])
+        cpu_percent = None
+        if entry['last'] is not None and now > entry['last'][0]:
+            delta_ticks = max(0, usage['cpu_ticks'] - entry['last'][1])
+            cpu_percent = round(100.0 * delta_ticks / self._ticks_per_second / (now - entry['last'][0]), 1)
+        current = {
+            'sampled_at': now,
+            'processes': usage['processes'],
+            'threads': usage['threads'],
+            'open_files': usage['open_files'],
+            'rss_bytes': usage['rss_bytes'],
+            'cpu_percent': cpu_percent,
+        }
+        with self._lock:
+            entry['last'] = (now, usage['cpu_ticks'])
+            entry['current'] = current
+            entry['peak_rss_bytes'] = max(entry['peak_rss_bytes'], usage['rss_bytes'])
+            entry['peak_processes'] = max(entry['peak_processes'], usage['processes'])
+            entry['peak_open_files'] = max(entry['peak_open_files'], usage['open_files'])
+            # Children that have exited drop out of the group, so keep the highest total seen
+            entry['cpu_seconds'] = max(entry['cpu_seconds'], usage['cpu_ticks'] / self._ticks_per_second)
+            self.samples += 1
+
+    @staticmethod
+    def _summary(entry, running):
+        return {
+            'running': running,
+            'pid': entry['pid'],
+            'started_at': entry['started_at'],
+            'elapsed_seconds': round(time.time() - entry['started_at'], 1),
+            'current': entry['current'],
+            'cpu_seconds': round(entry['cpu_seconds'], 2),
+            'peak_rss_bytes': entry['peak_rss_bytes'],
+            'peak_processes': entry['peak_processes'],
+            'peak_open_files': entry['peak_open_files'],
+            'limits': entry['limits'],
+            'killed': entry['killed'],
+        }
+
+    def finish(self, output_file_path):
+        """Stop tracking a process that has exited and save its totals next to its log"""
+        with self._lock:
+            entry = self._entries.pop(self._key(output_file_path), None)
+        if entry is None:
+            return None
+        summary = self._summary(entry, running=False)
+        summary['returncode'] = entry['process'].returncode
+        path = os.path.join(os.path.dirname(output_file_path), USAGE_FILE)
+        try:
+            with open(path + '.tmp', 'w') as f:
+                json.dump(summary, f)
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            print(f"DEBUG: Could not save resource usage to {path}: {e}")
+        return summary
+
+    def usage(self, output_file_path):
+        """Live usage of the process writing output_file_path, else the saved totals of its last run"""
+        with self._lock:
+            entry = self._entries.get(self._key(output_file_path))
+            if entry is not None:
+                return self._summary(entry, running=True)
+        try:
+            with open(os.path.join(os.path.dirname(output_file_path), USAGE_FILE), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def kill(self, output_file_path, grace=None):
+        """SIGTERM the process group, then SIGKILL whatever is left after the grace period.
+
+        Returns False if no process is running for output_file_path.
+        """
+        with self._lock:
+            entry = self._entries.get(self._key(output_file_path))
+        if entry is None or entry['process'].poll() is not None:
+            return False
+        if grace is None:
+            grace = float(load_config().get('agent_kill_grace_seconds', DEFAULT_KILL_GRACE))
+        pgid = entry['pgid']
+        entry['killed'] = time.time()
+        self.kills += 1
+        print(f"DEBUG: Stopping process group {pgid}")
+        try:
+            os.killpg(pgid, signal.SIGTERM)
+        except ProcessLookupError:
+            return True
+
+        def escalate():
+            try:
+                entry['process'].wait(grace)
+            except Exception:
+                pass
+            # The leader may be gone while children it spawned live on in the group
+            try:
+                os.killpg(pgid, signal.SIGKILL)
+                print(f"DEBUG: Process group {pgid} did not stop in {grace}s; killed it")
+            except ProcessLookupError:
+                pass
+
+        threading.Thread(target=escalate, daemon=True).start()
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'tracked': len(self._entries),
+                'samples': self.samples,
+                'kills': self.kills,
+            }
+
+
+resource_monitor = ResourceMonitor()
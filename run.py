@@ -15,5 +15,5 @@ if __name__ == '__main__':
     print("Starting Claude Task Manager...")
     print("Open your browser and navigate to http://localhost:9000")
     # Using host='0.0.0.0' makes the server accessible from other machines on the network
-    # Remove debug=True in production environments
+    # This is the development server; in production use gunicorn with gunicorn.conf.py
     app.run(debug=True, host='0.0.0.0', port=9000)
@@ -0,0 +1,244 @@
+"""
+Agent scheduler
+
+Caps the number of Claude processes running at once (max_concurrent_agents in
+config.json). Runs beyond the cap wait in a queue ordered by task priority
+(utils.get_priority_order) and then by the time they were queued.
+
+A streaming start or action marks the task 'queued' while it waits and the
+scheduler launches the process when a slot frees up. Blocking runs (the
+non-streaming action and follow-up) wait for a slot inside their job. The task
+page shows the queue position and an estimated wait based on recent run times.
+"""
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from config import load_config, load_tasks
+from task_cache import get_task, update_task
+from claude_cli import run_claude_command_streaming, get_output_file_path
+from utils import get_priority_order
+from jobs import JobError
+
+DEFAULT_MAX_CONCURRENT_AGENTS = 2
+DEFAULT_RUNTIME = 300  # seconds assumed per run until some runs have been timed
+RUNTIME_SAMPLES = 20
+WAIT_POLL_INTERVAL = 2  # seconds between progress reports while a blocking run waits
+
+
+def get_max_concurrent_agents(config):
+    return max(1, int(config.get('max_concurrent_agents', DEFAULT_MAX_CONCURRENT_AGENTS)))
+
+
+class AgentScheduler:
+    """Admits at most max_concurrent_agents Claude processes, highest priority first"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = []  # heap of (priority order, queued time, seq, entry)
+        self._seq = itertools.count()
+        self._running = {}  # slot -> {'task_id': ..., 'started_at': ...}
+        self._runtimes = deque(maxlen=RUNTIME_SAMPLES)
+        self._recovered = False
+        self.launched = 0
+        self.failed = 0
+
+    def start(self):
+        """Re-queue streaming runs that were still queued when the server stopped (idempotent)"""
+        with self._lock:
+            if self._recovered:
+                return
+            self._recovered = True
+        for task in load_tasks():
+            if task.get('status') != 'queued' or not task.get('queued_status'):
+                continue
+            try:
+                queued_at = datetime.fromisoformat(task['queued_at']).timestamp()
+            except (KeyError, TypeError, ValueError):
+                queued_at = time.time()
+            print(f"DEBUG: Re-queueing task {task['id']} after restart")
+            self._submit(self._streaming_entry(task['id'], task.get('priority'), queued_at,
+                                               task['queued_status'], task.get('status_before_queue', 'new')))
+
+    def _submit(self, entry):
+        with self._lock:
+            heapq.heappush(self._queue, (get_priority_order(entry['priority'] or 'Medium'),
+                                         entry['queued_at'], next(self._seq), entry))
+        self._dispatch()
+        return entry
+
+    def _dispatch(self):
+        """Launch queued runs while there are free slots"""
+        limit = get_max_concurrent_agents(load_config())
+        while True:
+            with self._lock:
+                if not self._queue or len(self._running) >= limit:
+                    return
+                entry = heapq.heappop(self._queue)[3]
+                slot = next(self._seq)
+                self._running[slot] = {'task_id': entry['task_id'], 'started_at': time.time()}
+                entry['state'] = 'running'
+            try:
+                entry['launch'](slot)
+            except Exception as e:
+                print(f"DEBUG: Error launching queued run for task {entry['task_id']}: {e}")
+                entry['state'] = 'failed'
+                entry['error'] = str(e)
+                self.release(slot, record=False)
+
+    def release(self, slot, record=True):
+        """Free a slot when its process has finished and admit the next run"""
+        with self._lock:
+            info = self._running.pop(slot, None)
+            if info and record:
+                self._runtimes.append(time.time() - info['started_at'])
+        if info:
+            self._dispatch()
+
+    def _streaming_entry(self, task_id, priority, queued_at, status, previous_status):
+        entry = {'task_id': task_id, 'priority': priority, 'queued_at': queued_at,
+                 'state': 'queued', 'error': None}
+
+        def launch(slot):
+            task = get_task(task_id)
+            if task is None or task.get('status') != 'queued':
+                # Deleted or moved on while waiting
+                entry['state'] = 'cancelled'
+                self.release(slot, record=False)
+                return
+            skip_permissions = load_config().get('skip_permissions', False)
+            process = run_claude_command_streaming(task['prompt'], task['workspace_dir'],
+                                                   get_output_file_path(task_id), skip_permissions,
+                                                   on_exit=lambda: self.release(slot))
+            if process is None:
+                entry['state'] = 'failed'
+                entry['error'] = 'Failed to start Claude process'
+                self.failed += 1
+                update_task(task_id, {'status': previous_status, 'queued_status': None, 'queued_at': None})
+                self.release(slot, record=False)
+                return
+            self.launched += 1
+            update_task(task_id, {'status': status, 'queued_status': None, 'queued_at': None})
+
+        entry['launch'] = launch
+        return entry
+
+    def start_streaming(self, task_id, status):
+        """Run the task's prompt with streaming output as soon as a slot is free.
+
+        The task is 'queued' until its process starts, then moves to status.
+        Returns the queue entry; entry['state'] is 'running', 'queued' or 'failed'.
+        """
+        task = get_task(task_id)
+        queued_at = time.time()
+        if task is None:
+            # Deleted in the meantime: drop anything still queued for it rather than start a run
+            self.cancel(task_id)
+            return {'task_id': task_id, 'priority': None, 'queued_at': queued_at,
+                    'state': 'failed', 'error': 'Task not found'}
+        previous_status = task['status'] if task['status'] != 'queued' else task.get('status_before_queue', 'new')
+        # Mark the task queued before submitting so the launch's status update wins
+        update_task(task_id, {
+            'status': 'queued',
+            'queued_status': status,
+            'queued_at': datetime.fromtimestamp(queued_at).isoformat(),
+            'status_before_queue': previous_status,
+        })
+        return self._submit(self._streaming_entry(task_id, task.get('priority'), queued_at,
+                                                  status, previous_status))
+
+    def run(self, task_id, fn, on_wait=None):
+        """Call fn() in an agent slot, blocking until one is free.
+
+        on_wait(queue_info) is called periodically while the run is waiting.
+        Raises JobError if the run is cancelled (see cancel()) before it starts.
+        """
+        task = get_task(task_id) or {}
+        admitted = threading.Event()
+        slots = []
+
+        def launch(slot):
+            slots.append(slot)
+            admitted.set()
+
+        entry = {'task_id': task_id, 'priority': task.get('priority'), 'queued_at': time.time(),
+                 'state': 'queued', 'error': None, 'launch': launch, 'on_cancel': admitted.set}
+        self._submit(entry)
+        while not admitted.wait(WAIT_POLL_INTERVAL):
+            info = self.queue_info(task_id)
+            if on_wait and info:
+                on_wait(info)
+        if entry['state'] == 'cancelled':
+            raise JobError('cancelled')
+        try:
+            return fn()
+        finally:
+            self.release(slots[0])
+
+    def cancel(self, task_id):
+        """Drop any queued runs for a task; blocking runs waiting in run() are woken and fail"""
+        with self._lock:
+            kept = [item for item in self._queue if item[3]['task_id'] != task_id]
+            cancelled = [item[3] for item in self._queue if item[3]['task_id'] == task_id]
+            heapq.heapify(kept)
+            self._queue = kept
+            for entry in cancelled:
+                entry['state'] = 'cancelled'
+        for entry in cancelled:
+            if entry.get('on_cancel'):
+                entry['on_cancel']()
+        return len(cancelled)
+
+    def _average_runtime(self):
+        if not self._runtimes:
+            return DEFAULT_RUNTIME
+        return sum(self._runtimes) / len(self._runtimes)
+
+    def queue_info(self, task_id):
+        """Queue position (1-based) and estimated wait for a task's queued run, or None"""
+        limit = get_max_concurrent_agents(load_config())
+        now = time.time()
+        with self._lock:
+            ordered = [item[3] for item in sorted(self._queue, key=lambda item: item[:3])]
+            positions = [i for i, entry in enumerate(ordered) if entry['task_id'] == task_id]
+            if not positions:
+                return None
+            position = positions[0]
+            average = self._average_runtime()
+            remaining = sorted(max(0.0, info['started_at'] + average - now) for info in self._running.values())
+
+        # Simulate slots freeing up: each run ahead of this one takes one slot for the average runtime
+        excess = len(remaining) - limit
+        free_at = remaining[excess:] if excess > 0 else remaining + [0.0] * (limit - len(remaining))
+        heapq.heapify(free_at)
+        for _ in range(position):
+            heapq.heappush(free_at, heapq.heappop(free_at) + average)
+        return {
+            'queued': True,
+            'position': position + 1,
+            'queue_length': len(ordered),
+            'running': len(remaining),
+            'max_concurrent': limit,
+            'estimated_wait_seconds': int(free_at[0]),
+            'average_runtime_seconds': int(average),
+            'runtime_samples': len(self._runtimes),
+        }
+
+    def stats(self):
+        limit = get_max_concurrent_agents(load_config())
+        with self._lock:
+            return {
+                'max_concurrent': limit,
+                'running': len(self._running),
+                'queued': len(self._queue),
+                'launched': self.launched,
+                'failed': self.failed,
+                'average_runtime_seconds': int(self._average_runtime()),
+                'runtime_samples': len(self._runtimes),
+            }
+
+
+agent_scheduler = AgentScheduler()
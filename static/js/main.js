@@ -1,5 +1,234 @@
 // Main JavaScript for Claude Task Manager
 
+// Poll a background job until it finishes
+function followJob(jobId, callbacks) {
+    callbacks = callbacks || {};
+    const poll = () => {
+        fetch(`/jobs/${jobId}`)
+            .then(response => response.json())
+            .then(job => {
+                if (callbacks.onUpdate) callbacks.onUpdate(job);
+                if (job.status === 'succeeded') {
+                    if (callbacks.onSuccess) callbacks.onSuccess(job);
+                } else if (job.status === 'failed') {
+                    if (callbacks.onFailure) callbacks.onFailure(job);
+                } else {
+                    setTimeout(poll, 1000);
+                }
+            })
+            .catch(() => setTimeout(poll, 2000));
+    };
+    poll();
+}
+
+// Show a CSV import's progress, then refresh the task list (or open the batch it started)
+function followImport(banner) {
+    const message = banner.querySelector('.import-message');
+    const bar = banner.querySelector('.import-progress');
+    const showProgress = progress => {
+        if (progress && progress.total_bytes) {
+            bar.style.width = `${Math.round(100 * progress.bytes_read / progress.total_bytes)}%`;
+        }
+    };
+    followJob(banner.getAttribute('data-job-id'), {
+        onUpdate: job => {
+            message.textContent = job.message;
+            showProgress(job.progress);
+        },
+        onSuccess: job => {
+            const result = job.result;
+            if (result.batch_job_id) {
+                location.href = `/batches/${result.batch_job_id}`;
+                return;
+            }
+            showProgress(result);
+            let text = `Added ${result.added} new tasks from ${result.rows} rows.`;
+            if (result.upsert) {
+                text += ` Updated ${result.updated}, unchanged ${result.unchanged}, ${result.removed} not in the file`;
+                text += result.archived ? ` (${result.archived} archived).` : '.';
+            }
+            if (result.duplicates) text += ` ${result.duplicates} tickets were already imported.`;
+            if (result.skipped) text += ` Skipped ${result.skipped} tasks due to assignee filtering.`;
+            if (result.errors) text += ` ${result.errors} rows had errors (${result.error_rows.join('; ')}).`;
+            message.textContent = text;
+            banner.classList.remove('alert-info');
+            banner.classList.add(result.added || result.updated ? 'alert-success' : 'alert-warning');
+            // Drop ?import_job= so a reload does not show the banner again
+            history.replaceState(null, '', location.pathname);
+            if (document.getElementById('tasksTable')) {
+                document.dispatchEvent(new Event('tasks-changed'));
+            } else if (result.added || result.updated) {
+                location.reload();
+            }
+        },
+        onFailure: job => {
+            banner.classList.remove('alert-info');
+            banner.classList.add('alert-danger');
+            message.textContent = job.error || job.message;
+            history.replaceState(null, '', location.pathname);
+        }
+    });
+}
+
+// Format a byte count for display
+function formatBytes(bytes) {
+    if (bytes >= 1073741824) return `${(bytes / 1073741824).toFixed(1)} GB`;
+    if (bytes >= 1048576) return `${(bytes / 1048576).toFixed(0)} MB`;
+    return `${Math.round(bytes / 1024)} KB`;
+}
+
+// Show the resource usage of a task's Claude process, refreshed while it runs
+function followResources(panel) {
+    const text = panel.querySelector('.resource-text');
+    const killForm = panel.querySelector('.resource-kill');
+    const poll = () => {
+        fetch(`/task/${panel.getAttribute('data-task-id')}/resources`)
+            .then(response => response.ok ? response.json() : null)
+            .then(usage => {
+                if (!usage) return;
+                panel.classList.remove('d-none');
+                killForm.classList.toggle('d-none', !usage.running);
+                const current = usage.current;
+                if (usage.running && current) {
+                    const cpu = current.cpu_percent === null ? '-' : `${current.cpu_percent}%`;
+                    text.textContent = `Agent: ${current.processes} processes, CPU ${cpu}, memory ${formatBytes(current.rss_bytes)}, ` +
+                        `${current.open_files} open files (peak memory ${formatBytes(usage.peak_rss_bytes)}, ${usage.cpu_seconds}s CPU)`;
+                } else if (usage.running) {
+                    text.textContent = 'Agent running; measuring resource usage...';
+                } else {
+                    text.textContent = `Last run: ${usage.elapsed_seconds}s, ${usage.cpu_seconds}s CPU, ` +
+                        `peak memory ${formatBytes(usage.peak_rss_bytes)}, up to ${usage.peak_processes} processes` +
+                        (usage.killed ? ' (stopped)' : '');
+                }
+                if (usage.running) setTimeout(poll, 5000);
+            })
+            .catch(() => setTimeout(poll, 10000));
+    };
+    poll();
+}
+
+// Format a number of seconds as a rough duration
+function formatWait(seconds) {
+    if (seconds < 60) return 'under a minute';
+    const minutes = Math.round(seconds / 60);
+    return minutes === 1 ? 'about 1 minute' : `about ${minutes} minutes`;
+}
+
+// Poll a queued task's position until its agent run starts
+function followQueue(taskId, element) {
+    const poll = () => {
+        fetch(`/task/${taskId}/queue`)
+            .then(response => response.json())
+            .then(info => {
+                if (info.status !== 'queued') {
+                    location.reload();
+                    return;
+                }
+                if (info.queued) {
+                    element.textContent = `Position ${info.position} of ${info.queue_length} ` +
+                        `(${info.running} of ${info.max_concurrent} agents busy), estimated wait ${formatWait(info.estimated_wait_seconds)}`;
+                }
+                setTimeout(poll, 5000);
+            })
+            .catch(() => setTimeout(poll, 5000));
+    };
+    poll();
+}
+
+// Load one page of a file's diff into its panel
+function loadFileDiff(taskId, path, body, offset) {
+    const params = new URLSearchParams({path: path, offset: offset});
+    fetch(`/task/${taskId}/diff/file?${params}`)
+        .then(response => response.json())
+        .then(page => {
+            const more = body.querySelector('.diff-load-more');
+            if (more) more.remove();
+            if (page.error) {
+                body.insertAdjacentHTML('beforeend', '<div class="text-danger small p-2"></div>');
+                body.lastElementChild.textContent = page.error;
+                return;
+            }
+            const pre = document.createElement('pre');
+            const code = document.createElement('code');
+            code.className = 'language-diff';
+            code.textContent = page.lines.join('\n');
+            pre.appendChild(code);
+            body.appendChild(pre);
+            hljs.highlightElement(code);
+            if (page.next_offset !== null) {
+                const button = document.createElement('button');
+                button.className = 'btn btn-sm btn-outline-secondary m-2 diff-load-more';
+                button.textContent = 'Load more';
+                button.addEventListener('click', () => loadFileDiff(taskId, path, body, page.next_offset));
+                body.appendChild(button);
+            }
+        });
+}
+
+// Show a page of the changed files; each file's diff is fetched when it is opened
+function loadDiffFiles(browser, page) {
+    const taskId = browser.getAttribute('data-task-id');
+    const summary = browser.querySelector('.diff-summary');
+    const list = browser.querySelector('.diff-file-list');
+    const pager = browser.querySelector('.diff-pager');
+    fetch(`/task/${taskId}/diff/files?page=${page}`)
+        .then(response => response.json())
+        .then(result => {
+            if (result.error) {
+                summary.textContent = `${result.error}. Use Raw to see the stored diff.`;
+                return;
+            }
+            summary.textContent = `${result.total_files} files changed, ${result.added} insertions(+), ${result.deleted} deletions(-)`;
+            list.innerHTML = '';
+            result.files.forEach(file => {
+                const item = document.createElement('div');
+                item.className = 'list-group-item';
+                const header = document.createElement('button');
+                header.type = 'button';
+                header.className = 'btn btn-link text-start text-decoration-none p-0 w-100 d-flex justify-content-between';
+                const name = document.createElement('span');
+                name.className = 'diff-file-path';
+                name.textContent = file.path;
+                const counts = document.createElement('span');
+                counts.className = 'text-nowrap ms-2';
+                counts.innerHTML = file.binary ? '<span class="badge bg-secondary">binary</span>' :
+                    `<span class="text-success">+${file.added}</span> <span class="text-danger">-${file.deleted}</span>`;
+                if (file.untracked) counts.insertAdjacentHTML('afterbegin', '<span class="badge bg-info text-dark">new</span> ');
+                header.append(name, counts);
+                const body = document.createElement('div');
+                body.className = 'diff-file-body d-none mt-2';
+                header.addEventListener('click', () => {
+                    body.classList.toggle('d-none');
+                    if (!body.dataset.loaded) {
+                        body.dataset.loaded = '1';
+                        loadFileDiff(taskId, file.path, body, 0);
+                    }
+                });
+                item.append(header, body);
+                list.appendChild(item);
+            });
+            pager.innerHTML = '';
+            pager.classList.toggle('d-none', result.pages <= 1);
+            if (result.pages > 1) {
+                const previous = document.createElement('button');
+                previous.className = 'btn btn-sm btn-outline-secondary';
+                previous.textContent = 'Previous';
+                previous.disabled = result.page <= 1;
+                previous.addEventListener('click', () => loadDiffFiles(browser, result.page - 1));
+                const next = document.createElement('button');
+                next.className = 'btn btn-sm btn-outline-secondary';
+                next.textContent = 'Next';
+                next.disabled = result.page >= result.pages;
+                next.addEventListener('click', () => loadDiffFiles(browser, result.page + 1));
+                const label = document.createElement('span');
+                label.className = 'small text-muted mx-2';
+                label.textContent = `Page ${result.page} of ${result.pages}`;
+                pager.append(previous, label, next);
+            }
+        })
+        .catch(() => { summary.textContent = 'Could not load the changed files.'; });
+}
+
 document.addEventListener('DOMContentLoaded', function() {
     // Initialize tooltips
     var tooltipTriggerList = [].slice.call(document.querySelectorAll('[data-bs-toggle="tooltip"]'));
@@ -35,6 +264,34 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
     
+    // Follow background jobs shown on the page and reload when they finish
+    document.querySelectorAll('.job-status[data-job-id]').forEach(banner => {
+        const messageElement = banner.querySelector('.job-message');
+        followJob(banner.getAttribute('data-job-id'), {
+            onUpdate: job => { messageElement.textContent = job.message; },
+            onSuccess: () => location.reload(),
+            onFailure: job => {
+                banner.classList.remove('alert-info');
+                banner.classList.add('alert-danger');
+                messageElement.textContent = job.error || job.message;
+            }
+        });
+    });
+    
+    // Follow a CSV import started from the upload form
+    document.querySelectorAll('.import-status[data-job-id]').forEach(followImport);
+    
+    // Load changed files for diff panels
+    document.querySelectorAll('.diff-browser[data-task-id]').forEach(browser => loadDiffFiles(browser, 1));
+    
+    // Show agent resource usage
+    document.querySelectorAll('.resource-usage[data-task-id]').forEach(followResources);
+    
+    // Keep queue positions up to date
+    document.querySelectorAll('.queue-status[data-task-id]').forEach(panel => {
+        followQueue(panel.getAttribute('data-task-id'), panel.querySelector('.queue-position'));
+    });
+    
     // Copy to clipboard functionality
     const copyButtons = document.querySelectorAll('.copy-btn');
     copyButtons.forEach(button => {
@@ -0,0 +1,425 @@
+"""
+Live output broker for the SSE stream endpoint
+
+Each task being watched has a single tailer thread that reads new complete
+lines from its claude_output.jsonl, encodes each one once, and publishes it to
+every subscriber's queue. Browser tabs subscribe instead of opening and polling
+the file themselves, so the cost of tailing a task stays the same however many
+viewers it has.
+
+A new subscriber first replays the part of the file the tailer has already
+published (read once, from disk) and then continues from its queue, so no line
+is missed or sent twice. A viewer that falls more than a queue's worth of lines
+behind (or joins a tailer that is publishing a long log in one go) stops
+receiving lines through the queue and catches up from disk instead, so memory
+stays bounded without ever dropping the viewer. While a Claude process is running the tailer is
+woken as soon as process_io writes a batch, and the process's stderr lines
+(from its ring buffer) are published as separate 'stderr' events. The tailer
+stops once no run is pending (the task is not queued, streaming or actioning
+and has no job on the way to starting one; viewers then get an 'end' event),
+when the output file is replaced by a new run, or when nobody has been watching
+for a while. A task that is waiting for an agent slot may have no output file
+yet; the tailer keeps waiting for it as long as the run is pending.
+
+Every output event's id is the byte offset just past its line in the file, so a
+reconnecting browser (Last-Event-ID, or ?from=) resumes exactly where it left
+off instead of replaying the whole log. stderr events carry no id.
+
+Logs of finished tasks may have been compressed (see log_retention.py); they
+are replayed through streaming decompression and then ended, and offsets still
+refer to the uncompressed log.
+
+When the server shuts down (see gunicorn.conf.py) drain() ends every feed
+without an 'end' event: browsers reconnect with their Last-Event-ID and resume
+on the next server instead of holding the old one open until it is killed.
+"""
+import os
+import json
+import queue
+import threading
+import time
+from collections import deque
+
+from claude_cli import get_output_file_path, get_stderr_file_path
+from task_cache import get_task, get_task_status
+from jobs import job_queue
+from process_io import STDERR_TAIL_LINES, get_process_io, read_stderr_tail
+from log_retention import find_log, is_compressed, log_size, open_log
+
+POLL_INTERVAL = 0.1  # seconds between reads when there is no new output
+STATUS_CHECK_INTERVAL = 1  # seconds between task status checks
+FILE_WAIT_TIMEOUT = 30  # seconds to wait for the output file to appear
+IDLE_TIMEOUT = 30  # seconds a tailer keeps running without subscribers
+SUBSCRIBER_QUEUE_SIZE = 1000  # lines queued for a viewer before it catches up from disk instead
+READ_CHUNK_SIZE = 1024 * 1024  # bytes read from the log at a time
+HEARTBEAT_INTERVAL = 15  # seconds of quiet before a keepalive comment is sent
+ACTIVE_STATUSES = ('queued', 'streaming', 'actioning')  # a run is waiting for a slot or in progress
+
+_END = object()
+_GAP = object()  # lines after this point were not queued and are read from disk
+
+
+def run_pending(task_id, status=None):
+    """True while more output may be written for the task: a run is queued or in
+    progress, or a job that will start one has not got that far yet"""
+    status = status or get_task_status(task_id)
+    if status in ACTIVE_STATUSES:
+        return True
+    task = get_task(task_id)
+    return bool(task) and job_queue.is_active(task.get('job_id'))
+
+
+def encode_line(line):
+    """Encode one output line as SSE data: JSON lines as-is, anything else as text"""
+    try:
+        return json.dumps(json.loads(line))
+    except json.JSONDecodeError:
+        return json.dumps({'text': line})
+
+
+def encode_stderr(line):
+    return ('stderr', json.dumps({'text': line}), None)
+
+
+def split_lines(data, base_offset):
+    """Encode each non-blank line in data as an event whose id is the file offset after it"""
+    events = []
+    offset = base_offset
+    for raw in data.splitlines(keepends=True):
+        offset += len(raw)
+        line = raw.decode('utf-8', errors='replace').strip()
+        if line:
+            events.append(('message', encode_line(line), offset))
+    return events
+
+
+def read_line_chunks(f, start, end):
+    """Yield (data, offset) pieces of f between two offsets, each ending at a line boundary"""
+    f.seek(start)
+    offset, carry = start, b''
+    while offset + len(carry) < end:
+        data = f.read(min(READ_CHUNK_SIZE, end - offset - len(carry)))
+        if not data:
+            break
+        data = carry + data
+        cut = data.rfind(b'\n') + 1
+        if cut <= 0:
+            # No line break yet: keep reading until the line ends
+            carry = data
+            continue
+        yield data[:cut], offset
+        offset += cut
+        carry = data[cut:]
+    if carry:
+        yield carry, offset
+
+
+class Subscription:
+    """One viewer's feed: the backlog from disk, then live events from the tailer"""
+
+    def __init__(self, stream, backlog_end, stderr_backlog, from_offset=0):
+        self.stream = stream
+        self.backlog_end = backlog_end
+        self.stderr_backlog = stderr_backlog
+        self.from_offset = from_offset
+        self.queue = queue.Queue()
+        self.overflowed = False
+        self.caught_up = 0  # times this viewer fell behind and read from disk
+
+    def _push(self, data, force=False):
+        """Queue an event; output lines beyond the queue size are left for events() to read from disk.
+
+        Control events (errors, 'end', end of feed) are always queued. stderr
+        lines are not in the output log, so a viewer that is behind misses them.
+        """
+        if not force and self.queue.qsize() >= SUBSCRIBER_QUEUE_SIZE:
+            if not self.overflowed:
+                self.overflowed = True
+                self.queue.put(_GAP)
+            return
+        self.queue.put(data)
+
+    def _read(self, start, end):
+        """Output lines between two offsets of the log, read from disk"""
+        if end <= start:
+            return
+        with open_log(self.stream.path) as f:
+            for data, offset in read_line_chunks(f, start, end):
+                yield from split_lines(data, offset)
+
+    def backlog(self):
+        """Lines between the resume offset and where the tailer was when this subscription started"""
+        return self._read(self.from_offset, self.backlog_end)
+
+    def events(self, timeout=None):
+        """Yield (event type, data, id) until the stream ends; yields None after timeout seconds of quiet"""
+        last = self.from_offset  # offset of the last line sent
+        for event in self.backlog():
+            last = event[2]
+            yield event
+        yield from self.stderr_backlog
+        while True:
+            try:
+                event = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                yield None
+                continue
+            if event is _END:
+                return
+            if event is _GAP:
+                # Lines published from here on are queued again; read everything up to now from disk
+                self.overflowed = False
+                self.caught_up += 1
+                for event in self._read(last, self.stream.position):
+                    last = event[2]
+                    yield event
+                continue
+            if event[2] is not None:
+                if event[2] <= last:
+                    # Already sent (from disk, or before reconnecting)
+                    continue
+                last = event[2]
+            yield event
+
+    def close(self):
+        self.stream.unsubscribe(self)
+
+
+class TaskStream:
+    """Tails one task's output file and fans lines out to subscribers"""
+
+    def __init__(self, broker, task_id):
+        self.broker = broker
+        self.task_id = task_id
+        self.path = get_output_file_path(task_id)
+        self.position = 0  # bytes published so far (always at a line boundary)
+        self.published = 0
+        self._stderr = deque((encode_stderr(line) for line in read_stderr_tail(get_stderr_file_path(self.path))),
+                             maxlen=STDERR_TAIL_LINES)
+        self._process_io = None
+        self._stderr_seq = 0
+        self.finished = False
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._idle_since = time.time()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def subscribe(self, from_offset=0):
+        """Register a subscriber, or return None if the tailer has already stopped"""
+        with self._lock:
+            if self.finished:
+                return None
+            subscription = Subscription(self, self.position, list(self._stderr), from_offset)
+            self._subscribers.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+            if not self._subscribers:
+                self._idle_since = time.time()
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def _publish(self, events, new_position=None):
+        with self._lock:
+            if new_position is not None:
+                self.position = new_position
+            self.published += len(events)
+            self._stderr.extend(event for event in events if event[0] == 'stderr')
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            for event in events:
+                subscription._push(event)
+
+    def close_subscribers(self):
+        """End every current feed; the tailer stops once it has been idle long enough"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self._subscribers.clear()
+            self._idle_since = time.time()
+        for subscription in subscribers:
+            subscription._push(_END, force=True)
+        return len(subscribers)
+
+    def _finish(self, error=None, ended=False):
+        with self._lock:
+            self.finished = True
+            subscribers = list(self._subscribers)
+            self._subscribers.clear()
+        for subscription in subscribers:
+            if error:
+                subscription._push(('message', json.dumps({'error': error}), None), force=True)
+            if ended:
+                # Tells the browser not to reconnect
+                subscription._push(('end', json.dumps({'status': get_task_status(self.task_id)}), None), force=True)
+            subscription._push(_END, force=True)
+        self.broker._remove(self)
+
+    def _read_new(self, f, final=False):
+        """Publish complete lines written since the last read; returns True if any were found"""
+        f.seek(self.position)
+        data = f.read(READ_CHUNK_SIZE)
+        at_end = len(data) < READ_CHUNK_SIZE
+        while not at_end and b'\n' not in data:
+            # A line longer than the chunk: read on until it ends
+            more = f.read(READ_CHUNK_SIZE)
+            data += more
+            at_end = len(more) < READ_CHUNK_SIZE
+        if not data:
+            return False
+        end = len(data) if final and at_end else data.rfind(b'\n') + 1
+        if end <= 0:
+            return False
+        self._publish(split_lines(data[:end], self.position), self.position + end)
+        return True
+
+    def _replay_compressed(self):
+        """Publish a finished run's compressed log, decompressing it as it is read"""
+        with open_log(self.path) as f:
+            for data, offset in read_line_chunks(f, self.position, log_size(self.path)):
+                self._publish(split_lines(data, offset), offset + len(data))
+
+    def _read_stderr(self, process_io):
+        """Publish stderr lines the running process has produced since the last call"""
+        if process_io is not self._process_io:
+            # Pick up the last lines of the previous process before switching
+            self._drain_stderr()
+            self._process_io = process_io
+            self._stderr_seq = 0
+        self._drain_stderr()
+
+    def _drain_stderr(self):
+        if self._process_io is None:
+            return
+        events = self._process_io.recent('stderr', after_seq=self._stderr_seq)
+        if events:
+            self._stderr_seq = events[-1]['seq']
+            self._publish([encode_stderr(event['line']) for event in events])
+
+    def _wait(self, process_io, seen_flushes):
+        if process_io is not None:
+            process_io.wait_for_output(seen_flushes, STATUS_CHECK_INTERVAL)
+        else:
+            time.sleep(POLL_INTERVAL)
+
+    def _is_idle(self):
+        with self._lock:
+            return not self._subscribers and time.time() - self._idle_since > IDLE_TIMEOUT
+
+    def _run(self):
+        # Wait for the file to be created
+        started = time.time()
+        while not find_log(self.path) and not self._is_idle():
+            if time.time() - started >= FILE_WAIT_TIMEOUT and not run_pending(self.task_id):
+                break
+            time.sleep(POLL_INTERVAL)
+        if not find_log(self.path):
+            self._finish(error='Output file not found', ended=True)
+            return
+
+        if is_compressed(self.path):
+            # Only finished runs are compressed: replay the log and end
+            try:
+                self._replay_compressed()
+            except Exception as e:
+                print(f"DEBUG: Error reading compressed output for task {self.task_id}: {e}")
+            self._finish(ended=True)
+            return
+
+        ended = False
+        try:
+            last_status_check = 0
+            with open(self.path, 'rb') as f:
+                while True:
+                    process_io = get_process_io(self.path)
+                    seen_flushes = process_io.flushes if process_io else None
+                    self._read_stderr(process_io)
+                    if self._read_new(f):
+                        continue
+                    if os.fstat(f.fileno()).st_size < self.position or not os.path.exists(self.path):
+                        # A new run replaced the output file; viewers reconnect to a fresh tailer
+                        break
+                    if self._is_idle():
+                        break
+                    now = time.time()
+                    if now - last_status_check >= STATUS_CHECK_INTERVAL:
+                        last_status_check = now
+                        status = get_task_status(self.task_id)
+                        if status and not run_pending(self.task_id, status):
+                            # Process finished: publish whatever is left, including a partial last line
+                            while self._read_new(f, final=True):
+                                pass
+                            self._read_stderr(None)
+                            ended = True
+                            break
+                    self._wait(process_io, seen_flushes)
+        except Exception as e:
+            print(f"DEBUG: Error tailing output for task {self.task_id}: {e}")
+        self._finish(ended=ended)
+
+
+class StreamBroker:
+    """Keeps one TaskStream per watched task"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._streams = {}
+        self.draining = False
+
+    def subscribe(self, task_id, from_offset=0):
+        """Subscribe to a task's live output from a byte offset, starting its tailer if needed.
+
+        Returns None once the broker is draining for shutdown.
+        """
+        if self.draining:
+            return None
+        size = log_size(get_output_file_path(task_id))
+        if from_offset and (size is None or size < from_offset):
+            # The offset belongs to an earlier run's output; start over
+            from_offset = 0
+        while True:
+            with self._lock:
+                stream = self._streams.get(task_id)
+                if stream is None:
+                    stream = TaskStream(self, task_id)
+                    self._streams[task_id] = stream
+                    stream.start()
+            subscription = stream.subscribe(from_offset)
+            if subscription is not None:
+                return subscription
+            # The tailer stopped between lookup and subscribe; start a fresh one
+            self._remove(stream)
+
+    def drain(self):
+        """Refuse new subscribers and end every open feed; returns the number of feeds ended"""
+        with self._lock:
+            self.draining = True
+            streams = list(self._streams.values())
+        closed = sum(stream.close_subscribers() for stream in streams)
+        print(f"DEBUG: Drained {closed} live output streams for shutdown")
+        return closed
+
+    def _remove(self, stream):
+        with self._lock:
+            if self._streams.get(stream.task_id) is stream:
+                del self._streams[stream.task_id]
+
+    def stats(self):
+        with self._lock:
+            streams = list(self._streams.values())
+        return {
+            stream.task_id: {
+                'subscribers': stream.subscriber_count(),
+                'position': stream.position,
+                'published': stream.published,
+            }
+            for stream in streams
+        }
+
+
+stream_broker = StreamBroker()
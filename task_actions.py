@@ -0,0 +1,202 @@
+"""
+Task lifecycle operations run as background jobs
+
+Each function takes the Job it runs under as its first argument, reports
+progress through it, and raises JobError with a user-facing message when the
+operation cannot be completed. The Flask routes validate the request, submit
+one of these with jobs.submit_job() and return immediately.
+"""
+import os
+import time
+import subprocess
+
+from config import WORKSPACES_DIR, load_config
+from task_cache import get_task, update_task
+from jobs import JobError
+from claude_cli import run_claude_command, get_output_file_path
+from artifact_store import write_artifact, append_artifact, has_artifact_file
+from output_summary import get_summary
+from git_utils import get_git_diff, create_git_branch_and_push, DIFF_ERROR_PREFIX
+from diff_service import DiffError
+from diff_cache import cached_diff, workspace_fingerprint
+from workspace_pool import create_task_workspace
+from workspace_manager import workspace_manager
+from scheduler import agent_scheduler
+from metrics import CLONE_DURATION, PUSH_DURATION
+
+
+def _require_task(task_id):
+    task = get_task(task_id)
+    if task is None:
+        raise JobError('Task not found')
+    return task
+
+
+def _require_workspace(task_id):
+    """The task, if its workspace is on disk (not evicted to stay within the disk budget)"""
+    task = _require_task(task_id)
+    if task.get('workspace_evicted'):
+        raise JobError('Workspace evicted; restore it first')
+    return task
+
+
+def _schedule_streaming(task_id, status):
+    """Hand a streaming run to the scheduler; returns True if it started straight away"""
+    entry = agent_scheduler.start_streaming(task_id, status)
+    if entry['state'] == 'failed':
+        raise JobError(entry['error'] or 'Failed to start Claude process')
+    return entry['state'] == 'running'
+
+
+def _run_in_slot(job, task_id, fn):
+    """Run a blocking Claude command once the scheduler admits it"""
+    def on_wait(info):
+        job.progress(f"Waiting for an agent slot (position {info['position']} of {info['queue_length']})")
+
+    def run():
+        job.progress('Running Claude')
+        return fn()
+    return agent_scheduler.run(task_id, run, on_wait=on_wait)
+
+
+def start_task_job(job, task_id):
+    """Check out a workspace for the task and start Claude with streaming output"""
+    config = load_config()
+    _require_task(task_id)
+
+    job.progress('Preparing workspace')
+    workspace_dir = os.path.join(WORKSPACES_DIR, task_id)
+    started = time.monotonic()
+    try:
+        from_pool = create_task_workspace(config, workspace_dir)
+    except subprocess.CalledProcessError as e:
+        raise JobError(f'Error cloning repository: {e.stderr or e}')
+    CLONE_DURATION.observe(time.monotonic() - started, source='pool' if from_pool else 'clone')
+
+    update_task(task_id, {'workspace_dir': workspace_dir, 'workspace_evicted': None})
+    job.progress('Starting Claude')
+    started = _schedule_streaming(task_id, 'streaming')
+    return {'workspace_dir': workspace_dir, 'from_pool': from_pool, 'queued': not started}
+
+
+def action_streaming_job(job, task_id):
+    """Start Claude in action mode with streaming output"""
+    _require_workspace(task_id)
+
+    job.progress('Starting Claude')
+    started = _schedule_streaming(task_id, 'actioning')
+    return {'queued': not started}
+
+
+def _full_diff(workspace_dir):
+    git_diff = get_git_diff(workspace_dir)
+    if git_diff.startswith(DIFF_ERROR_PREFIX):
+        raise DiffError(git_diff)
+    return git_diff
+
+
+def _diff_updates(job, task):
+    """Task updates recording the workspace's current diff; empty if it has not changed"""
+    job.progress('Computing diff')
+    workspace_dir = task['workspace_dir']
+    fingerprint = workspace_fingerprint(workspace_dir)
+    ref = (task.get('artifacts') or {}).get('git_diff') or {}
+    if fingerprint and ref.get('fingerprint') == fingerprint and has_artifact_file(task, 'git_diff'):
+        return {}
+    try:
+        git_diff = cached_diff(workspace_dir, 'full', lambda: _full_diff(workspace_dir), fingerprint)
+    except DiffError as e:
+        # Recorded without a fingerprint (and not cached), so the next attempt computes it again
+        return write_artifact(task, 'git_diff', str(e))
+    updates = write_artifact(task, 'git_diff', git_diff)
+    updates['artifacts']['git_diff']['fingerprint'] = fingerprint
+    return updates
+
+
+def action_job(job, task_id):
+    """Run Claude in action mode to completion and record its output and diff"""
+    config = load_config()
+    task = _require_workspace(task_id)
+
+    skip_permissions = config.get('skip_permissions', False)
+    claude_output = _run_in_slot(job, task_id, lambda: run_claude_command(
+        task['prompt'], 'action', task['workspace_dir'], skip_permissions))
+
+    updates = {'status': 'actioned'}
+    updates.update(append_artifact(task, 'claude_output', "\n\n--- ACTION OUTPUT ---\n\n" + claude_output))
+    updates.update(_diff_updates(job, dict(task, **updates)))
+    update_task(task_id, updates)
+
+
+def followup_job(job, task_id, followup_prompt):
+    """Run a follow-up prompt and record its output and the updated diff"""
+    config = load_config()
+    task = _require_workspace(task_id)
+
+    skip_permissions = config.get('skip_permissions', False)
+    claude_output = _run_in_slot(job, task_id, lambda: run_claude_command(
+        followup_prompt, 'action', task['workspace_dir'], skip_permissions))
+
+    updates = append_artifact(task, 'claude_output', "\n\n--- FOLLOW-UP OUTPUT ---\n\n" + claude_output)
+    updates.update(_diff_updates(job, dict(task, **updates)))
+    update_task(task_id, updates)
+
+
+def diff_job(job, task_id):
+    """Recompute the task's git diff"""
+    task = _require_workspace(task_id)
+
+    updates = _diff_updates(job, task)
+    if updates:
+        update_task(task_id, updates)
+    return {'changed': bool(updates), 'size': updates['artifacts']['git_diff']['size'] if updates else None}
+
+
+def complete_streaming_job(job, task_id):
+    """Collect the final streaming output and diff and mark the task actioned"""
+    task = _require_workspace(task_id)
+
+    job.progress('Collecting output')
+    # The summary is kept up to date while the process runs, so only lines
+    # written since its last save (if any) are parsed here
+    summary = get_summary(get_output_file_path(task_id))
+    final_output = summary.text() if summary else ''
+
+    updates = {'status': 'actioned'}
+    updates.update(write_artifact(task, 'claude_output', final_output))
+    updates.update(_diff_updates(job, dict(task, **updates)))
+    update_task(task_id, updates)
+    return {'tool_calls': len(summary.tool_calls) if summary else 0}
+
+
+def restore_workspace_job(job, task_id):
+    """Recreate a workspace that was evicted to stay within the disk budget"""
+    task = _require_task(task_id)
+    if not task.get('workspace_evicted'):
+        raise JobError('Workspace was not evicted')
+
+    job.progress('Restoring workspace')
+    try:
+        workspace_manager.restore(task, load_config())
+    except subprocess.CalledProcessError as e:
+        raise JobError(f'Error restoring workspace: {e.stderr or e}')
+    update_task(task_id, {'workspace_evicted': None})
+
+
+def push_job(job, task_id):
+    """Create a branch, commit the workspace changes and push them"""
+    task = _require_workspace(task_id)
+
+    job.progress('Pushing changes')
+    started = time.monotonic()
+    success, message = create_git_branch_and_push(
+        task['workspace_dir'],
+        task['ticket'],
+        task['task']
+    )
+    PUSH_DURATION.observe(time.monotonic() - started, outcome='success' if success else 'error')
+    if not success:
+        raise JobError(message)
+
+    update_task(task_id, {'status': 'completed'})
+    return {'message': message}
@@ -0,0 +1,221 @@
+"""
+Shared in-memory task repository
+
+Keeps every task in a dict keyed by id (plus a ticket index) so route
+handlers and the SSE stream can look tasks up without reading the task store
+from disk. Writes made through the repository are applied to the store and to
+the in-memory copy at the same time. Changes made by anything else (another
+process, the migrator) are picked up by comparing the store's version token,
+which is checked at most once every "task_cache_check_interval" seconds.
+
+Tasks returned by the repository are shared with the cache and must be treated
+as read-only; use update_task() to change them.
+"""
+import time
+import threading
+
+from config import load_config
+from task_store import get_task_store
+
+DEFAULT_CHECK_INTERVAL = 1.0  # seconds between store version checks
+
+
+class TaskRepository:
+    """In-memory view of the task store with O(1) lookups by id and ticket"""
+
+    def __init__(self, store_factory=get_task_store, check_interval=None):
+        self._store_factory = store_factory
+        self._check_interval = check_interval
+        self._lock = threading.RLock()
+        self._tasks = {}
+        self._ticket_index = {}
+        self._version = None
+        self._loaded = False
+        self._last_check = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    @property
+    def store(self):
+        return self._store_factory()
+
+    def _get_check_interval(self):
+        if self._check_interval is None:
+            self._check_interval = float(load_config().get('task_cache_check_interval', DEFAULT_CHECK_INTERVAL))
+        return self._check_interval
+
+    def _reload(self):
+        store = self.store
+        version = store.version()
+        tasks = store.load_all()
+        self._tasks = {task['id']: task for task in tasks}
+        self._ticket_index = {task.get('ticket'): task['id'] for task in reversed(tasks)}
+        self._version = version
+        self._loaded = True
+        self._last_check = time.monotonic()
+        self.reloads += 1
+
+    def _ensure_fresh(self):
+        """Reload from the store if it has changed; counts the lookup as a hit or miss"""
+        now = time.monotonic()
+        if self._loaded and now - self._last_check < self._get_check_interval():
+            self.hits += 1
+            return
+        if self._loaded:
+            self._last_check = now
+            if self.store.version() == self._version:
+                self.hits += 1
+                return
+        self.misses += 1
+        self._reload()
+
+    def _apply_write(self, apply):
+        """Apply a write to the cache if nobody else changed the store in the meantime"""
+        before, after = self.store.last_write_versions()
+        if self._loaded and before == self._version:
+            apply()
+            self._version = after
+        else:
+            self._loaded = False
+
+    def _index(self, task):
+        self._tasks[task['id']] = task
+        self._ticket_index.setdefault(task.get('ticket'), task['id'])
+
+    def _unindex(self, task):
+        self._tasks.pop(task['id'], None)
+        ticket = task.get('ticket')
+        if self._ticket_index.get(ticket) == task['id']:
+            del self._ticket_index[ticket]
+            replacement = next((t for t in self._tasks.values() if t.get('ticket') == ticket), None)
+            if replacement:
+                self._ticket_index[ticket] = replacement['id']
+
+    # Reads
+
+    def all(self):
+        with self._lock:
+            self._ensure_fresh()
+            return list(self._tasks.values())
+
+    def get(self, task_id):
+        with self._lock:
+            self._ensure_fresh()
+            return self._tasks.get(task_id)
+
+    def get_status(self, task_id):
+        task = self.get(task_id)
+        return task['status'] if task else None
+
+    def find_by_ticket(self, ticket):
+        with self._lock:
+            self._ensure_fresh()
+            task_id = self._ticket_index.get(ticket)
+            return self._tasks.get(task_id) if task_id else None
+
+    def existing_tickets(self):
+        with self._lock:
+            self._ensure_fresh()
+            return set(self._ticket_index)
+
+    def version(self):
+        with self._lock:
+            self._ensure_fresh()
+            return self._version
+
+    # Writes
+
+    def update(self, task_id, updates):
+        with self._lock:
+            task = self.store.update(task_id, updates)
+            if task is not None:
+                def apply():
+                    old = self._tasks.get(task_id)
+                    if old is not None and old.get('ticket') != task.get('ticket'):
+                        self._unindex(old)
+                    self._index(task)
+                self._apply_write(apply)
+            return task
+
+    def update_many(self, updates):
+        with self._lock:
+            tasks = self.store.update_many(updates)
+            if tasks:
+                def apply():
+                    for task in tasks:
+                        old = self._tasks.get(task['id'])
+                        if old is not None and old.get('ticket') != task.get('ticket'):
+                            self._unindex(old)
+                        self._index(task)
+                self._apply_write(apply)
+            return tasks
+
+    def add_many(self, new_tasks):
+        with self._lock:
+            added = self.store.add_many(new_tasks)
+            if added:
+                self._apply_write(lambda: [self._index(task) for task in new_tasks])
+            return added
+
+    def delete(self, task_id):
+        with self._lock:
+            task = self.store.delete(task_id)
+            if task is not None:
+                self._apply_write(lambda: self._unindex(task))
+            return task
+
+    def save_all(self, tasks):
+        with self._lock:
+            self.store.save_all(tasks)
+            self._loaded = False
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = False
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': self.store.name,
+                'tasks': len(self._tasks),
+                'version': str(self._version),
+                'hits': self.hits,
+                'misses': self.misses,
+                'reloads': self.reloads,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+task_repository = TaskRepository()
+
+
+# Convenience helpers used by the Flask routes
+
+def load_tasks():
+    return task_repository.all()
+
+def get_task(task_id):
+    return task_repository.get(task_id)
+
+def get_task_status(task_id):
+    return task_repository.get_status(task_id)
+
+def update_task(task_id, updates):
+    return task_repository.update(task_id, updates)
+
+def update_tasks(updates):
+    return task_repository.update_many(updates)
+
+def find_task_by_ticket(ticket):
+    return task_repository.find_by_ticket(ticket)
+
+def add_tasks(new_tasks):
+    return task_repository.add_many(new_tasks)
+
+def remove_task(task_id):
+    return task_repository.delete(task_id)
+
+def get_existing_tickets():
+    return task_repository.existing_tickets()
@@ -0,0 +1,278 @@
+"""
+Filtered, sorted and paginated task listings
+
+The task list used to be rendered in full and filtered in the browser, which
+stops being usable with thousands of tasks. Queries are now answered here and
+served a page at a time by /api/tasks.
+
+For each version of the task repository a TaskIndex is built once: a posting
+set per status/priority/assignee/state value, the facet counts of the whole
+list, a lowercase search text per task and, on first use, each sort order.
+A query intersects the posting sets of the selected values (plus the tasks
+matching the search text) and walks the chosen sort order. Facet counts for a
+field are counted over the tasks matching every *other* filter, so the numbers
+next to each option say how many tasks selecting it would add.
+
+Archived tasks (see csv_import.py) are left out unless asked for; the
+precomputed facet counts are those of the default view without them.
+
+Pages are addressed by a cursor holding the sort key of the last row shown,
+so the next page starts right after it even if tasks were added or removed in
+between. Ordered results are kept in a small LRU so paging through a result
+costs a binary search.
+"""
+import json
+import base64
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from task_cache import task_repository
+from utils import get_priority_order
+from offload import run_blocking
+
+FACET_FIELDS = ('status', 'priority', 'assignee', 'state')
+SEARCH_FIELDS = ('ticket', 'task', 'assignee', 'state')
+ROW_FIELDS = ('id', 'ticket', 'link', 'task', 'assignee', 'priority', 'state', 'status', 'created_at',
+              'archived_at')
+STATUS_ORDER = ('new', 'queued', 'started', 'streaming', 'actioning', 'actioned', 'completed')
+DEFAULT_SORT = 'priority'
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+RESULT_CACHE_SIZE = 32
+
+
+class QueryError(Exception):
+    """Raised for an unknown sort field or a malformed cursor"""
+
+
+def _priority_key(task):
+    return get_priority_order(task.get('priority') or 'Medium')
+
+
+def _status_key(task):
+    status = task.get('status') or ''
+    return STATUS_ORDER.index(status) if status in STATUS_ORDER else len(STATUS_ORDER)
+
+
+# Sort name -> key function; every key ends with the task id so keys are unique
+SORT_KEYS = {
+    'priority': lambda task: (_priority_key(task), task.get('created_at') or '', task['id']),
+    'created': lambda task: (task.get('created_at') or '', task['id']),
+    'ticket': lambda task: ((task.get('ticket') or '').lower(), task['id']),
+    'status': lambda task: (_status_key(task), _priority_key(task), task.get('created_at') or '', task['id']),
+    'assignee': lambda task: ((task.get('assignee') or '').lower(), _priority_key(task),
+                              task.get('created_at') or '', task['id']),
+}
+
+# The type of each part of a sort's key, to check cursors against
+SORT_KEY_TYPES = {
+    'priority': (int, str, str),
+    'created': (str, str),
+    'ticket': (str, str),
+    'status': (int, int, str, str),
+    'assignee': (str, int, str, str),
+}
+
+
+def _normalize(value):
+    return (value or '').strip().lower()
+
+
+def encode_cursor(sort, key):
+    data = json.dumps({'sort': sort, 'key': list(key)}).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii')
+
+
+def decode_cursor(cursor, sort):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        key = tuple(data['key'])
+    except (ValueError, KeyError, TypeError) as e:
+        raise QueryError(f'Invalid cursor: {e}')
+    if data.get('sort') != sort:
+        raise QueryError('Cursor belongs to a different sort order')
+    # A key of the wrong shape would fail (or mis-sort) when compared with the real keys
+    types = SORT_KEY_TYPES[sort.lstrip('-')]
+    if len(key) != len(types) or any(type(part) is not expected for part, expected in zip(key, types)):
+        raise QueryError('Invalid cursor: key does not match the sort order')
+    return key
+
+
+class TaskIndex:
+    """Posting sets, facet counts and sort orders for one version of the task list"""
+
+    def __init__(self, tasks, version):
+        self.version = version
+        self.tasks = tasks
+        self.postings = {field: {} for field in FACET_FIELDS}
+        self.labels = {field: {} for field in FACET_FIELDS}
+        self.visible = set()  # tasks that are not archived
+        for position, task in enumerate(tasks):
+            if not task.get('archived_at'):
+                self.visible.add(position)
+            for field in FACET_FIELDS:
+                value = _normalize(task.get(field))
+                self.postings[field].setdefault(value, set()).add(position)
+                self.labels[field].setdefault(value, (task.get(field) or '').strip())
+        # Counts for the default view, which leaves out archived tasks
+        self.facet_counts = {field: {value: len(positions & self.visible) for value, positions in values.items()}
+                             for field, values in self.postings.items()}
+        self.search_text = ['\n'.join(str(task.get(field) or '') for field in SEARCH_FIELDS).lower()
+                            for task in tasks]
+        self._orders = {}
+        self._lock = threading.Lock()
+
+    def order(self, sort):
+        """Positions of every task in ascending sort order"""
+        with self._lock:
+            if sort not in self._orders:
+                key = SORT_KEYS[sort]
+                self._orders[sort] = sorted(range(len(self.tasks)), key=lambda position: key(self.tasks[position]))
+            return self._orders[sort]
+
+    def select(self, field, values):
+        """Positions whose field is one of values (case-insensitive)"""
+        selected = set()
+        for value in values:
+            selected |= self.postings[field].get(_normalize(value), set())
+        return selected
+
+    def search(self, text):
+        text = text.strip().lower()
+        return {position for position, haystack in enumerate(self.search_text) if text in haystack}
+
+    def facets(self, matches):
+        """Value counts per field over the tasks matching the other fields' filters.
+
+        matches maps a field (or 'q', or 'visible' to leave out archived tasks)
+        to the set of positions it allows; fields without a filter are absent.
+        Without any other filter the precomputed counts are used.
+        """
+        facets = {}
+        for field in FACET_FIELDS:
+            others = {name: positions for name, positions in matches.items() if name != field}
+            if set(others) == {'visible'}:
+                counts = self.facet_counts[field]
+            elif others:
+                allowed = set.intersection(*others.values())
+                counts = {value: len(positions & allowed) for value, positions in self.postings[field].items()}
+            else:
+                counts = {value: len(positions) for value, positions in self.postings[field].items()}
+            entries = [{'value': self.labels[field][value], 'count': count} for value, count in counts.items()]
+            if field == 'priority':
+                entries.sort(key=lambda entry: (get_priority_order(entry['value'] or 'Medium'), entry['value']))
+            elif field == 'status':
+                entries.sort(key=lambda entry: (_status_key({'status': entry['value']}), entry['value']))
+            else:
+                entries.sort(key=lambda entry: entry['value'].lower())
+            facets[field] = entries
+        return facets
+
+
+class TaskQuery:
+    """Answers task list queries from an index rebuilt whenever the tasks change"""
+
+    def __init__(self, repository=task_repository):
+        self.repository = repository
+        self._lock = threading.Lock()
+        self._index = None
+        self._results = OrderedDict()  # (version, filters, q, sort) -> (positions, keys, facets)
+        self.builds = 0
+        self.result_hits = 0
+        self.result_misses = 0
+
+    def index(self):
+        version = self.repository.version()
+        with self._lock:
+            if self._index is None or self._index.version != version:
+                self._index = run_blocking(TaskIndex, self.repository.all(), version)
+                self._results.clear()
+                self.builds += 1
+            return self._index
+
+    def _result(self, index, filters, q, sort, archived):
+        cache_key = (index.version, tuple(sorted((field, tuple(sorted(_normalize(v) for v in values)))
+                                                 for field, values in filters.items())), q, sort, archived)
+        with self._lock:
+            if cache_key in self._results:
+                self._results.move_to_end(cache_key)
+                self.result_hits += 1
+                return self._results[cache_key]
+            self.result_misses += 1
+
+        matches = {field: index.select(field, values) for field, values in filters.items()}
+        if q:
+            matches['q'] = index.search(q)
+        if not archived and len(index.visible) < len(index.tasks):
+            matches['visible'] = index.visible
+        order = index.order(sort)
+        if matches:
+            allowed = set.intersection(*matches.values())
+            positions = [position for position in order if position in allowed]
+        else:
+            positions = order
+        key = SORT_KEYS[sort]
+        result = (positions, [key(index.tasks[position]) for position in positions], index.facets(matches))
+
+        with self._lock:
+            self._results[cache_key] = result
+            while len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+        return result
+
+    def query(self, filters=None, q='', sort=DEFAULT_SORT, cursor=None, limit=DEFAULT_LIMIT, archived=False):
+        """One page of tasks matching the filters, with facet counts and the next page's cursor.
+
+        filters maps a facet field to a list of accepted values; an empty list
+        matches everything. sort may be prefixed with '-' for descending order.
+        Archived tasks are left out unless archived is set.
+        Raises QueryError for an unknown sort or a bad cursor.
+        """
+        descending = sort.startswith('-')
+        sort_name = sort.lstrip('-')
+        if sort_name not in SORT_KEYS:
+            raise QueryError(f'Unknown sort: {sort_name}')
+        filters = {field: values for field, values in (filters or {}).items()
+                   if field in FACET_FIELDS and values}
+        q = (q or '').strip().lower()
+        limit = max(1, min(int(limit), MAX_LIMIT))
+
+        index = self.index()
+        positions, keys, facets = self._result(index, filters, q, sort_name, bool(archived))
+
+        if descending:
+            end = bisect_left(keys, decode_cursor(cursor, sort)) if cursor else len(keys)
+            page = list(range(end - 1, max(end - limit, 0) - 1, -1))
+            has_more = end - limit > 0
+        else:
+            start = bisect_right(keys, decode_cursor(cursor, sort)) if cursor else 0
+            page = list(range(start, min(start + limit, len(keys))))
+            has_more = start + limit < len(keys)
+
+        tasks = [{field: index.tasks[positions[i]].get(field) for field in ROW_FIELDS} for i in page]
+        return {
+            'tasks': tasks,
+            'total': len(positions),
+            'next_cursor': encode_cursor(sort, keys[page[-1]]) if page and has_more else None,
+            'facets': facets,
+            'version': str(index.version),
+        }
+
+    def facets(self):
+        """Facet counts over every task that is not archived"""
+        index = self.index()
+        return index.facets({'visible': index.visible})
+
+    def stats(self):
+        with self._lock:
+            return {
+                'tasks': len(self._index.tasks) if self._index else 0,
+                'builds': self.builds,
+                'cached_results': len(self._results),
+                'result_hits': self.result_hits,
+                'result_misses': self.result_misses,
+            }
+
+
+task_query = TaskQuery()
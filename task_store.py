@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Task storage backends for Claude Task Manager
+
+Two interchangeable backends are provided:
+
+- JsonTaskStore: the original tasks/tasks.json file. Simple and fine for
+  small installs, but every change rewrites the whole file.
+- SqliteTaskStore: an indexed SQLite database (WAL mode) that reads and
+  updates single rows, so latency does not grow with the number of tasks.
+
+The backend is selected with the "task_store" key in config.json
+("json" or "sqlite"). An existing tasks.json can be migrated with:
+    python task_store.py migrate --activate
+"""
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+from config import TASKS_FILE, TASKS_DB, load_config, save_config
+
+# Columns that are copied out of the task dict so they can be indexed
+INDEXED_COLUMNS = ('ticket', 'status', 'priority', 'assignee', 'state', 'created_at')
+
+
+def _stamp(task):
+    """Record when a task was last modified"""
+    task['updated_at'] = datetime.now().isoformat()
+    return task
+
+
+class JsonTaskStore:
+    """Task store backed by a single JSON file"""
+
+    name = 'json'
+
+    def __init__(self, path=TASKS_FILE):
+        self.path = path
+        self._lock = threading.RLock()
+        self._local = threading.local()
+
+    def version(self):
+        """Cheap token that changes whenever the file is rewritten"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def last_write_versions(self):
+        """(version before, version after) of this thread's most recent write"""
+        return getattr(self._local, 'last_write', (None, None))
+
+    def load_all(self):
+        with self._lock:
+            if not os.path.exists(self.path):
+                return []
+            with open(self.path, 'r') as f:
+                return json.load(f)
+
+    def save_all(self, tasks):
+        with self._lock:
+            # Write to a temporary file first so readers never see a partial file
+            before = self.version()
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(tasks, f)
+            os.replace(tmp_path, self.path)
+            self._local.last_write = (before, self.version())
+
+    def get(self, task_id):
+        return next((t for t in self.load_all() if t['id'] == task_id), None)
+
+    def find_by_ticket(self, ticket):
+        return next((t for t in self.load_all() if t.get('ticket') == ticket), None)
+
+    def existing_tickets(self):
+        return {t['ticket'] for t in self.load_all()}
+
+    def count(self):
+        return len(self.load_all())
+
+    def add_many(self, new_tasks):
+        if not new_tasks:
+            return 0
+        with self._lock:
+            tasks = self.load_all()
+            tasks.extend(new_tasks)
+            self.save_all(tasks)
+        return len(new_tasks)
+
+    def update(self, task_id, updates):
+        """Apply a dict of field updates to one task and return the updated task"""
+        with self._lock:
+            tasks = self.load_all()
+            task = next((t for t in tasks if t['id'] == task_id), None)
+            if task is None:
+                return None
+            task.update(updates)
+            _stamp(task)
+            self.save_all(tasks)
+            return task
+
+    def update_many(self, updates):
+        """Apply {task_id: field updates} in one write and return the updated tasks"""
+        if not updates:
+            return []
+        with self._lock:
+            tasks = self.load_all()
+            updated = []
+            for task in tasks:
+                if task['id'] in updates:
+                    task.update(updates[task['id']])
+                    updated.append(_stamp(task))
+            if updated:
+                self.save_all(tasks)
+            return updated
+
+    def delete(self, task_id):
+        """Remove a task and return it, or None if it did not exist"""
+        with self._lock:
+            tasks = self.load_all()
+            task_index = next((i for i, t in enumerate(tasks) if t['id'] == task_id), None)
+            if task_index is None:
+                return None
+            task = tasks.pop(task_index)
+            self.save_all(tasks)
+            return task
+
+
+class SqliteTaskStore:
+    """Task store backed by an indexed SQLite database"""
+
+    name = 'sqlite'
+
+    def __init__(self, path=TASKS_DB):
+        self.path = path
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self):
+        # SQLite connections cannot be shared between threads, so keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS tasks (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                id TEXT NOT NULL,
+                ticket TEXT,
+                status TEXT,
+                priority TEXT,
+                assignee TEXT,
+                state TEXT,
+                created_at TEXT,
+                data TEXT NOT NULL
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_tasks_id ON tasks(id);
+            CREATE INDEX IF NOT EXISTS idx_tasks_ticket ON tasks(ticket);
+            CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
+            CREATE INDEX IF NOT EXISTS idx_tasks_priority ON tasks(priority);
+            CREATE INDEX IF NOT EXISTS idx_tasks_assignee ON tasks(assignee);
+            CREATE TABLE IF NOT EXISTS store_meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO store_meta (key, value) VALUES ('version', 0);
+        ''')
+
+    def version(self):
+        """Counter that is incremented by every write transaction"""
+        return self._connect().execute("SELECT value FROM store_meta WHERE key = 'version'").fetchone()[0]
+
+    def last_write_versions(self):
+        """(version before, version after) of this thread's most recent write"""
+        return getattr(self._local, 'last_write', (None, None))
+
+    def _bump_version(self, conn):
+        conn.execute("UPDATE store_meta SET value = value + 1 WHERE key = 'version'")
+        after = conn.execute("SELECT value FROM store_meta WHERE key = 'version'").fetchone()[0]
+        self._local.last_write = (after - 1, after)
+
+    @staticmethod
+    def _row_values(task):
+        return [task['id']] + [task.get(column) for column in INDEXED_COLUMNS] + [json.dumps(task)]
+
+    def _insert_many(self, conn, tasks):
+        conn.executemany(
+            f'INSERT INTO tasks (id, {", ".join(INDEXED_COLUMNS)}, data) '
+            f'VALUES (?, {", ".join("?" for _ in INDEXED_COLUMNS)}, ?)',
+            [self._row_values(task) for task in tasks]
+        )
+
+    def load_all(self):
+        rows = self._connect().execute('SELECT data FROM tasks ORDER BY seq').fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def save_all(self, tasks):
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM tasks')
+            self._insert_many(conn, tasks)
+            self._bump_version(conn)
+
+    def get(self, task_id):
+        row = self._connect().execute('SELECT data FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find_by_ticket(self, ticket):
+        row = self._connect().execute(
+            'SELECT data FROM tasks WHERE ticket = ? ORDER BY seq LIMIT 1', (ticket,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def existing_tickets(self):
+        rows = self._connect().execute('SELECT ticket FROM tasks').fetchall()
+        return {row[0] for row in rows}
+
+    def count(self):
+        return self._connect().execute('SELECT COUNT(*) FROM tasks').fetchone()[0]
+
+    def add_many(self, new_tasks):
+        if not new_tasks:
+            return 0
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            self._insert_many(conn, new_tasks)
+            self._bump_version(conn)
+        return len(new_tasks)
+
+    def update(self, task_id, updates):
+        """Apply a dict of field updates to one task and return the updated task"""
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT data FROM tasks WHERE id = ?', (task_id,)).fetchone()
+            if row is None:
+                return None
+            task = json.loads(row[0])
+            task.update(updates)
+            _stamp(task)
+            conn.execute(
+                f'UPDATE tasks SET {", ".join(f"{column} = ?" for column in INDEXED_COLUMNS)}, data = ? '
+                'WHERE id = ?',
+                self._row_values(task)[1:] + [task_id]
+            )
+            self._bump_version(conn)
+            return task
+
+    def update_many(self, updates):
+        """Apply {task_id: field updates} in one transaction and return the updated tasks"""
+        if not updates:
+            return []
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            updated = []
+            for task_id, fields in updates.items():
+                row = conn.execute('SELECT data FROM tasks WHERE id = ?', (task_id,)).fetchone()
+                if row is not None:
+                    task = json.loads(row[0])
+                    task.update(fields)
+                    updated.append(_stamp(task))
+            if updated:
+                conn.executemany(
+                    f'UPDATE tasks SET {", ".join(f"{column} = ?" for column in INDEXED_COLUMNS)}, data = ? '
+                    'WHERE id = ?',
+                    [self._row_values(task)[1:] + [task['id']] for task in updated]
+                )
+                self._bump_version(conn)
+            return updated
+
+    def delete(self, task_id):
+        """Remove a task and return it, or None if it did not exist"""
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT data FROM tasks WHERE id = ?', (task_id,)).fetchone()
+            if row is None:
+                return None
+            conn.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
+            self._bump_version(conn)
+            return json.loads(row[0])
+
+
+TASK_STORES = {
+    JsonTaskStore.name: JsonTaskStore,
+    SqliteTaskStore.name: SqliteTaskStore,
+}
+
+_active_store = None
+_active_store_lock = threading.Lock()
+
+
+def get_task_store():
+    """Return the task store selected by the "task_store" key in config.json"""
+    global _active_store
+    with _active_store_lock:
+        if _active_store is None:
+            backend = load_config().get('task_store', JsonTaskStore.name)
+            if backend not in TASK_STORES:
+                raise ValueError(f"Unknown task store '{backend}'. Expected one of: {', '.join(TASK_STORES)}")
+            _active_store = TASK_STORES[backend]()
+        return _active_store
+
+
+def reset_task_store():
+    """Forget the active store so the next call re-reads config.json"""
+    global _active_store
+    with _active_store_lock:
+        _active_store = None
+
+
+def migrate_json_to_sqlite(json_path=TASKS_FILE, db_path=TASKS_DB):
+    """Copy every task from a JSON task file into an SQLite task store"""
+    tasks = JsonTaskStore(json_path).load_all()
+    store = SqliteTaskStore(db_path)
+    if store.count():
+        raise Exception(f"SQLite task store {db_path} already contains tasks; refusing to overwrite it")
+    store.add_many(tasks)
+    return len(tasks)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Manage the Claude Task Manager task store')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    migrate_parser = subparsers.add_parser('migrate', help='Migrate tasks.json into an SQLite task store')
+    migrate_parser.add_argument('--json', default=TASKS_FILE,
+                                help=f'Source JSON task file (default: {TASKS_FILE})')
+    migrate_parser.add_argument('--db', default=TASKS_DB,
+                                help=f'Destination SQLite database (default: {TASKS_DB})')
+    migrate_parser.add_argument('--activate', action='store_true',
+                                help='Switch config.json to the SQLite store after migrating')
+
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        migrated = migrate_json_to_sqlite(args.json, args.db)
+        print(f"Migrated {migrated} tasks from {args.json} to {args.db}")
+        if args.activate:
+            config = load_config()
+            config['task_store'] = SqliteTaskStore.name
+            save_config(config)
+            print('config.json updated to use the SQLite task store')
+        else:
+            print('Set "task_store": "sqlite" in config.json to start using it')
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Test script for per-task artifact files.
+Checks that writes and appends go to files referenced from the task record,
+that tasks still carrying inline text are read and appended correctly, and
+that the migration moves inline text out of the records.
+"""
+
+import os
+import tempfile
+
+import artifact_store
+from artifact_store import (write_artifact, append_artifact, read_artifact, stream_artifact, artifact_size,
+                            has_artifact_file, migrate_inline_artifacts)
+
+
+class FakeRepository:
+    def __init__(self, tasks):
+        self.tasks = {task['id']: dict(task) for task in tasks}
+
+    def all(self):
+        return [dict(task) for task in self.tasks.values()]
+
+    def update(self, task_id, updates):
+        self.tasks[task_id].update(updates)
+
+
+def patched_outputs(temp_dir):
+    original = artifact_store.OUTPUTS_DIR
+    artifact_store.OUTPUTS_DIR = os.path.join(temp_dir, 'outputs')
+    return original
+
+
+def test_write_and_append():
+    """Artifacts live in files; the record keeps only a reference and the size"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        original = patched_outputs(temp_dir)
+        try:
+            task = {'id': 'task1'}
+            updates = write_artifact(task, 'git_diff', 'diff --git a/x b/x\n')
+            task.update(updates)
+            ref = task['artifacts']['git_diff']
+            assert task['git_diff'] == ''
+            assert ref['path'].startswith(os.path.join(temp_dir, 'outputs', 'task1'))
+            assert ref['size'] == len('diff --git a/x b/x\n')
+            assert has_artifact_file(task, 'git_diff')
+            assert read_artifact(task, 'git_diff') == 'diff --git a/x b/x\n'
+
+            task.update(write_artifact(task, 'claude_output', 'first'))
+            task.update(append_artifact(task, 'claude_output', ' second'))
+            assert read_artifact(task, 'claude_output') == 'first second'
+            assert artifact_size(task, 'claude_output') == len('first second')
+            # Both artifacts stay referenced
+            assert set(task['artifacts']) == {'git_diff', 'claude_output'}
+            assert not os.path.exists(ref['path'] + '.tmp')
+        finally:
+            artifact_store.OUTPUTS_DIR = original
+        print("✓ PASS: Artifacts are written to files")
+
+
+def test_inline_fallback():
+    """Tasks from before artifact files are read from the record and appended after their text"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        original = patched_outputs(temp_dir)
+        try:
+            task = {'id': 'old', 'claude_output': 'inline output'}
+            assert not has_artifact_file(task, 'claude_output')
+            assert read_artifact(task, 'claude_output') == 'inline output'
+            assert artifact_size(task, 'claude_output') == len('inline output')
+            assert list(stream_artifact(task, 'claude_output')) == ['inline output']
+            assert list(stream_artifact(task, 'git_diff')) == []
+            assert artifact_size(task, 'git_diff') == 0
+
+            task.update(append_artifact(task, 'claude_output', '\nmore'))
+            assert task['claude_output'] == ''
+            assert read_artifact(task, 'claude_output') == 'inline output\nmore'
+
+            # A reference to a file that is gone falls back to the inline text
+            task['artifacts']['claude_output']['path'] = os.path.join(temp_dir, 'missing.txt')
+            task['claude_output'] = 'still inline'
+            assert read_artifact(task, 'claude_output') == 'still inline'
+        finally:
+            artifact_store.OUTPUTS_DIR = original
+        print("✓ PASS: Inline text is used until it is moved out")
+
+
+def test_stream_artifact():
+    """Artifacts are streamed from disk in chunks that add up to the file"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        original = patched_outputs(temp_dir)
+        try:
+            text = ''.join(f'line {i}\n' for i in range(1000))
+            task = {'id': 'task1'}
+            task.update(write_artifact(task, 'claude_output', text))
+            chunks = list(stream_artifact(task, 'claude_output', chunk_size=1000))
+            assert len(chunks) == -(-len(text) // 1000)
+            assert all(len(chunk) == 1000 for chunk in chunks[:-1])
+            assert ''.join(chunks) == text
+        finally:
+            artifact_store.OUTPUTS_DIR = original
+        print("✓ PASS: Artifacts stream in chunks")
+
+
+def test_migrate_inline_artifacts():
+    """Migration moves inline text to files and slims the task records"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        original = patched_outputs(temp_dir)
+        try:
+            repository = FakeRepository([
+                {'id': 'both', 'claude_output': 'output text', 'git_diff': 'diff text'},
+                {'id': 'diff_only', 'git_diff': 'only a diff'},
+                {'id': 'none', 'claude_output': ''},
+            ])
+            assert migrate_inline_artifacts(repository) == 2
+
+            both = repository.tasks['both']
+            assert both['claude_output'] == '' and both['git_diff'] == ''
+            assert set(both['artifacts']) == {'claude_output', 'git_diff'}
+            assert read_artifact(both, 'claude_output') == 'output text'
+            assert read_artifact(both, 'git_diff') == 'diff text'
+            assert read_artifact(repository.tasks['diff_only'], 'git_diff') == 'only a diff'
+            assert 'artifacts' not in repository.tasks['none']
+
+            # Nothing inline is left, so a second run changes nothing
+            assert migrate_inline_artifacts(repository) == 0
+        finally:
+            artifact_store.OUTPUTS_DIR = original
+        print("✓ PASS: Inline artifacts are migrated")
+
+
+if __name__ == "__main__":
+    print("Testing artifact store...")
+    print("=" * 50)
+    test_write_and_append()
+    test_inline_fallback()
+    test_stream_artifact()
+    test_migrate_inline_artifacts()
+    print("=" * 50)
+    print("All artifact store tests passed!")
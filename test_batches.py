@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test script for batch progress reporting.
+Checks that per-task stages are kept in memory, that the job record only gets
+the stage counts at a limited rate, that the summary lists every task, that
+prompt templates keep literal braces and that a task that cannot be started is
+marked failed.
+"""
+
+import threading
+
+import batches
+from batches import BatchProgress, render_prompt, run_batch_job, validate_prompt_template
+
+
+class FakeJob:
+    id = 'batch-job'
+
+    def __init__(self):
+        self.writes = []
+
+    def progress(self, message, **fields):
+        self.writes.append((message, fields))
+
+
+def test_progress_writes_are_throttled():
+    """Stage changes within the interval do not rewrite the job record"""
+    job = FakeJob()
+    tasks = [{'id': f't{i}', 'ticket': f'T-{i}'} for i in range(100)]
+    original_interval = batches.PROGRESS_INTERVAL
+    batches.PROGRESS_INTERVAL = 60
+    try:
+        progress = BatchProgress(job, tasks)
+        for task in tasks:
+            progress.set(task['id'], 'preparing', job_id='j')
+            progress.set(task['id'], 'scheduled')
+    finally:
+        batches.PROGRESS_INTERVAL = original_interval
+
+    # Only the initial write; it carries counts, not the per-task list
+    assert len(job.writes) == 1
+    assert job.writes[0][1]['result'] == {'total': 100, 'counts': {'pending': 100}}
+
+    summary = progress.summary()
+    assert summary['counts'] == {'scheduled': 100}
+    assert len(summary['tasks']) == 100 and summary['tasks'][0]['stage'] == 'scheduled'
+    print("✓ PASS: Progress writes are throttled")
+
+
+def test_progress_publishes_counts():
+    """Without throttling each change writes the current counts"""
+    job = FakeJob()
+    original_interval = batches.PROGRESS_INTERVAL
+    batches.PROGRESS_INTERVAL = 0
+    try:
+        progress = BatchProgress(job, [{'id': 'a'}, {'id': 'b'}])
+        progress.set('a', 'failed', error='boom')
+    finally:
+        batches.PROGRESS_INTERVAL = original_interval
+    message, fields = job.writes[-1]
+    assert message == '1 of 2 tasks processed'
+    assert fields['result']['counts'] == {'pending': 1, 'failed': 1}
+    print("✓ PASS: Progress publishes counts")
+
+
+def test_render_prompt_keeps_other_braces():
+    """Only {field} names of the task are filled in; JSON and stray braces stay as written"""
+    task = {'id': 't1', 'ticket': 'ABC-1', 'task': 'Fix it', 'priority': None}
+    template = 'Ticket {ticket}: {task}. Return {"a": 1} or {0} or { or {unknown} or {priority}'
+    assert render_prompt(template, task) == \
+        'Ticket ABC-1: Fix it. Return {"a": 1} or {0} or { or {unknown} or {priority}'
+    validate_prompt_template(template)
+    try:
+        validate_prompt_template(42)
+        assert False, "A template that is not text should be rejected"
+    except ValueError:
+        pass
+    print("✓ PASS: Prompt templates keep literal braces")
+
+
+def test_failed_start_marks_task_failed():
+    """An error while starting one task marks it failed; the rest of the batch goes on"""
+    def get_task(task_id):
+        # Fails once the task is being started, on one of the batch's worker threads
+        if task_id == 'broken' and threading.current_thread().name.startswith('batch'):
+            raise RuntimeError('store unavailable')
+        return None
+
+    original_get_task = batches.get_task
+    batches.get_task = get_task
+    try:
+        summary = run_batch_job(FakeJob(), ['missing', 'broken'], 'Work on {ticket}')
+    finally:
+        batches.get_task = original_get_task
+    stages = {item['task_id']: (item['stage'], item['error']) for item in summary['tasks']}
+    assert stages['missing'] == ('skipped', 'Task not found')
+    assert stages['broken'] == ('failed', 'store unavailable')
+    assert summary['counts'] == {'skipped': 1, 'failed': 1}
+    print("✓ PASS: Failed starts are reported")
+
+
+if __name__ == "__main__":
+    print("Testing batch progress...")
+    print("=" * 50)
+    test_progress_writes_are_throttled()
+    test_progress_publishes_counts()
+    test_render_prompt_keeps_other_braces()
+    test_failed_start_marks_task_failed()
+    print("=" * 50)
+    print("All batch tests passed!")
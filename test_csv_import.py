@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Test script for the streaming CSV import.
+Checks that headers are matched case-insensitively, that tasks are inserted
+in chunks with progress reported after each one, that duplicates, other
+assignees and incomplete rows are skipped, and that an upsert re-import only
+touches changed tickets.
+"""
+
+import os
+import tempfile
+
+import csv_import
+from csv_import import import_csv, resolve_columns
+from jobs import JobError
+
+
+def write_csv(directory, text):
+    path = os.path.join(directory, 'tasks.csv')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return path
+
+
+class FakeTasks:
+    """Stands in for the task repository functions used by the import"""
+
+    def __init__(self, tasks=()):
+        self.tasks = {task['id']: task for task in tasks}
+        self.inserted = []
+        self.updated = []
+
+    def add(self, tasks):
+        self.inserted.append(list(tasks))
+        self.tasks.update({task['id']: task for task in tasks})
+
+    def update_many(self, updates):
+        self.updated.append(dict(updates))
+        for task_id, fields in updates.items():
+            self.tasks[task_id].update(fields)
+        return [self.tasks[task_id] for task_id in updates]
+
+    def find_by_ticket(self, ticket):
+        return next((task for task in self.tasks.values() if task['ticket'] == ticket), None)
+
+    def tickets(self):
+        return {task['ticket'] for task in self.tasks.values()}
+
+
+def run_import(path, config, tasks=None, **options):
+    tasks = tasks or FakeTasks()
+    progress = []
+    names = ('add_tasks', 'update_tasks', 'find_task_by_ticket', 'get_existing_tickets', 'load_tasks')
+    originals = {name: getattr(csv_import, name) for name in names}
+    csv_import.add_tasks = tasks.add
+    csv_import.update_tasks = tasks.update_many
+    csv_import.find_task_by_ticket = tasks.find_by_ticket
+    csv_import.get_existing_tickets = tasks.tickets
+    csv_import.load_tasks = lambda: list(tasks.tasks.values())
+    try:
+        stats = import_csv(path, config, on_progress=lambda s: progress.append(s.to_dict()), **options)
+    finally:
+        for name, original in originals.items():
+            setattr(csv_import, name, original)
+    return stats, tasks.inserted, progress
+
+
+def test_resolve_columns():
+    """Columns are found by exact name first, then regardless of case"""
+    columns = resolve_columns(['TICKET', ' Task ', 'Assign', 'link', 'Other'])
+    assert columns == {'ticket': 0, 'task': 1, 'link': 3, 'priority': None, 'assignee': 2, 'state': None}
+    print("✓ PASS: Header mapping")
+
+
+def test_chunked_import():
+    """Rows are inserted in chunks; duplicates, other assignees and bad rows are counted"""
+    rows = ['Ticket,Task,Assign,Priority,State,Link']
+    for i in range(7):
+        rows.append(f'T-{i},"Task, number {i}",alice,High,,http://example.com/{i}')
+    rows.append('T-0,Duplicate in the file,alice,Low,Open,')
+    rows.append('OLD-1,Already imported,alice,Low,Open,')
+    rows.append('T-9,Someone else,bob,Low,Open,')
+    rows.append(',No ticket,alice,Low,Open,')
+    rows.append('T-10,,alice')
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = write_csv(temp_dir, '\n'.join(rows) + '\n')
+        existing = FakeTasks([{'id': 'old', 'ticket': 'OLD-1', 'task': 'Already imported'}])
+        stats, inserted, progress = run_import(
+            path, {'assignees': ['alice'], 'csv_import_batch_size': 3}, existing)
+
+    assert [len(chunk) for chunk in inserted] == [3, 3, 1]
+    assert stats.rows == 12 and stats.added == 7
+    assert stats.duplicates == 2 and stats.skipped == 1 and stats.errors == 2
+    assert stats.error_rows == ['Line 12: missing ticket', 'Line 13: missing task name']
+
+    task = inserted[0][0]
+    assert task['ticket'] == 'T-0' and task['task'] == 'Task, number 0'
+    assert task['priority'] == 'High' and task['state'] == 'Ready'
+    assert task['link'] == 'http://example.com/0' and task['status'] == 'new'
+
+    assert len(progress) == 3
+    assert progress[-1]['added'] == 7
+    assert stats.bytes_read == stats.total_bytes
+    print("✓ PASS: Chunked import")
+
+
+def test_upsert():
+    """A re-import updates only changed rows and archives tickets missing from it"""
+    first = 'Ticket,Task,Assign,Priority,State\n' + ''.join(f'T-{i},Task {i},alice,Low,Open\n' for i in range(6))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        tasks = FakeTasks()
+        run_import(write_csv(temp_dir, first), {}, tasks)
+        assert len(tasks.tasks) == 6
+        by_ticket = {task['ticket']: task for task in tasks.tasks.values()}
+        by_ticket['T-1']['status'] = 'completed'
+        by_ticket['T-4']['status'] = 'streaming'
+        # Imported before hashes were stored: the hash is worked out from the task's fields
+        del by_ticket['T-2']['source_hash']
+
+        # T-0 changes priority, T-1 changes state, T-4 and T-5 are gone, T-6 is new
+        second = ('Ticket,Task,Assign,Priority,State\n'
+                  'T-0,Task 0,alice,High,Open\nT-1,Task 1,alice,Low,Done\n'
+                  'T-2,Task 2,alice,Low,Open\nT-3,Task 3,alice,Low,Open\nT-6,Task 6,alice,Low,Open\n')
+        tasks.updated = []
+        stats, inserted, _ = run_import(write_csv(temp_dir, second), {}, tasks, upsert=True, archive=True)
+
+        assert (stats.added, stats.updated, stats.unchanged, stats.removed) == (1, 2, 2, 2)
+        assert by_ticket['T-0']['priority'] == 'High'
+        assert by_ticket['T-1']['state'] == 'Done' and by_ticket['T-1']['status'] == 'completed'
+        assert set(tasks.updated[0]) == {by_ticket['T-0']['id'], by_ticket['T-1']['id']}
+
+        # The running task is counted as removed but left alone
+        assert stats.archived == 1
+        assert by_ticket['T-5']['archived_at'] and not by_ticket['T-4'].get('archived_at')
+
+        # An archived ticket that comes back is unarchived
+        third = 'Ticket,Task,Assign,Priority,State\nT-5,Task 5,alice,Low,Open\n'
+        stats, _, _ = run_import(write_csv(temp_dir, third), {}, tasks, upsert=True)
+        assert stats.updated == 1 and by_ticket['T-5']['archived_at'] is None
+        assert stats.removed == 6
+    print("✓ PASS: Upsert import")
+
+
+def test_skipped_rows_not_archived():
+    """Tickets still in the file are kept even when their row is skipped"""
+    first = 'Ticket,Task,Assign\n' + ''.join(f'T-{i},Task {i},alice\n' for i in range(4))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        tasks = FakeTasks()
+        run_import(write_csv(temp_dir, first), {}, tasks)
+        by_ticket = {task['ticket']: task for task in tasks.tasks.values()}
+
+        # T-1 has lost its task name, T-2 now belongs to someone else, T-3 is gone
+        second = 'Ticket,Task,Assign\nT-0,Task 0,alice\nT-1,,alice\nT-2,Task 2,bob\n'
+        stats, _, _ = run_import(write_csv(temp_dir, second), {'assignees': ['alice']}, tasks,
+                                 upsert=True, archive=True)
+
+        assert stats.errors == 1 and stats.skipped == 1
+        assert stats.removed == 1 and stats.archived == 1
+        assert by_ticket['T-3']['archived_at']
+        assert not any(by_ticket[ticket].get('archived_at') for ticket in ('T-0', 'T-1', 'T-2'))
+    print("✓ PASS: Skipped rows are not archived")
+
+
+def test_missing_column():
+    """A file without a ticket column fails before anything is inserted"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = write_csv(temp_dir, 'Summary,Task\nx,y\n')
+        try:
+            run_import(path, {})
+            assert False, "Import should fail without a Ticket column"
+        except JobError as e:
+            assert 'Ticket' in str(e)
+    print("✓ PASS: Missing columns are reported")
+
+
+if __name__ == "__main__":
+    print("Testing CSV import...")
+    print("=" * 50)
+    test_resolve_columns()
+    test_chunked_import()
+    test_upsert()
+    test_skipped_rows_not_archived()
+    test_missing_column()
+    print("=" * 50)
+    print("All CSV import tests passed!")
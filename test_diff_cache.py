@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Test script for the diff result cache.
+Checks that the workspace fingerprint follows edits without touching the
+index, and that cached results are bounded and survive a restart.
+"""
+
+import os
+import tempfile
+import subprocess
+
+import diff_cache
+from diff_cache import DiffCache, workspace_fingerprint
+
+
+def test_fingerprint():
+    """The fingerprint changes with edits and new files, and only then"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        subprocess.run(['git', 'init', '-q', temp_dir], check=True)
+        with open(os.path.join(temp_dir, 'a.txt'), 'w') as f:
+            f.write('one\n')
+        subprocess.run('git add . && git -c user.email=test@example.com -c user.name=test commit -qm init',
+                       shell=True, check=True, cwd=temp_dir)
+
+        clean = workspace_fingerprint(temp_dir)
+        assert clean == workspace_fingerprint(temp_dir)
+
+        with open(os.path.join(temp_dir, 'a.txt'), 'w') as f:
+            f.write('two\n')
+        edited = workspace_fingerprint(temp_dir)
+        assert edited != clean
+
+        with open(os.path.join(temp_dir, 'b.txt'), 'w') as f:
+            f.write('new\n')
+        assert workspace_fingerprint(temp_dir) != edited
+
+        # The real index is left alone: b.txt is still untracked
+        status = subprocess.run(['git', 'status', '--porcelain'], cwd=temp_dir,
+                                stdout=subprocess.PIPE, text=True).stdout
+        assert '?? b.txt' in status
+
+        assert workspace_fingerprint(os.path.join(temp_dir, 'missing')) is None
+        print("✓ PASS: Fingerprint follows the workspace state")
+
+
+def age(root, seconds=60):
+    """Backdate everything under root, as if it had not been touched for a while"""
+    when = os.path.getmtime(root) - seconds
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if name != '.git']
+        for name in filenames + dirnames:
+            os.utime(os.path.join(dirpath, name), (when, when))
+
+
+def test_fingerprint_reuses_tree_while_unchanged():
+    """The worktree tree is only rebuilt when the workspace's stat data changes"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        subprocess.run(['git', 'init', '-q', temp_dir], check=True)
+        with open(os.path.join(temp_dir, 'a.txt'), 'w') as f:
+            f.write('one\n')
+        subprocess.run('git add . && git -c user.email=test@example.com -c user.name=test commit -qm init',
+                       shell=True, check=True, cwd=temp_dir)
+        age(temp_dir)
+
+        calls = []
+        original = diff_cache.worktree_tree
+        diff_cache.worktree_tree = lambda path: calls.append(path) or original(path)
+        try:
+            clean = workspace_fingerprint(temp_dir)
+            assert workspace_fingerprint(temp_dir) == clean
+            assert len(calls) == 1
+
+            # A fresh edit is never trusted to the stat data
+            with open(os.path.join(temp_dir, 'a.txt'), 'w') as f:
+                f.write('two\n')
+            edited = workspace_fingerprint(temp_dir)
+            assert edited != clean and workspace_fingerprint(temp_dir) == edited
+            assert len(calls) == 3
+
+            age(temp_dir)
+            assert workspace_fingerprint(temp_dir) == edited
+            assert workspace_fingerprint(temp_dir) == edited
+            assert len(calls) == 4
+
+            # A new file changes the stat data even once it is old
+            with open(os.path.join(temp_dir, 'b.txt'), 'w') as f:
+                f.write('new\n')
+            age(temp_dir, 120)
+            assert workspace_fingerprint(temp_dir) != edited
+            assert len(calls) == 5
+        finally:
+            diff_cache.worktree_tree = original
+        print("✓ PASS: Worktree tree is reused while the workspace is unchanged")
+
+
+def test_lru_and_persistence():
+    """Least recently used entries are evicted and the rest reload after a restart"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        original = diff_cache.load_config
+        diff_cache.load_config = lambda: {'diff_cache_entries': 2}
+        try:
+            cache = DiffCache(temp_dir)
+            cache.put('a', 'diff a')
+            cache.put('b', ['file b'])
+            assert cache.get('a') == 'diff a'  # a is now the most recent
+            cache.put('c', {'lines': ['c']})
+
+            assert cache.get('b') is None
+            assert cache.stats()['evictions'] == 1
+            assert len(os.listdir(temp_dir)) == 2
+
+            restarted = DiffCache(temp_dir)
+            assert restarted.get('a') == 'diff a'
+            assert restarted.get('c') == {'lines': ['c']}
+            assert restarted.stats()['hits'] == 2
+        finally:
+            diff_cache.load_config = original
+        print("✓ PASS: Cache is bounded and persisted")
+
+
+if __name__ == "__main__":
+    print("Testing diff cache...")
+    print("=" * 50)
+    test_fingerprint()
+    test_fingerprint_reuses_tree_while_unchanged()
+    test_lru_and_persistence()
+    print("=" * 50)
+    print("All diff cache tests passed!")
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test script for the paginated diff service.
+Checks the numstat file list (including untracked files), paging through a
+large file's diff, and that only changed files can be requested.
+"""
+
+import os
+import tempfile
+import subprocess
+
+from diff_service import DiffError, list_diff_files, paginate_files, get_file_diff
+from git_utils import get_git_diff
+
+
+def make_workspace(temp_dir):
+    subprocess.run(['git', 'init', '-q', temp_dir], check=True)
+    with open(os.path.join(temp_dir, 'big.txt'), 'w') as f:
+        f.write(''.join(f'line {i}\n' for i in range(1000)))
+    with open(os.path.join(temp_dir, 'small.txt'), 'w') as f:
+        f.write('unchanged\n')
+    subprocess.run('git add . && git -c user.email=test@example.com -c user.name=test commit -qm init',
+                   shell=True, check=True, cwd=temp_dir)
+
+    with open(os.path.join(temp_dir, 'big.txt'), 'w') as f:
+        f.write(''.join(f'changed {i}\n' for i in range(1000)))
+    with open(os.path.join(temp_dir, 'new.txt'), 'w') as f:
+        f.write('one\ntwo\nthree')
+    with open(os.path.join(temp_dir, 'image.bin'), 'wb') as f:
+        f.write(b'\x00\x01\x02')
+
+
+def test_file_list():
+    """Tracked changes and untracked files are listed with line counts"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        make_workspace(temp_dir)
+        files = {f['path']: f for f in list_diff_files(temp_dir)}
+
+        assert set(files) == {'big.txt', 'new.txt', 'image.bin'}
+        assert (files['big.txt']['added'], files['big.txt']['deleted']) == (1000, 1000)
+        assert files['new.txt'] == {'path': 'new.txt', 'added': 3, 'deleted': 0, 'binary': False, 'untracked': True}
+        assert files['image.bin']['binary']
+
+        page = paginate_files(list_diff_files(temp_dir), page=2, per_page=2)
+        assert page['pages'] == 2 and len(page['files']) == 1
+        assert page['total_files'] == 3 and page['added'] == 1003
+
+        # The full diff artifact now includes untracked files too
+        assert '+++ b/new.txt' in get_git_diff(temp_dir)
+        print("✓ PASS: Changed files are listed with numstat counts")
+
+
+def test_file_pages():
+    """A file's diff is served a page of lines at a time"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        make_workspace(temp_dir)
+
+        first = get_file_diff(temp_dir, 'big.txt', offset=0, limit=100)
+        assert len(first['lines']) == 100
+        assert first['lines'][0].startswith('diff --git')
+        assert first['next_offset'] == 100
+
+        lines = list(first['lines'])
+        offset = first['next_offset']
+        while offset is not None:
+            page = get_file_diff(temp_dir, 'big.txt', offset=offset, limit=500)
+            lines.extend(page['lines'])
+            offset = page['next_offset']
+        assert len([line for line in lines if line.startswith('+changed')]) == 1000
+
+        new_file = get_file_diff(temp_dir, 'new.txt')
+        assert '+three' in new_file['lines'] and new_file['next_offset'] is None
+
+        for path in ('small.txt', '../outside.txt', 'missing.txt'):
+            try:
+                get_file_diff(temp_dir, path)
+                assert False, f'{path} should be rejected'
+            except DiffError:
+                pass
+        print("✓ PASS: File diffs are paginated")
+
+
+if __name__ == "__main__":
+    print("Testing diff service...")
+    print("=" * 50)
+    test_file_list()
+    test_file_pages()
+    print("=" * 50)
+    print("All diff service tests passed!")
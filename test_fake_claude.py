@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Test script for the Claude CLI simulator (fake_claude.py).
+Runs it the way claude_cli.py does and checks that the stream-json output
+parses, that workspace files are edited, and that failures and hangs behave
+like a broken Claude process.
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import subprocess
+
+from claude_cli import get_claude_command, SIMULATOR_PATH
+
+
+def run_simulator(args, cwd, timeout=30, stdin=None):
+    return subprocess.run([sys.executable, SIMULATOR_PATH] + args, cwd=cwd, input=stdin,
+                          capture_output=True, text=True, timeout=timeout)
+
+
+def test_stream_json_session():
+    """Every line is a JSON event; the session starts with init and ends with a success result"""
+    workspace = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(workspace, 'app.py'), 'w') as f:
+            f.write('print("hello")\n')
+        result = run_simulator(['-p', 'Fix the bug', '--output-format', 'stream-json', '--sim-events', '20',
+                                '--sim-rate', '0', '--sim-event-size', '100', '--sim-edit-files', '2',
+                                '--sim-seed', '1'], workspace)
+        assert result.returncode == 0, result.stderr
+        events = [json.loads(line) for line in result.stdout.splitlines()]
+        assert events[0]['type'] == 'system' and events[0]['subtype'] == 'init'
+        assert events[-1]['type'] == 'result' and events[-1]['subtype'] == 'success'
+        assert 'Fix the bug' in events[-1]['result']
+        tool_uses = [block for event in events if event['type'] == 'assistant'
+                     for block in event['message']['content'] if block['type'] == 'tool_use']
+        assert sum(1 for block in tool_uses if block['name'] == 'Edit') == 2
+
+        # The existing file was edited and one new file was created
+        with open(os.path.join(workspace, 'app.py')) as f:
+            assert len(f.read().splitlines()) > 1
+        assert os.path.exists(os.path.join(workspace, 'simulated_change_0.txt'))
+        print("✓ PASS: Stream-json session")
+    finally:
+        shutil.rmtree(workspace)
+
+
+def test_failure_and_hang():
+    """A failing run ends with an error result and exit code 1; a hanging run never finishes"""
+    workspace = tempfile.mkdtemp()
+    try:
+        result = run_simulator(['-p', 'task', '--output-format', 'stream-json', '--sim-rate', '0',
+                                '--sim-edit-files', '0', '--sim-failure-rate', '1'], workspace)
+        assert result.returncode == 1
+        last = json.loads(result.stdout.splitlines()[-1])
+        assert last['is_error'] and last['subtype'] == 'error_during_execution'
+        assert 'simulated' in result.stderr
+
+        try:
+            run_simulator(['-p', 'task', '--output-format', 'stream-json', '--sim-rate', '0',
+                           '--sim-edit-files', '0', '--sim-hang-rate', '1'], workspace, timeout=2)
+            assert False, "A hanging run should not exit on its own"
+        except subprocess.TimeoutExpired:
+            pass
+        print("✓ PASS: Failures and hangs")
+    finally:
+        shutil.rmtree(workspace)
+
+
+def test_plan_mode():
+    """plan/act read the prompt from stdin and answer in plain text"""
+    workspace = tempfile.mkdtemp()
+    try:
+        result = run_simulator(['plan', '--dangerously-skip-permissions', '--sim-rate', '0'], workspace,
+                               stdin='Add a login page')
+        assert result.returncode == 0
+        assert 'Add a login page' in result.stdout
+        print("✓ PASS: Plan mode")
+    finally:
+        shutil.rmtree(workspace)
+
+
+def test_claude_command():
+    """The real CLI by default; the simulator with the configured options when enabled"""
+    assert get_claude_command({}) == 'claude'
+    command = get_claude_command({'claude_simulator': True, 'simulator_rate': 50, 'simulator_failure_rate': 0.1})
+    assert 'fake_claude.py' in command
+    assert '--sim-rate 50' in command and '--sim-failure-rate 0.1' in command
+    assert '--sim-hang-rate' not in command
+    print("✓ PASS: Claude command")
+
+
+if __name__ == "__main__":
+    print("Testing Claude simulator...")
+    print("=" * 50)
+    test_stream_json_session()
+    test_failure_and_hang()
+    test_plan_mode()
+    test_claude_command()
+    print("=" * 50)
+    print("All simulator tests passed!")
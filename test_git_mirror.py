@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test script for the repository mirror cache.
+Uses a local bare repository as the remote. Checks that the mirror is created
+on first use and only fetched again once it is stale, and that workspaces are
+--shared clones borrowing the mirror's objects with origin pointing at the
+real remote.
+"""
+
+import os
+import tempfile
+import subprocess
+
+import git_mirror
+from git_mirror import update_mirror, clone_from_mirror, prepare_workspace, get_mirror_dir, get_mirror_status
+
+IDENTITY = ['-c', 'user.email=test@example.com', '-c', 'user.name=test']
+
+
+def git(cwd, *args):
+    return subprocess.run(['git', *IDENTITY, *args], cwd=cwd, check=True,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True).stdout.strip()
+
+
+def make_bare_repo(temp_dir):
+    """A bare repository with one commit, standing in for the remote; returns (url, work clone)"""
+    remote = os.path.join(temp_dir, 'remote.git')
+    work = os.path.join(temp_dir, 'work')
+    subprocess.run(['git', 'init', '-q', '--bare', remote], check=True)
+    subprocess.run(['git', 'clone', '-q', remote, work], check=True, stderr=subprocess.PIPE)
+    commit_file(work, 'a.txt', 'one\n')
+    return remote, work
+
+
+def commit_file(work, name, text):
+    """Commit a file in the work clone and push it to the remote; returns the commit id"""
+    with open(os.path.join(work, name), 'w') as f:
+        f.write(text)
+    git(work, 'add', name)
+    git(work, 'commit', '-qm', f'add {name}')
+    git(work, 'push', '-q', 'origin', 'HEAD')
+    return git(work, 'rev-parse', 'HEAD')
+
+
+def patched_mirrors(temp_dir):
+    original = git_mirror.MIRRORS_DIR
+    git_mirror.MIRRORS_DIR = os.path.join(temp_dir, 'mirrors')
+    return original
+
+
+def test_update_mirror():
+    """The first use clones a bare mirror; later fetches wait for the interval unless forced"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        remote, work = make_bare_repo(temp_dir)
+        first = git(work, 'rev-parse', 'HEAD')
+        original = patched_mirrors(temp_dir)
+        try:
+            mirror_dir = update_mirror(remote)
+            assert mirror_dir == get_mirror_dir(remote)
+            assert mirror_dir.startswith(os.path.join(temp_dir, 'mirrors'))
+            assert git(mirror_dir, 'rev-parse', 'HEAD') == first
+            assert git(mirror_dir, 'config', 'gc.pruneExpire') == 'never'
+            status = get_mirror_status(remote)
+            assert status['exists'] and status['last_fetch_at'] and status['fetch_age_seconds'] == 0
+
+            second = commit_file(work, 'b.txt', 'two\n')
+            # Fetched moments ago: not fetched again yet
+            update_mirror(remote)
+            assert git(mirror_dir, 'rev-parse', 'HEAD') == first
+            update_mirror(remote, fetch_interval=0)
+            assert git(mirror_dir, 'rev-parse', 'HEAD') == second
+
+            third = commit_file(work, 'c.txt', 'three\n')
+            update_mirror(remote, force=True)
+            assert git(mirror_dir, 'rev-parse', 'HEAD') == third
+        finally:
+            git_mirror.MIRRORS_DIR = original
+        print("✓ PASS: Mirror is created once and refreshed when stale")
+
+
+def test_clone_from_mirror():
+    """Workspaces borrow the mirror's objects and push to the real remote"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        remote, work = make_bare_repo(temp_dir)
+        head = git(work, 'rev-parse', 'HEAD')
+        original = patched_mirrors(temp_dir)
+        try:
+            workspace = os.path.join(temp_dir, 'workspace')
+            clone_from_mirror(remote, workspace)
+            mirror_dir = get_mirror_dir(remote)
+
+            assert git(workspace, 'rev-parse', 'HEAD') == head
+            assert git(workspace, 'remote', 'get-url', 'origin') == remote
+            with open(os.path.join(workspace, '.git', 'objects', 'info', 'alternates')) as f:
+                alternates = f.read().strip()
+            assert os.path.samefile(alternates, os.path.join(mirror_dir, 'objects'))
+            # No objects of its own: everything comes from the mirror
+            counts = dict(line.split(': ') for line in git(workspace, 'count-objects', '-v').splitlines())
+            assert counts['count'] == '0' and counts['in-pack'] == '0'
+            assert get_mirror_status(remote)['workspaces_created'] == 1
+
+            # A commit made in the workspace is pushed to the remote, not the mirror
+            head = commit_file(workspace, 'd.txt', 'four\n')
+            assert git(remote, 'rev-parse', 'HEAD') == head
+        finally:
+            git_mirror.MIRRORS_DIR = original
+        print("✓ PASS: Workspaces are shared clones of the mirror")
+
+
+def test_prepare_workspace():
+    """prepare_workspace replaces an old checkout, with or without the mirror"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        remote, work = make_bare_repo(temp_dir)
+        original = patched_mirrors(temp_dir)
+        try:
+            workspace = os.path.join(temp_dir, 'workspace')
+            os.makedirs(workspace)
+            with open(os.path.join(workspace, 'stale.txt'), 'w') as f:
+                f.write('left over\n')
+
+            prepare_workspace({'github_repo': remote}, workspace)
+            assert not os.path.exists(os.path.join(workspace, 'stale.txt'))
+            assert os.path.exists(os.path.join(workspace, 'a.txt'))
+            assert os.path.exists(os.path.join(workspace, '.git', 'objects', 'info', 'alternates'))
+
+            prepare_workspace({'github_repo': remote, 'use_mirror': False}, workspace)
+            assert os.path.exists(os.path.join(workspace, 'a.txt'))
+            assert not os.path.exists(os.path.join(workspace, '.git', 'objects', 'info', 'alternates'))
+            assert git(workspace, 'remote', 'get-url', 'origin') == remote
+        finally:
+            git_mirror.MIRRORS_DIR = original
+        print("✓ PASS: Workspaces are prepared from the mirror or a plain clone")
+
+
+if __name__ == "__main__":
+    print("Testing git mirror...")
+    print("=" * 50)
+    test_update_mirror()
+    test_clone_from_mirror()
+    test_prepare_workspace()
+    print("=" * 50)
+    print("All git mirror tests passed!")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Test script for the background job queue.
+Checks that only finished job files past the retention period are pruned and
+that one task's lock serialises submissions.
+"""
+
+import os
+import json
+import time
+import tempfile
+import threading
+
+import jobs
+from jobs import JobQueue, task_lock
+
+
+def write_job(directory, job_id, status, age_days):
+    path = os.path.join(directory, f'{job_id}.json')
+    with open(path, 'w') as f:
+        json.dump({'id': job_id, 'status': status}, f)
+    stamp = time.time() - age_days * 86400
+    os.utime(path, (stamp, stamp))
+
+
+def test_prune_finished_jobs():
+    """Old finished jobs are removed; recent and still active ones are kept"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        original_dir = jobs.JOBS_DIR
+        jobs.JOBS_DIR = temp_dir
+        try:
+            write_job(temp_dir, 'old-done', 'succeeded', 10)
+            write_job(temp_dir, 'old-failed', 'failed', 10)
+            write_job(temp_dir, 'old-running', 'running', 10)
+            write_job(temp_dir, 'recent', 'succeeded', 1)
+            assert JobQueue().prune(max_age_days=7) == 2
+            assert sorted(os.listdir(temp_dir)) == ['old-running.json', 'recent.json']
+            assert JobQueue().prune(max_age_days=0) == 0
+        finally:
+            jobs.JOBS_DIR = original_dir
+    print("✓ PASS: Finished jobs are pruned")
+
+
+def test_task_lock():
+    """The same lock is returned for a task, so a second submitter waits"""
+    assert task_lock('task-a') is task_lock('task-a')
+    assert task_lock('task-a') is not task_lock('task-b')
+
+    order = []
+
+    def second():
+        with task_lock('task-a'):
+            order.append('second')
+
+    with task_lock('task-a'):
+        thread = threading.Thread(target=second)
+        thread.start()
+        thread.join(0.1)
+        order.append('first')
+    thread.join(1)
+    assert order == ['first', 'second']
+    print("✓ PASS: Task locks serialise work on a task")
+
+
+if __name__ == "__main__":
+    print("Testing job queue...")
+    print("=" * 50)
+    test_prune_finished_jobs()
+    test_task_lock()
+    print("=" * 50)
+    print("All job queue tests passed!")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test script for output log compression and retention.
+Checks that finished logs are compressed and expired by age and that
+compressed logs can still be streamed and resumed by offset.
+"""
+
+import os
+import json
+import time
+import tempfile
+
+import log_retention
+import stream_broker
+from log_retention import LogRetention, log_size, open_log
+from stream_broker import StreamBroker
+
+
+def write_log(task_dir, lines, age_hours):
+    os.makedirs(task_dir, exist_ok=True)
+    path = os.path.join(task_dir, 'claude_output.jsonl')
+    with open(path, 'w') as f:
+        for line in lines:
+            f.write(json.dumps(line) + '\n')
+    mtime = time.time() - age_hours * 3600
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_sweep_tiers():
+    """Old logs of inactive tasks are compressed, expired ones deleted, running ones left alone"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        lines = [{'text': f'line {i}'} for i in range(500)]
+        fresh = write_log(os.path.join(temp_dir, 'fresh'), lines, 0)
+        old = write_log(os.path.join(temp_dir, 'old'), lines, 5)
+        running = write_log(os.path.join(temp_dir, 'running'), lines, 5)
+        expired = write_log(os.path.join(temp_dir, 'expired'), lines, 24 * 40)
+        original_size = os.path.getsize(old)
+
+        originals = (log_retention.load_config, log_retention.get_task_status)
+        log_retention.load_config = lambda: {'log_compress_after_hours': 1, 'log_delete_after_days': 30}
+        log_retention.get_task_status = lambda task_id: 'streaming' if task_id == 'running' else 'actioned'
+        try:
+            retention = LogRetention(temp_dir)
+            retention.sweep()
+        finally:
+            log_retention.load_config, log_retention.get_task_status = originals
+
+        assert os.path.exists(fresh)
+        assert os.path.exists(running)
+        assert not os.path.exists(old) and os.path.exists(old + '.gz')
+        assert not os.path.exists(expired) and not os.path.exists(expired + '.gz')
+        assert retention.stats()['compressed'] == 1
+        assert retention.stats()['deleted'] == 1
+        assert retention.stats()['bytes_saved'] > 0
+
+        # Compressed logs read back transparently
+        assert log_size(old) == original_size
+        with open_log(old) as f:
+            assert json.loads(f.readline()) == {'text': 'line 0'}
+        print("✓ PASS: Logs move through the retention tiers")
+
+
+def test_stream_compressed_log():
+    """A compressed log is replayed and resumed at uncompressed offsets"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = write_log(temp_dir, [{'text': 'one'}, {'text': 'two'}, {'text': 'three'}], 5)
+        log_retention.compress_log(path)
+
+        originals = (stream_broker.get_output_file_path, stream_broker.get_task_status)
+        stream_broker.get_output_file_path = lambda task_id: path
+        stream_broker.get_task_status = lambda task_id: 'actioned'
+        try:
+            broker = StreamBroker()
+            events = [event for event in broker.subscribe('task').events(timeout=5) if event]
+            assert [event_id for _, _, event_id in events if event_id is not None] == [16, 32, 50]
+            assert events[-1][0] == 'end'
+
+            resumed = [event for event in broker.subscribe('task', from_offset=16).events(timeout=5) if event]
+            assert [json.loads(data)['text'] for event_type, data, _ in resumed if event_type == 'message'] == ['two', 'three']
+            print("✓ PASS: Compressed logs can still be streamed")
+        finally:
+            stream_broker.get_output_file_path, stream_broker.get_task_status = originals
+
+
+if __name__ == "__main__":
+    print("Testing log retention...")
+    print("=" * 50)
+    test_sweep_tiers()
+    test_stream_compressed_log()
+    print("=" * 50)
+    print("All log retention tests passed!")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Test script for the Prometheus metrics.
+Checks the text format of histograms and gauges, that bucket counts are
+cumulative, and that a failing gauge does not break the rest of the output.
+"""
+
+from metrics import Registry, process_outcome
+
+
+def test_histogram_format():
+    """Buckets are cumulative and end with +Inf; sum and count follow"""
+    registry = Registry()
+    histogram = registry.histogram('job_seconds', 'How long jobs take', ('kind',), buckets=(1, 5))
+    histogram.observe(0.5, kind='diff')
+    histogram.observe(3, kind='diff')
+    histogram.observe(10, kind='diff')
+    histogram.observe(2, kind='say "hi"')
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ['# HELP job_seconds How long jobs take', '# TYPE job_seconds histogram']
+    assert 'job_seconds_bucket{kind="diff",le="1"} 1' in lines
+    assert 'job_seconds_bucket{kind="diff",le="5"} 2' in lines
+    assert 'job_seconds_bucket{kind="diff",le="+Inf"} 3' in lines
+    assert 'job_seconds_sum{kind="diff"} 13.5' in lines
+    assert 'job_seconds_count{kind="diff"} 3' in lines
+    assert 'job_seconds_count{kind="say \\"hi\\""} 1' in lines
+    assert histogram.count(kind='diff') == 3
+
+    with histogram.time(kind='timed'):
+        pass
+    assert histogram.count(kind='timed') == 1
+    print("✓ PASS: Histogram format")
+
+
+def test_gauges():
+    """Gauges are read at render time; one that fails is left without a value"""
+    registry = Registry()
+    values = {'queued': 2}
+    registry.gauge('runs_queued', 'Queued runs', lambda: values['queued'])
+    registry.gauge('broken', 'Always fails', lambda: 1 / 0)
+    values['queued'] = 3
+
+    lines = registry.render().splitlines()
+    assert '# TYPE runs_queued gauge' in lines and 'runs_queued 3' in lines
+    assert '# TYPE broken gauge' in lines
+    assert not any(line.startswith('broken ') for line in lines)
+
+    try:
+        registry.gauge('runs_queued', 'Again', lambda: 0)
+        assert False, "A metric name can only be registered once"
+    except ValueError:
+        pass
+    print("✓ PASS: Gauges")
+
+
+def test_process_outcome():
+    assert process_outcome(0) == 'success'
+    assert process_outcome(1) == 'error'
+    assert process_outcome(-15) == 'killed'
+    print("✓ PASS: Process outcomes")
+
+
+if __name__ == "__main__":
+    print("Testing metrics...")
+    print("=" * 50)
+    test_histogram_format()
+    test_gauges()
+    test_process_outcome()
+    print("=" * 50)
+    print("All metrics tests passed!")
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Test script for the incremental output summary.
+Checks that lines fed as they arrive give the same text as parsing the whole
+log, and that a saved summary only parses what was written after it.
+"""
+
+import os
+import json
+import tempfile
+
+import output_summary
+from output_summary import OutputSummary, get_summary, start_summary
+
+EVENTS = [
+    {'type': 'system', 'subtype': 'init', 'session_id': 'abc'},
+    {'type': 'assistant', 'message': {'content': [
+        {'type': 'text', 'text': 'Looking at the code'},
+        {'type': 'tool_use', 'id': 'tool_1', 'name': 'Read', 'input': {'file_path': 'app.py'}},
+    ]}},
+    {'type': 'user', 'message': {'content': [{'type': 'tool_result', 'tool_use_id': 'tool_1'}]}},
+    {'type': 'content_block_delta', 'delta': {'text': 'Fixed '}},
+    {'type': 'content_block_delta', 'delta': {'text': 'the bug'}},
+    {'type': 'result', 'subtype': 'success', 'is_error': False, 'result': 'Done', 'num_turns': 2},
+]
+
+
+def write_events(path, events, mode='wb'):
+    with open(path, mode) as f:
+        for event in events:
+            f.write((json.dumps(event) + '\n').encode())
+        f.write(b'not json\n')
+
+
+def test_incremental_summary():
+    """Feeding lines one by one tracks text, tool calls and the result"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'claude_output.jsonl')
+        write_events(path, EVENTS)
+
+        summary = start_summary(path)
+        with open(path, 'rb') as f:
+            for raw in f:
+                summary.feed(raw)
+        summary.close()
+
+        assert summary.text() == 'Fixed the bug' + 'Done\n'
+        assert summary.offset == os.path.getsize(path)
+        assert summary.tool_calls[0]['name'] == 'Read'
+        assert summary.tool_calls[0]['status'] == 'done'
+        assert summary.result['result'] == 'Done'
+        assert summary.result['num_turns'] == 2
+
+        # Once the run is over the summary comes from summary.json
+        saved = get_summary(path)
+        assert saved is not summary
+        assert saved.to_dict() == summary.to_dict()
+        print("✓ PASS: Summary is maintained as lines arrive")
+
+
+def test_catch_up_from_saved_offset():
+    """A saved summary parses only the lines written after it"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'claude_output.jsonl')
+        write_events(path, EVENTS[:2])
+        summary = OutputSummary(path)
+        summary.catch_up()
+        summary.save()
+        saved_offset = summary.offset
+
+        write_events(path, EVENTS[2:], mode='ab')
+        parsed = []
+        original_feed = OutputSummary.feed
+        OutputSummary.feed = lambda self, raw: (parsed.append(raw), original_feed(self, raw))
+        try:
+            caught_up = get_summary(path)
+        finally:
+            OutputSummary.feed = original_feed
+
+        assert sum(len(raw) for raw in parsed) == os.path.getsize(path) - saved_offset
+        assert caught_up.text() == 'Fixed the bug' + 'Done\n'
+        assert caught_up.tool_calls[0]['status'] == 'done'
+
+        # A shorter log than the saved offset means a new run: start over
+        write_events(path, EVENTS[-1:])
+        restarted = get_summary(path)
+        assert restarted.text() == 'Done\n'
+        assert restarted.tool_calls == []
+        assert not os.path.exists(output_summary.get_summary_path(path) + '.tmp')
+        print("✓ PASS: Saved summaries only parse new lines")
+
+
+def test_save_appends_new_text():
+    """Saving writes only the text added since the last save; feeding never saves"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'claude_output.jsonl')
+        write_events(path, EVENTS)
+        text_path = output_summary.get_text_path(path)
+
+        summary = OutputSummary(path)
+        with open(path, 'rb') as f:
+            lines = f.readlines()
+        for raw in lines[:4]:
+            summary.feed(raw)
+        assert not os.path.exists(output_summary.get_summary_path(path))
+        summary.save()
+        with open(text_path, 'rb') as f:
+            assert f.read() == b'Fixed '
+
+        for raw in lines[4:]:
+            summary.feed(raw)
+        summary.save()
+        with open(text_path, 'rb') as f:
+            assert f.read() == b'Fixed the bugDone\n'
+        with open(output_summary.get_summary_path(path)) as f:
+            state = json.load(f)
+        assert 'text' not in state and state['text_bytes'] == len(b'Fixed the bugDone\n')
+
+        # Text appended by a save that never recorded it is ignored
+        with open(text_path, 'ab') as f:
+            f.write(b'partial')
+        assert get_summary(path).text() == 'Fixed the bugDone\n'
+
+        # Summaries saved with the text inline still load
+        state['text'] = 'Fixed the bugDone\n'
+        del state['text_bytes']
+        with open(output_summary.get_summary_path(path), 'w') as f:
+            json.dump(state, f)
+        os.remove(text_path)
+        assert get_summary(path).text() == 'Fixed the bugDone\n'
+        print("✓ PASS: Saves append only the new text")
+
+
+if __name__ == "__main__":
+    print("Testing output summary...")
+    print("=" * 50)
+    test_incremental_summary()
+    test_catch_up_from_saved_offset()
+    test_save_appends_new_text()
+    print("=" * 50)
+    print("All output summary tests passed!")
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Test script for the rendered page cache.
+Checks that ETags follow what a page shows, that Last-Modified only moves when
+the ETag changes, and that bodies are rendered once per version and evicted
+least recently used first.
+"""
+
+from datetime import datetime
+
+from page_cache import PageCache, make_etag
+
+
+def test_validators():
+    """The same parts give the same ETag and Last-Modified; other parts give a new ETag"""
+    cache = PageCache(max_entries=4)
+    task = {'id': 't1', 'status': 'new', 'updated_at': '2024-01-01T00:00:00'}
+    etag, last_modified = cache.validate(('task', 't1'), [task, None])
+    assert cache.validate(('task', 't1'), [dict(task), None]) == (etag, last_modified)
+
+    changed = dict(task, status='started')
+    new_etag, new_last_modified = cache.validate(('task', 't1'), [changed, None])
+    # Even within the same second, so If-Modified-Since alone cannot match an old copy
+    assert new_etag != etag and new_last_modified > last_modified
+
+    # Values JSON cannot encode are compared by their string form
+    assert make_etag([datetime(2024, 1, 1)]) == make_etag([datetime(2024, 1, 1)])
+    assert make_etag([1]) != make_etag(['1', None])
+    print("✓ PASS: Validators")
+
+
+def test_render_once_per_version():
+    """A body is rendered on the first request for a version and reused until the ETag changes"""
+    cache = PageCache(max_entries=4)
+    renders = []
+
+    def render():
+        renders.append(1)
+        return f'<p>render {len(renders)}</p>'
+
+    etag, _ = cache.validate('index', [1])
+    assert cache.get_or_render('index', etag, render) == '<p>render 1</p>'
+    assert cache.get_or_render('index', etag, render) == '<p>render 1</p>'
+    assert len(renders) == 1
+
+    etag, _ = cache.validate('index', [2])
+    assert cache.get_or_render('index', etag, render) == '<p>render 2</p>'
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 2 and stats['pages'] == 1
+    print("✓ PASS: Render once per version")
+
+
+def test_eviction():
+    """Only max_entries bodies are kept; 0 disables body caching"""
+    cache = PageCache(max_entries=2)
+    for key in ('a', 'b', 'c'):
+        cache.get_or_render(key, 'v1', lambda: key)
+    cache.get_or_render('a', 'v1', lambda: 'a again')
+    assert cache.stats()['pages'] == 2
+    assert cache.get_or_render('c', 'v1', lambda: 'c again') == 'c'
+
+    disabled = PageCache(max_entries=0)
+    disabled.get_or_render('a', 'v1', lambda: 'a')
+    assert disabled.stats()['pages'] == 0
+    print("✓ PASS: Eviction")
+
+
+if __name__ == "__main__":
+    print("Testing page cache...")
+    print("=" * 50)
+    test_validators()
+    test_render_once_per_version()
+    test_eviction()
+    print("=" * 50)
+    print("All page cache tests passed!")
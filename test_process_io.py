@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Test script for the Claude process I/O layer.
+Checks that stdout and stderr are drained while the process runs, written to
+their log files and kept in a bounded ring buffer.
+"""
+
+import os
+import subprocess
+import tempfile
+import threading
+
+from process_io import ProcessIO, read_stderr_tail
+
+
+def test_drains_both_streams():
+    """A process writing far more stderr than a pipe buffer holds still completes"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        stdout_path = os.path.join(temp_dir, 'claude_output.jsonl')
+        stderr_path = os.path.join(temp_dir, 'claude_stderr.log')
+        # ~400 KB of stderr, well past the 64 KB pipe buffer
+        script = ('for i in $(seq 1 4000); do '
+                  'echo "warning $i: xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx" >&2; '
+                  'done; echo \'{"result": "done"}\'')
+        process = subprocess.Popen(script, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        exited = threading.Event()
+        process_io = ProcessIO(process, stdout_path, stderr_path, ring_size=100, on_exit=exited.set)
+        process_io.start()
+        assert exited.wait(30), "process stalled"
+
+        assert process_io.finished
+        assert process_io.returncode == 0
+        assert process_io.line_counts == {'stdout': 1, 'stderr': 4000}
+        assert len(process_io.events) == 100
+        assert [event['seq'] for event in process_io.recent()] == list(range(3902, 4002))
+
+        with open(stdout_path) as f:
+            assert f.read() == '{"result": "done"}\n'
+        with open(stderr_path) as f:
+            assert len(f.readlines()) == 4000
+        assert read_stderr_tail(stderr_path, 2)[-1].startswith('warning 4000:')
+        print("✓ PASS: stdout and stderr are drained and persisted")
+
+
+if __name__ == "__main__":
+    print("Testing process I/O...")
+    print("=" * 50)
+    test_drains_both_streams()
+    print("=" * 50)
+    print("All process I/O tests passed!")
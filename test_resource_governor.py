@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Test script for the agent resource governor.
+Checks that processes start under the configured limits in their own process
+group, that their usage is sampled from /proc, and that stopping one stops
+everything it started.
+"""
+
+import os
+import time
+import tempfile
+import subprocess
+
+import resource_governor
+from resource_governor import ResourceMonitor, parse_cpu_list, popen_kwargs, sample_group
+
+
+def test_parse_cpu_list():
+    """CPU lists accept ranges and single CPUs"""
+    assert parse_cpu_list('0-3, 6') == {0, 1, 2, 3, 6}
+    assert parse_cpu_list('') == set()
+    try:
+        parse_cpu_list('a-b')
+        assert False, "A malformed list should be rejected"
+    except ValueError:
+        pass
+    print("✓ PASS: CPU lists")
+
+
+def test_limits_are_applied():
+    """Niceness and the open file limit are set in the child, which leads its own group"""
+    cmd, kwargs = popen_kwargs('ulimit -n; cut -d" " -f19 /proc/self/stat',
+                               {'agent_nice': 5, 'agent_max_open_files': 64})
+    result = subprocess.run(cmd, shell=True, stdout=subprocess.PIPE, text=True, check=True, **kwargs)
+    open_files, nice = result.stdout.split()
+    assert open_files == '64'
+    assert int(nice) == os.getpriority(os.PRIO_PROCESS, 0) + 5
+
+    # Applied by command wrappers, never by Python code between fork and exec
+    assert kwargs == {'start_new_session': True}
+
+    cmd, kwargs = popen_kwargs('ulimit -v; grep Cpus_allowed_list /proc/self/status',
+                               {'agent_nice': 0, 'agent_memory_limit_mb': 512, 'agent_cpu_affinity': '0'})
+    result = subprocess.run(cmd, shell=True, stdout=subprocess.PIPE, text=True, check=True, **kwargs)
+    memory, cpus = result.stdout.splitlines()
+    assert memory == str(512 * 1024)
+    assert cpus.split()[-1] == '0'
+
+    # The wrappers exec the command, so the started process still leads the group
+    cmd, kwargs = popen_kwargs('sleep 5', {'agent_nice': 5, 'agent_max_open_files': 64})
+    process = subprocess.Popen(cmd, shell=True, **kwargs)
+    try:
+        assert os.getpgid(process.pid) == process.pid != os.getpgid(0)
+    finally:
+        os.killpg(process.pid, 9)
+        process.wait()
+    print("✓ PASS: Limits are applied")
+
+
+def test_sample_and_kill_group():
+    """The whole process group is sampled, and killing it stops the children too"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_path = os.path.join(temp_dir, 'claude_output.jsonl')
+        # The shell starts a background child and then waits
+        cmd, kwargs = popen_kwargs('sleep 30 & sleep 30; wait', {})
+        process = subprocess.Popen(cmd, shell=True, **kwargs)
+        monitor = ResourceMonitor()
+        monitor._thread = True  # sample by hand instead of from the background thread
+        try:
+            entry = monitor.register(process, output_path)
+            time.sleep(0.2)
+            usage = sample_group(process.pid)
+            assert usage['processes'] >= 3
+            assert usage['rss_bytes'] > 0
+
+            monitor._sample(entry)
+            monitor._sample(entry)
+            live = monitor.usage(output_path)
+            assert live['running'] and live['current']['processes'] >= 3
+            assert live['current']['cpu_percent'] is not None
+
+            assert monitor.kill(output_path, grace=1)
+            process.wait(5)
+            deadline = time.time() + 5
+            while sample_group(process.pid)['processes'] and time.time() < deadline:
+                time.sleep(0.1)
+            assert sample_group(process.pid)['processes'] == 0
+
+            summary = monitor.finish(output_path)
+            assert summary['running'] is False and summary['killed']
+            assert os.path.exists(os.path.join(temp_dir, resource_governor.USAGE_FILE))
+            assert monitor.usage(output_path)['peak_processes'] >= 3
+            assert monitor.kill(output_path) is False
+        finally:
+            if process.poll() is None:
+                os.killpg(process.pid, 9)
+                process.wait()
+    print("✓ PASS: Process groups are sampled and killed")
+
+
+if __name__ == "__main__":
+    print("Testing resource governor...")
+    print("=" * 50)
+    test_parse_cpu_list()
+    test_limits_are_applied()
+    test_sample_and_kill_group()
+    print("=" * 50)
+    print("All resource governor tests passed!")
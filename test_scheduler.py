@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Test script for the agent scheduler.
+Checks that at most max_concurrent_agents runs are admitted and that queued
+runs start by priority and then by age.
+"""
+
+import time
+import threading
+
+import scheduler
+from scheduler import AgentScheduler
+from jobs import JobError
+
+
+def make_entry(task_id, priority, queued_at, launched):
+    def launch(slot):
+        launched.append((task_id, slot))
+    return {'task_id': task_id, 'priority': priority, 'queued_at': queued_at,
+            'state': 'queued', 'error': None, 'launch': launch}
+
+
+def with_limit(limit, fn):
+    original = scheduler.load_config
+    scheduler.load_config = lambda: {'max_concurrent_agents': limit}
+    try:
+        fn()
+    finally:
+        scheduler.load_config = original
+
+
+def test_priority_order():
+    """Queued runs start highest priority first, then oldest first"""
+    def check():
+        agents = AgentScheduler()
+        launched = []
+        agents._submit(make_entry('running', 'Low', 1, launched))
+        agents._submit(make_entry('low', 'Low', 2, launched))
+        agents._submit(make_entry('medium-new', 'Medium', 4, launched))
+        agents._submit(make_entry('medium-old', 'Medium', 3, launched))
+        agents._submit(make_entry('high', 'High', 5, launched))
+        assert [task_id for task_id, _ in launched] == ['running']
+
+        assert agents.queue_info('high')['position'] == 1
+        assert agents.queue_info('low')['position'] == 4
+        assert agents.queue_info('running') is None
+
+        order = []
+        while launched:
+            task_id, slot = launched.pop(0)
+            order.append(task_id)
+            agents.release(slot)
+        assert order == ['running', 'high', 'medium-old', 'medium-new', 'low']
+        assert agents.stats()['running'] == 0
+        print("✓ PASS: Runs are admitted by priority and age")
+    with_limit(1, check)
+
+
+def test_concurrency_cap_and_estimate():
+    """No more than the configured number of runs are admitted at once"""
+    def check():
+        agents = AgentScheduler()
+        agents._runtimes.extend([100, 100])
+        launched = []
+        for i in range(5):
+            agents._submit(make_entry(f't{i}', 'Medium', i, launched))
+        assert len(launched) == 2
+        assert agents.stats()['queued'] == 3
+
+        # Two slots busy for ~100s each: the 3rd and 4th runs wait ~100s, the 5th ~200s
+        assert 95 <= agents.queue_info('t2')['estimated_wait_seconds'] <= 100
+        assert 95 <= agents.queue_info('t3')['estimated_wait_seconds'] <= 100
+        assert 195 <= agents.queue_info('t4')['estimated_wait_seconds'] <= 200
+
+        assert agents.cancel('t3') == 1
+        agents.release(launched[0][1])
+        assert [task_id for task_id, _ in launched] == ['t0', 't1', 't2']
+        print("✓ PASS: Concurrency is capped and waits are estimated")
+    with_limit(2, check)
+
+
+def test_blocking_run():
+    """run() waits for a slot, calls the function and frees the slot"""
+    def check():
+        agents = AgentScheduler()
+        launched = []
+        agents._submit(make_entry('busy', 'Medium', time.time(), launched))
+        waits = []
+
+        original_interval = scheduler.WAIT_POLL_INTERVAL
+        scheduler.WAIT_POLL_INTERVAL = 0.01
+        try:
+            threading.Timer(0.1, agents.release, args=(launched[0][1],)).start()
+            result = agents.run('missing-task', lambda: 'done', on_wait=waits.append)
+        finally:
+            scheduler.WAIT_POLL_INTERVAL = original_interval
+
+        assert result == 'done'
+        assert waits and waits[0]['position'] == 1
+        assert agents.stats()['running'] == 0
+        print("✓ PASS: Blocking runs wait for a free slot")
+    with_limit(1, check)
+
+
+def test_cancel_blocking_run():
+    """Cancelling a waiting blocking run makes run() fail instead of waiting forever"""
+    def check():
+        agents = AgentScheduler()
+        launched = []
+        agents._submit(make_entry('busy', 'Medium', time.time(), launched))
+        outcome = []
+
+        def wait():
+            try:
+                agents.run('waiting', lambda: outcome.append('ran'))
+            except JobError as e:
+                outcome.append(str(e))
+
+        thread = threading.Thread(target=wait)
+        thread.start()
+        deadline = time.time() + 5
+        while agents.stats()['queued'] == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        assert agents.cancel('waiting') == 1
+        thread.join(5)
+        assert not thread.is_alive(), "run() should return once its entry is cancelled"
+        assert outcome == ['cancelled']
+
+        # The cancelled run never held a slot
+        agents.release(launched[0][1])
+        assert agents.stats()['running'] == 0
+        print("✓ PASS: Cancelled blocking runs return")
+    with_limit(1, check)
+
+
+def test_start_streaming_deleted_task():
+    """Starting a task that no longer exists fails and drops its queued run"""
+    def check():
+        agents = AgentScheduler()
+        launched = []
+        agents._submit(make_entry('busy', 'Medium', 1, launched))
+        agents._submit(make_entry('gone', 'Medium', 2, launched))
+        original = scheduler.get_task
+        scheduler.get_task = lambda task_id: None
+        try:
+            entry = agents.start_streaming('gone', 'streaming')
+        finally:
+            scheduler.get_task = original
+        assert entry['state'] == 'failed' and entry['error'] == 'Task not found'
+        assert agents.queue_info('gone') is None and agents.stats()['queued'] == 0
+
+        agents.release(launched[0][1])
+        assert [task_id for task_id, _ in launched] == ['busy']
+        print("✓ PASS: Deleted tasks are not started")
+    with_limit(1, check)
+
+
+if __name__ == "__main__":
+    print("Testing agent scheduler...")
+    print("=" * 50)
+    test_priority_order()
+    test_concurrency_cap_and_estimate()
+    test_blocking_run()
+    test_cancel_blocking_run()
+    test_start_streaming_deleted_task()
+    print("=" * 50)
+    print("All scheduler tests passed!")
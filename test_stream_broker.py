@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Test script for the live output broker.
+Checks that several viewers of one task share a single tailer, that late
+subscribers get the earlier output exactly once, that a viewer who falls
+behind catches up from disk, and that draining for shutdown ends every feed
+without telling browsers the stream is over.
+"""
+
+import os
+import json
+import tempfile
+import threading
+
+import stream_broker
+from stream_broker import StreamBroker
+
+
+def collect(subscription, into):
+    for event in subscription.events(timeout=5):
+        if event is None:
+            break
+        event_type, data, _ = event
+        if event_type == 'message':
+            into.append(json.loads(data))
+
+
+def test_fan_out():
+    """Subscribers of one task share one tailer and each see every line once"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'claude_output.jsonl')
+        status = {'value': 'streaming'}
+
+        originals = (stream_broker.get_output_file_path, stream_broker.get_task_status,
+                     stream_broker.POLL_INTERVAL, stream_broker.STATUS_CHECK_INTERVAL)
+        stream_broker.get_output_file_path = lambda task_id: path
+        stream_broker.get_task_status = lambda task_id: status['value']
+        stream_broker.POLL_INTERVAL = 0.01
+        stream_broker.STATUS_CHECK_INTERVAL = 0.01
+        try:
+            broker = StreamBroker()
+            with open(path, 'w') as f:
+                f.write(json.dumps({'text': 'one'}) + '\n')
+                f.flush()
+
+                first, second = broker.subscribe('task'), broker.subscribe('task')
+                assert len(broker.stats()) == 1
+                assert broker.stats()['task']['subscribers'] == 2
+
+                first_events, second_events = [], []
+                readers = [threading.Thread(target=collect, args=(first, first_events)),
+                           threading.Thread(target=collect, args=(second, second_events))]
+                for reader in readers:
+                    reader.start()
+
+                # Wait until the first line has been published, then join late
+                while broker.stats()['task']['published'] < 1:
+                    threading.Event().wait(0.01)
+                late = broker.subscribe('task')
+                late_events = []
+                readers.append(threading.Thread(target=collect, args=(late, late_events)))
+                readers[-1].start()
+
+                f.write('plain text\n')
+                f.write(json.dumps({'text': 'partial'}))
+                f.flush()
+                threading.Event().wait(0.1)
+                status['value'] = 'actioned'
+
+            for reader in readers:
+                reader.join(5)
+
+            expected = [{'text': 'one'}, {'text': 'plain text'}, {'text': 'partial'}]
+            assert first_events == expected
+            assert second_events == expected
+            assert late_events == expected
+            assert broker.stats() == {}
+            print("✓ PASS: One tailer serves every subscriber")
+        finally:
+            (stream_broker.get_output_file_path, stream_broker.get_task_status,
+             stream_broker.POLL_INTERVAL, stream_broker.STATUS_CHECK_INTERVAL) = originals
+
+
+def test_resume_from_offset():
+    """A reconnecting viewer gets only the lines after its last event id"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'claude_output.jsonl')
+        with open(path, 'w') as f:
+            f.write('{"text": "one"}\n\n{"text": "two"}\n{"text": "three"}\n')
+
+        originals = (stream_broker.get_output_file_path, stream_broker.get_task_status)
+        stream_broker.get_output_file_path = lambda task_id: path
+        stream_broker.get_task_status = lambda task_id: 'actioned'
+        try:
+            broker = StreamBroker()
+            events = [event for event in broker.subscribe('task').events(timeout=5) if event]
+            ids = [event_id for _, _, event_id in events if event_id is not None]
+            assert ids == [16, 33, 51]
+            assert events[-1][0] == 'end'
+
+            resumed = [event for event in broker.subscribe('task', from_offset=16).events(timeout=5) if event]
+            assert [json.loads(data)['text'] for event_type, data, _ in resumed if event_type == 'message'] == ['two', 'three']
+
+            # An offset past the end of the file belongs to an earlier run
+            restarted = [event for event in broker.subscribe('task', from_offset=1000).events(timeout=5) if event]
+            assert len([event for event in restarted if event[0] == 'message']) == 3
+            print("✓ PASS: Streams resume from the last event id")
+        finally:
+            stream_broker.get_output_file_path, stream_broker.get_task_status = originals
+
+
+def test_overflow_catches_up_from_disk():
+    """A viewer more than a queue's worth of lines behind gets the rest from disk, in order"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'claude_output.jsonl')
+        with open(path, 'w') as f:
+            f.writelines(json.dumps({'text': str(i)}) + '\n' for i in range(50))
+
+        originals = (stream_broker.get_output_file_path, stream_broker.get_task_status,
+                     stream_broker.SUBSCRIBER_QUEUE_SIZE)
+        stream_broker.get_output_file_path = lambda task_id: path
+        stream_broker.get_task_status = lambda task_id: 'actioned'
+        stream_broker.SUBSCRIBER_QUEUE_SIZE = 5
+        try:
+            # The new tailer publishes the whole log at once, far more than the queue holds
+            subscription = StreamBroker().subscribe('task')
+            events = [event for event in subscription.events(timeout=5) if event]
+            texts = [json.loads(data)['text'] for event_type, data, _ in events if event_type == 'message']
+            assert texts == [str(i) for i in range(50)]
+            assert events[-1][0] == 'end'
+            assert subscription.caught_up >= 1
+            print("✓ PASS: Viewers that fall behind catch up from disk")
+        finally:
+            (stream_broker.get_output_file_path, stream_broker.get_task_status,
+             stream_broker.SUBSCRIBER_QUEUE_SIZE) = originals
+
+
+def test_drain():
+    """Draining ends open feeds without an 'end' event and refuses new subscribers"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'claude_output.jsonl')
+        with open(path, 'w') as f:
+            f.write('{"text": "one"}\n')
+
+        originals = (stream_broker.get_output_file_path, stream_broker.get_task_status)
+        stream_broker.get_output_file_path = lambda task_id: path
+        stream_broker.get_task_status = lambda task_id: 'streaming'
+        try:
+            broker = StreamBroker()
+            subscriptions = [broker.subscribe('task'), broker.subscribe('task')]
+            events = [[], []]
+            readers = [threading.Thread(target=lambda s=s, into=into: into.extend(e for e in s.events(timeout=5) if e))
+                       for s, into in zip(subscriptions, events)]
+            for reader in readers:
+                reader.start()
+            while broker.stats()['task']['published'] < 1:
+                threading.Event().wait(0.01)
+
+            assert broker.drain() == 2
+            for reader in readers:
+                reader.join(5)
+                assert not reader.is_alive()
+            for received in events:
+                assert [event_type for event_type, _, _ in received] == ['message']
+            assert broker.subscribe('task') is None
+            print("✓ PASS: Draining ends every feed")
+        finally:
+            stream_broker.get_output_file_path, stream_broker.get_task_status = originals
+
+
+def test_queued_run_keeps_stream_open():
+    """A task waiting for an agent slot keeps its viewers until the run starts and ends"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'claude_output.jsonl')
+        status = {'value': 'queued'}
+
+        originals = (stream_broker.get_output_file_path, stream_broker.get_task_status, stream_broker.get_task,
+                     stream_broker.POLL_INTERVAL, stream_broker.STATUS_CHECK_INTERVAL,
+                     stream_broker.FILE_WAIT_TIMEOUT)
+        stream_broker.get_output_file_path = lambda task_id: path
+        stream_broker.get_task_status = lambda task_id: status['value']
+        stream_broker.get_task = lambda task_id: {'id': task_id, 'status': status['value']}
+        stream_broker.POLL_INTERVAL = 0.01
+        stream_broker.STATUS_CHECK_INTERVAL = 0.01
+        stream_broker.FILE_WAIT_TIMEOUT = 0.05
+        try:
+            assert stream_broker.run_pending('task')
+            subscription = StreamBroker().subscribe('task')
+            events = []
+            reader = threading.Thread(target=lambda: events.extend(
+                event for event in subscription.events(timeout=5) if event))
+            reader.start()
+
+            # Well past the wait for the output file, but the run is still queued
+            threading.Event().wait(0.3)
+            assert events == []
+            with open(path, 'w') as f:
+                f.write(json.dumps({'text': 'started'}) + '\n')
+            status['value'] = 'streaming'
+            threading.Event().wait(0.1)
+            status['value'] = 'actioned'
+            assert not stream_broker.run_pending('task')
+            reader.join(5)
+
+            assert [json.loads(data) for event_type, data, _ in events if event_type == 'message'] == [{'text': 'started'}]
+            assert events[-1][0] == 'end'
+            print("✓ PASS: Queued runs keep their streams open")
+        finally:
+            (stream_broker.get_output_file_path, stream_broker.get_task_status, stream_broker.get_task,
+             stream_broker.POLL_INTERVAL, stream_broker.STATUS_CHECK_INTERVAL,
+             stream_broker.FILE_WAIT_TIMEOUT) = originals
+
+
+if __name__ == "__main__":
+    print("Testing stream broker...")
+    print("=" * 50)
+    test_fan_out()
+    test_resume_from_offset()
+    test_overflow_catches_up_from_disk()
+    test_drain()
+    test_queued_run_keeps_stream_open()
+    print("=" * 50)
+    print("All stream broker tests passed!")
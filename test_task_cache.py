@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Test script for the in-memory task repository.
+Checks that changes made to the store behind the repository's back (another
+process, the migrator) are picked up through the version token, that a write
+made through the repository after such a change does not leave the cache
+stale, and that concurrent updates do not lose writes.
+"""
+
+import os
+import tempfile
+import threading
+
+from task_store import JsonTaskStore, SqliteTaskStore
+from task_cache import TaskRepository
+from test_task_store import make_task
+
+THREADS = 8
+UPDATES_PER_THREAD = 25
+
+
+def stores(temp_dir):
+    """(name, store, a second store on the same data standing in for another process)"""
+    json_path = os.path.join(temp_dir, 'tasks.json')
+    db_path = os.path.join(temp_dir, 'tasks.db')
+    return [('json', JsonTaskStore(json_path), JsonTaskStore(json_path)),
+            ('sqlite', SqliteTaskStore(db_path), SqliteTaskStore(db_path))]
+
+
+def test_external_changes_invalidate():
+    """Edits made directly to the store show up in get(), all() and ticket lookups"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, store, other in stores(temp_dir):
+            store.add_many([make_task('a', 'T-1'), make_task('b', 'T-2')])
+            repository = TaskRepository(lambda: store, check_interval=0)
+            assert repository.get('a')['status'] == 'new'
+            version = repository.version()
+
+            other.update('a', {'status': 'streaming', 'prompt': 'Changed elsewhere'})
+            other.add_many([make_task('c', 'T-3')])
+            other.delete('b')
+
+            assert repository.get('a')['status'] == 'streaming', name
+            assert repository.get('a')['prompt'] == 'Changed elsewhere'
+            assert sorted(task['id'] for task in repository.all()) == ['a', 'c']
+            assert repository.find_by_ticket('T-3')['id'] == 'c'
+            assert repository.find_by_ticket('T-2') is None
+            assert repository.version() != version
+            assert repository.reloads == 2
+
+            # With a check interval the change waits for the next check
+            slow = TaskRepository(lambda: store, check_interval=3600)
+            assert slow.get('a')['status'] == 'streaming'
+            other.update('a', {'status': 'actioned'})
+            assert slow.get('a')['status'] == 'streaming'
+            slow.invalidate()
+            assert slow.get('a')['status'] == 'actioned'
+        print("✓ PASS: External store changes invalidate the cache")
+
+
+def test_write_after_external_change():
+    """A repository write on top of an unseen external write reloads instead of patching a stale cache"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, store, other in stores(temp_dir):
+            store.add_many([make_task('a', 'T-1'), make_task('b', 'T-2')])
+            # Never checks the version on reads, so only the write can notice the change
+            repository = TaskRepository(lambda: store, check_interval=3600)
+            assert repository.get('b')['status'] == 'new'
+
+            other.update('b', {'status': 'completed'})
+            repository.update('a', {'status': 'streaming'})
+
+            assert repository.get('a')['status'] == 'streaming', name
+            assert repository.get('b')['status'] == 'completed', name
+
+            # With no external change in between the write is applied in place
+            reloads = repository.reloads
+            repository.update('b', {'prompt': 'Fix it'})
+            assert repository.get('b')['prompt'] == 'Fix it'
+            assert repository.reloads == reloads
+        print("✓ PASS: Writes after an external change do not leave the cache stale")
+
+
+def test_concurrent_updates_keep_every_write():
+    """Threads updating tasks through the repository at once lose nothing"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, store, other in stores(temp_dir):
+            store.add_many([make_task('a', 'T-1'), make_task('b', 'T-2')])
+            repository = TaskRepository(lambda: store, check_interval=0)
+            repository.all()
+
+            def worker(number):
+                for i in range(UPDATES_PER_THREAD):
+                    task_id = 'a' if (number + i) % 2 else 'b'
+                    repository.update(task_id, {f'field_{number}_{i}': i})
+
+            threads = [threading.Thread(target=worker, args=(number,)) for number in range(THREADS)]
+            if name == 'sqlite':
+                # SQLite serialises writers across connections, so another writer can join in
+                threads.append(threading.Thread(target=lambda: [other.update('a', {f'external_{i}': i})
+                                                                for i in range(UPDATES_PER_THREAD)]))
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            expected = {}
+            for number in range(THREADS):
+                for i in range(UPDATES_PER_THREAD):
+                    expected.setdefault('a' if (number + i) % 2 else 'b', set()).add(f'field_{number}_{i}')
+            if name == 'sqlite':
+                expected['a'].update(f'external_{i}' for i in range(UPDATES_PER_THREAD))
+            for task_id, fields in expected.items():
+                assert fields <= set(store.get(task_id)), (name, task_id)
+                assert fields <= set(repository.get(task_id)), (name, task_id)
+            assert {task['id']: task for task in repository.all()} == \
+                {task['id']: task for task in store.load_all()}
+        print("✓ PASS: Concurrent updates keep every write")
+
+
+if __name__ == "__main__":
+    print("Testing task repository...")
+    print("=" * 50)
+    test_external_changes_invalidate()
+    test_write_after_external_change()
+    test_concurrent_updates_keep_every_write()
+    print("=" * 50)
+    print("All task repository tests passed!")
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Test script for the task list queries behind /api/tasks.
+Checks filtering, search, facet counts, sorting and cursor paging, and that
+the index is rebuilt when the tasks change.
+"""
+
+from task_query import TaskQuery, QueryError, encode_cursor
+
+
+class FakeRepository:
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self._version = 1
+
+    def version(self):
+        return self._version
+
+    def all(self):
+        return list(self.tasks)
+
+    def add(self, task):
+        self.tasks.append(task)
+        self._version += 1
+
+
+def make_tasks(count):
+    priorities = ['High', 'Medium', 'Low']
+    statuses = ['new', 'actioned', 'completed']
+    return [{
+        'id': f'task-{i:03d}',
+        'ticket': f'T-{i}',
+        'task': f'Fix widget {i}' if i % 2 else f'Write docs {i}',
+        'assignee': 'alice' if i % 4 else 'Bob',
+        'priority': priorities[i % 3],
+        'state': 'Open',
+        'status': statuses[i % 3],
+        'created_at': f'2024-01-01T00:{i // 60:02d}:{i % 60:02d}',
+        'artifacts': {'claude_output': {'size': 10}},
+    } for i in range(count)]
+
+
+def test_filters_search_and_facets():
+    """Filters are case-insensitive, facets count over the other filters"""
+    query = TaskQuery(FakeRepository(make_tasks(30)))
+
+    result = query.query({'priority': ['high']}, limit=100)
+    assert result['total'] == 10
+    assert all(task['priority'] == 'High' for task in result['tasks'])
+    assert 'artifacts' not in result['tasks'][0]
+
+    result = query.query({'priority': ['High', 'low'], 'assignee': ['bob']}, limit=100)
+    assert {task['assignee'] for task in result['tasks']} == {'Bob'}
+    assert {task['priority'] for task in result['tasks']} == {'High', 'Low'}
+
+    # Priority facets ignore the priority filter but honour the assignee filter
+    priority_counts = {facet['value']: facet['count'] for facet in result['facets']['priority']}
+    assert [facet['value'] for facet in result['facets']['priority']] == ['High', 'Medium', 'Low']
+    assert sum(priority_counts.values()) == 8  # tasks 0, 4, ..., 28 are Bob's
+
+    result = query.query(q='DOCS', limit=100)
+    assert result['total'] == 15
+    assert all('docs' in task['task'] for task in result['tasks'])
+
+    assert query.query({'status': ['missing']})['total'] == 0
+    print("✓ PASS: Filters, search and facets")
+
+
+def test_cursor_paging():
+    """Walking the cursors visits every task once, in order, in both directions"""
+    tasks = make_tasks(25)
+    query = TaskQuery(FakeRepository(tasks))
+
+    for sort in ('priority', '-created', 'ticket', 'status', '-assignee'):
+        seen = []
+        cursor = None
+        while True:
+            result = query.query(sort=sort, cursor=cursor, limit=7)
+            seen.extend(task['id'] for task in result['tasks'])
+            cursor = result['next_cursor']
+            if cursor is None:
+                break
+        assert len(seen) == 25 and len(set(seen)) == 25
+        if sort == '-created':
+            assert seen == sorted(seen, reverse=True)
+
+    first = query.query(sort='priority', limit=5)
+    assert [task['priority'] for task in first['tasks']] == ['High'] * 5
+
+    try:
+        query.query(sort='created', cursor=first['next_cursor'])
+        assert False, "A cursor from another sort order should be rejected"
+    except QueryError:
+        pass
+    # Well-formed cursors whose key does not fit the sort are rejected too
+    for key in (['a', 'b', 'c'], [1, 'b'], [True, '2024', 'id'], [1, '2024'], [None, '2024', 'id']):
+        try:
+            query.query(sort='priority', cursor=encode_cursor('priority', key))
+            assert False, f"A cursor with key {key} should be rejected"
+        except QueryError:
+            pass
+    try:
+        query.query(sort='colour')
+        assert False, "An unknown sort should be rejected"
+    except QueryError:
+        pass
+    print("✓ PASS: Cursor paging")
+
+
+def test_index_follows_changes():
+    """A new repository version rebuilds the index; otherwise results come from the cache"""
+    repository = FakeRepository(make_tasks(10))
+    query = TaskQuery(repository)
+    first = query.query(limit=3)
+    query.query(cursor=first['next_cursor'], limit=3)
+    assert query.stats()['builds'] == 1 and query.stats()['result_hits'] == 1
+
+    repository.add(dict(make_tasks(1)[0], id='task-new', priority='High', created_at='2023-01-01T00:00:00'))
+    result = query.query(limit=3)
+    assert result['total'] == 11
+    assert result['tasks'][0]['id'] == 'task-new'
+    assert query.stats()['builds'] == 2
+
+    # A cursor from before the change still continues after the row it points at
+    after = query.query(cursor=first['next_cursor'], limit=3)
+    assert after['tasks'][0]['id'] not in {task['id'] for task in first['tasks']}
+    print("✓ PASS: Index follows changes")
+
+
+if __name__ == "__main__":
+    print("Testing task queries...")
+    print("=" * 50)
+    test_filters_search_and_facets()
+    test_cursor_paging()
+    test_index_follows_changes()
+    print("=" * 50)
+    print("All task query tests passed!")
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Test script for the task store backends.
+Exercises the JSON and SQLite stores against the same operations and checks
+that tasks.json can be migrated into SQLite.
+"""
+
+import os
+import json
+import sqlite3
+import tempfile
+
+from task_store import JsonTaskStore, SqliteTaskStore, migrate_json_to_sqlite
+from task_cache import TaskRepository
+
+
+def make_task(task_id, ticket, priority='Medium', status='new'):
+    return {
+        'id': task_id,
+        'ticket': ticket,
+        'task': f'Task for {ticket}',
+        'link': '',
+        'priority': priority,
+        'assignee': 'Tester',
+        'state': 'Ready',
+        'prompt': '',
+        'status': status,
+        'created_at': '2025-01-01T00:00:00',
+        'claude_output': '',
+        'workspace_dir': os.path.join('workspaces', task_id)
+    }
+
+
+def check_store(store):
+    store.add_many([make_task('a', 'T-1', 'High'), make_task('b', 'T-2'), make_task('c', 'T-3', 'Low')])
+
+    assert store.count() == 3
+    assert store.get('b')['ticket'] == 'T-2'
+    assert store.get('missing') is None
+    assert store.find_by_ticket('T-3')['id'] == 'c'
+    assert store.existing_tickets() == {'T-1', 'T-2', 'T-3'}
+
+    updated = store.update('b', {'status': 'streaming', 'prompt': 'Fix it'})
+    assert updated['status'] == 'streaming'
+    assert 'updated_at' in updated
+    assert store.get('b')['prompt'] == 'Fix it'
+    assert store.update('missing', {'status': 'new'}) is None
+
+    updated = store.update_many({'b': {'priority': 'Low'}, 'c': {'state': 'Open'}, 'missing': {'state': 'x'}})
+    assert sorted(t['id'] for t in updated) == ['b', 'c']
+    assert store.get('b')['priority'] == 'Low' and store.get('c')['state'] == 'Open'
+    assert store.update_many({}) == []
+
+    assert store.delete('a')['ticket'] == 'T-1'
+    assert store.delete('a') is None
+    assert [t['id'] for t in store.load_all()] == ['b', 'c']
+
+    store.save_all([make_task('d', 'T-4')])
+    assert [t['id'] for t in store.load_all()] == ['d']
+
+
+def test_json_store():
+    """The JSON store supports single task operations"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'tasks.json')
+        with open(path, 'w') as f:
+            json.dump([], f)
+        check_store(JsonTaskStore(path))
+    print("✓ PASS: JSON task store")
+
+
+def test_sqlite_store():
+    """The SQLite store supports single task operations and is indexed"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'tasks.db')
+        check_store(SqliteTaskStore(path))
+
+        conn = sqlite3.connect(path)
+        journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+        indexes = {row[1] for row in conn.execute("PRAGMA index_list('tasks')")}
+        conn.close()
+
+        assert journal_mode == 'wal'
+        for column in ('id', 'ticket', 'status', 'priority', 'assignee'):
+            assert f'idx_tasks_{column}' in indexes
+    print("✓ PASS: SQLite task store")
+
+
+def test_migrate_json_to_sqlite():
+    """Migrating tasks.json copies every task and refuses to overwrite"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        json_path = os.path.join(temp_dir, 'tasks.json')
+        db_path = os.path.join(temp_dir, 'tasks.db')
+        tasks = [make_task(str(i), f'T-{i}') for i in range(50)]
+        with open(json_path, 'w') as f:
+            json.dump(tasks, f)
+
+        assert migrate_json_to_sqlite(json_path, db_path) == 50
+        assert SqliteTaskStore(db_path).load_all() == tasks
+
+        try:
+            migrate_json_to_sqlite(json_path, db_path)
+            assert False, 'Second migration should be refused'
+        except Exception as e:
+            assert 'already contains tasks' in str(e)
+    print("✓ PASS: JSON to SQLite migration")
+
+
+def test_task_repository_cache():
+    """The repository serves lookups from memory and notices external writes"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = SqliteTaskStore(os.path.join(temp_dir, 'tasks.db'))
+        store.add_many([make_task('a', 'T-1'), make_task('b', 'T-2')])
+        repository = TaskRepository(lambda: store, check_interval=0)
+
+        assert repository.get('a')['ticket'] == 'T-1'
+        assert repository.find_by_ticket('T-2')['id'] == 'b'
+        assert repository.reloads == 1
+
+        # Writes through the repository update the cache without a reload
+        repository.update('a', {'status': 'streaming'})
+        repository.add_many([make_task('c', 'T-3')])
+        repository.delete('b')
+        assert repository.get_status('a') == 'streaming'
+        assert repository.find_by_ticket('T-3')['id'] == 'c'
+        assert repository.get('b') is None
+        assert repository.reloads == 1
+
+        # Writes that bypass the repository are picked up on the next lookup
+        store.update('c', {'status': 'completed'})
+        assert repository.get_status('c') == 'completed'
+        assert repository.reloads == 2
+
+        stats = repository.stats()
+        assert stats['hits'] > 0 and stats['misses'] == 2
+    print("✓ PASS: Task repository cache")
+
+
+if __name__ == "__main__":
+    print("Task Store Test")
+    print("=" * 50)
+    test_json_store()
+    test_sqlite_store()
+    test_migrate_json_to_sqlite()
+    test_task_repository_cache()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Test script for the workspace manager.
+Checks that eviction keeps commits and uncommitted changes in a bundle that
+restores cleanly, that the least recently used workspace goes first, and that
+discarded directories are deleted in the background.
+"""
+
+import os
+import tempfile
+import threading
+import subprocess
+
+import workspace_manager
+from workspace_manager import WorkspaceManager, directory_size
+
+IDENTITY = ['-c', 'user.email=test@example.com', '-c', 'user.name=test']
+
+
+def git(cwd, *args):
+    return subprocess.run(['git', *IDENTITY, *args], cwd=cwd, check=True,
+                          stdout=subprocess.PIPE, text=True).stdout.strip()
+
+
+def make_upstream(path):
+    os.makedirs(path)
+    git(path, 'init', '-q')
+    with open(os.path.join(path, 'a.txt'), 'w') as f:
+        f.write('one\n')
+    git(path, 'add', '.')
+    git(path, 'commit', '-qm', 'init')
+
+
+def clone(upstream, path):
+    subprocess.run(['git', 'clone', '-q', upstream, path], check=True)
+
+
+class FakeTasks:
+    def __init__(self):
+        self.tasks = {}
+
+    def get(self, task_id):
+        return self.tasks.get(task_id)
+
+    def update(self, task_id, updates):
+        self.tasks[task_id].update(updates)
+
+
+def patched(temp_dir, tasks, config=None):
+    originals = (workspace_manager.get_task, workspace_manager.update_task,
+                 workspace_manager.load_config, workspace_manager.OUTPUTS_DIR)
+    workspace_manager.get_task = tasks.get
+    workspace_manager.update_task = tasks.update
+    workspace_manager.load_config = lambda: config or {}
+    workspace_manager.OUTPUTS_DIR = os.path.join(temp_dir, 'outputs')
+    return originals
+
+
+def restore_patches(originals):
+    (workspace_manager.get_task, workspace_manager.update_task,
+     workspace_manager.load_config, workspace_manager.OUTPUTS_DIR) = originals
+
+
+def test_evict_and_restore():
+    """An evicted workspace comes back with its commits and uncommitted changes"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        upstream = os.path.join(temp_dir, 'upstream')
+        make_upstream(upstream)
+        workspaces = os.path.join(temp_dir, 'workspaces')
+        workspace_dir = os.path.join(workspaces, 'task1')
+        clone(upstream, workspace_dir)
+
+        # A local commit, an uncommitted edit, a deletion and an untracked file
+        with open(os.path.join(workspace_dir, 'b.txt'), 'w') as f:
+            f.write('committed\n')
+        git(workspace_dir, 'add', '.')
+        git(workspace_dir, 'commit', '-qm', 'local')
+        head = git(workspace_dir, 'rev-parse', 'HEAD')
+        with open(os.path.join(workspace_dir, 'a.txt'), 'w') as f:
+            f.write('edited\n')
+        os.remove(os.path.join(workspace_dir, 'b.txt'))
+        with open(os.path.join(workspace_dir, 'new.txt'), 'w') as f:
+            f.write('untracked\n')
+        status_before = git(workspace_dir, 'status', '--porcelain')
+
+        tasks = FakeTasks()
+        tasks.tasks['task1'] = {'id': 'task1', 'status': 'actioned', 'workspace_dir': workspace_dir}
+        originals = patched(temp_dir, tasks)
+        try:
+            manager = WorkspaceManager(workspaces)
+            freed = manager.evict(tasks.get('task1'))
+            assert freed > 0
+            assert not os.path.exists(workspace_dir)
+            evicted = tasks.get('task1')['workspace_evicted']
+            assert evicted['head'] == head and evicted['has_changes']
+            assert os.path.exists(evicted['bundle'])
+
+            # The reaper deletes the discarded directory
+            assert os.listdir(manager.trash_dir)
+            manager._reap()
+            assert os.listdir(manager.trash_dir) == []
+
+            manager.restore(tasks.get('task1'), {'github_repo': upstream, 'use_mirror': False})
+            assert git(workspace_dir, 'rev-parse', 'HEAD') == head
+            assert git(workspace_dir, 'status', '--porcelain') == status_before
+            with open(os.path.join(workspace_dir, 'a.txt')) as f:
+                assert f.read() == 'edited\n'
+            assert not os.path.exists(evicted['bundle'])
+        finally:
+            restore_patches(originals)
+        print("✓ PASS: Evicted workspaces restore with their changes")
+
+
+def test_budget_evicts_least_recently_used():
+    """Over budget, the idle workspace used longest ago is evicted first; running ones are kept"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        upstream = os.path.join(temp_dir, 'upstream')
+        make_upstream(upstream)
+        workspaces = os.path.join(temp_dir, 'workspaces')
+        tasks = FakeTasks()
+        for task_id, status in (('old', 'actioned'), ('recent', 'actioned'), ('running', 'streaming')):
+            path = os.path.join(workspaces, task_id)
+            clone(upstream, path)
+            tasks.tasks[task_id] = {'id': task_id, 'status': status, 'workspace_dir': path}
+        os.makedirs(os.path.join(workspaces, '.pool'))
+        one = directory_size(os.path.join(workspaces, 'old'))
+
+        # Room for two of the three workspaces
+        originals = patched(temp_dir, tasks, {'workspace_disk_budget_gb': (2.5 * one) / 1024 ** 3})
+        try:
+            manager = WorkspaceManager(workspaces)
+            manager.touch('old')
+            manager.touch('recent')
+            manager.touch('running')
+            manager._accessed['old'] -= 3600
+            manager._accessed['running'] -= 7200
+            manager.sweep()
+
+            assert not os.path.exists(os.path.join(workspaces, 'old'))
+            assert os.path.exists(os.path.join(workspaces, 'recent'))
+            assert os.path.exists(os.path.join(workspaces, 'running'))
+            assert os.path.exists(os.path.join(workspaces, '.pool'))
+            assert 'workspace_evicted' in tasks.get('old')
+            assert manager.stats()['evicted'] == 1
+            # The evicted workspace's access time is forgotten
+            assert 'old' not in manager._accessed and 'recent' in manager._accessed
+        finally:
+            restore_patches(originals)
+        print("✓ PASS: Least recently used idle workspace is evicted")
+
+
+def test_evict_rechecks_task_under_job_lock():
+    """A task that got a job since the sweep looked at it keeps its workspace"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        upstream = os.path.join(temp_dir, 'upstream')
+        make_upstream(upstream)
+        workspaces = os.path.join(temp_dir, 'workspaces')
+        path = os.path.join(workspaces, 'task1')
+        clone(upstream, path)
+        tasks = FakeTasks()
+        tasks.tasks['task1'] = {'id': 'task1', 'status': 'actioned', 'workspace_dir': path}
+        originals = patched(temp_dir, tasks)
+        try:
+            manager = WorkspaceManager(workspaces)
+            done = []
+
+            def evict():
+                done.append(manager.evict_if_idle('task1'))
+
+            # A job is being submitted: the eviction waits for it, then sees the task is busy
+            with workspace_manager.task_lock('task1'):
+                thread = threading.Thread(target=evict)
+                thread.start()
+                thread.join(0.2)
+                assert not done
+                tasks.tasks['task1']['status'] = 'queued'
+            thread.join()
+            assert done == [0]
+            assert os.path.exists(path)
+            assert 'workspace_evicted' not in tasks.get('task1')
+
+            tasks.tasks['task1']['status'] = 'actioned'
+            assert manager.evict_if_idle('task1') > 0
+            assert not os.path.exists(path)
+            # Already evicted: nothing more to do
+            assert manager.evict_if_idle('task1') == 0
+        finally:
+            restore_patches(originals)
+        print("✓ PASS: Eviction rechecks the task under its job lock")
+
+
+if __name__ == "__main__":
+    print("Testing workspace manager...")
+    print("=" * 50)
+    test_evict_and_restore()
+    test_budget_evicts_least_recently_used()
+    test_evict_rechecks_task_under_job_lock()
+    print("=" * 50)
+    print("All workspace manager tests passed!")
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Test script for the pre-warmed workspace pool.
+Uses the same local bare repository as test_git_mirror.py. Checks that the
+pool fills up to its size and refills below the low-water mark, that handed
+out checkouts point at the real remote, that checkouts are brought up to date
+when the default branch moves, and that an empty pool falls back to a cold
+checkout.
+"""
+
+import os
+import tempfile
+
+import git_mirror
+import workspace_pool
+from workspace_pool import WorkspacePool, create_task_workspace
+from test_git_mirror import git, make_bare_repo, commit_file
+
+
+def patched(temp_dir, config):
+    originals = (git_mirror.MIRRORS_DIR, workspace_pool.load_config, workspace_pool.workspace_pool)
+    git_mirror.MIRRORS_DIR = os.path.join(temp_dir, 'mirrors')
+    workspace_pool.load_config = lambda: config
+    workspace_pool.workspace_pool = WorkspacePool(os.path.join(temp_dir, 'workspaces', '.pool'))
+    return originals
+
+
+def restore_patches(originals):
+    git_mirror.MIRRORS_DIR, workspace_pool.load_config, workspace_pool.workspace_pool = originals
+
+
+def test_acquire_and_refill():
+    """Ready checkouts are handed out once each and refilled below the low-water mark"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        remote, work = make_bare_repo(temp_dir)
+        head = git(work, 'rev-parse', 'HEAD')
+        config = {'github_repo': remote, 'workspace_pool_size': 2}
+        originals = patched(temp_dir, config)
+        try:
+            pool = workspace_pool.workspace_pool
+            pool._maintain()
+            assert pool.stats()['ready'] == 2 and pool.stats()['created'] == 2
+
+            first = os.path.join(temp_dir, 'workspaces', 'task1')
+            assert pool.acquire(remote, first)
+            assert git(first, 'rev-parse', 'HEAD') == head
+            assert git(first, 'remote', 'get-url', 'origin') == remote
+            assert os.path.exists(os.path.join(first, 'a.txt'))
+
+            # One left: at the low-water mark (half the size), so no refill yet
+            pool._maintain()
+            assert pool.stats()['ready'] == 1
+
+            second = os.path.join(temp_dir, 'workspaces', 'task2')
+            assert pool.acquire(remote, second)
+            assert not os.path.samefile(first, second)
+            assert not pool.acquire(remote, os.path.join(temp_dir, 'workspaces', 'task3'))
+            pool._maintain()
+            assert pool.stats()['ready'] == 2
+            assert pool.stats()['hits'] == 2 and pool.stats()['created'] == 4
+
+            # Checkouts of another repository are never handed out
+            assert not pool.acquire(remote + '-other', os.path.join(temp_dir, 'workspaces', 'task4'))
+        finally:
+            restore_patches(originals)
+        print("✓ PASS: Pool hands out checkouts and refills")
+
+
+def test_refresh_stale_checkouts():
+    """When the default branch moves, ready checkouts are reset to it instead of recloned"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        remote, work = make_bare_repo(temp_dir)
+        config = {'github_repo': remote, 'workspace_pool_size': 2, 'mirror_fetch_interval': 0}
+        originals = patched(temp_dir, config)
+        try:
+            pool = workspace_pool.workspace_pool
+            pool._maintain()
+            # Something left behind in a ready checkout is cleaned away by the refresh
+            with open(os.path.join(pool._ready[0]['path'], 'junk.txt'), 'w') as f:
+                f.write('junk\n')
+
+            head = commit_file(work, 'b.txt', 'two\n')
+            pool._maintain()
+            stats = pool.stats()
+            assert stats['refreshed'] == 2 and stats['created'] == 2 and stats['ready'] == 2
+            assert all(entry['head'] == head for entry in pool._ready)
+            assert not any(os.path.exists(os.path.join(entry['path'], 'junk.txt')) for entry in pool._ready)
+
+            workspace = os.path.join(temp_dir, 'workspaces', 'task1')
+            assert pool.acquire(remote, workspace)
+            assert git(workspace, 'rev-parse', 'HEAD') == head
+            assert os.path.exists(os.path.join(workspace, 'b.txt'))
+        finally:
+            restore_patches(originals)
+        print("✓ PASS: Stale checkouts are refreshed")
+
+
+def test_cold_start_when_empty():
+    """With nothing ready a task gets a normal checkout from the mirror"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        remote, work = make_bare_repo(temp_dir)
+        head = git(work, 'rev-parse', 'HEAD')
+        config = {'github_repo': remote, 'workspace_pool_size': 1}
+        originals = patched(temp_dir, config)
+        try:
+            pool = workspace_pool.workspace_pool
+            workspace = os.path.join(temp_dir, 'workspaces', 'task1')
+            assert create_task_workspace(config, workspace) is False
+            assert git(workspace, 'rev-parse', 'HEAD') == head
+            assert git(workspace, 'remote', 'get-url', 'origin') == remote
+            assert pool.stats()['cold_starts'] == 1
+
+            pool._maintain()
+            workspace = os.path.join(temp_dir, 'workspaces', 'task2')
+            assert create_task_workspace(config, workspace) is True
+            assert git(workspace, 'rev-parse', 'HEAD') == head
+            assert pool.stats()['cold_starts'] == 1 and pool.stats()['hits'] == 1
+        finally:
+            restore_patches(originals)
+        print("✓ PASS: Empty pool falls back to a cold checkout")
+
+
+if __name__ == "__main__":
+    print("Testing workspace pool...")
+    print("=" * 50)
+    test_acquire_and_refill()
+    test_refresh_stale_checkouts()
+    test_cold_start_when_empty()
+    print("=" * 50)
+    print("All workspace pool tests passed!")
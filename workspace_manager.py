@@ -0,0 +1,301 @@
+"""
+Workspace disk budget and background cleanup
+
+Task workspaces (workspaces/<task_id>) used to stay on disk until their task
+was deleted or restarted. The workspace manager tracks the size and last
+access time of each one and, when their total goes over the configured budget,
+evicts the least recently used workspaces of tasks that are not running.
+
+Eviction holds the task's job lock (jobs.task_lock) and checks the task again
+under it, so a job submitted for the task at the same time either sees the
+eviction or keeps the workspace from being evicted. Jobs that need the
+workspace fail while it is evicted, until it is restored.
+
+An evicted workspace stays recoverable: anything not already on a remote
+(local commits plus a snapshot commit of the uncommitted and untracked changes)
+is saved as a git bundle in outputs/<task_id>/workspace.bundle, and the task
+records where it was (task['workspace_evicted']). Restoring makes a fresh
+checkout and replays the bundle, leaving the changes uncommitted as they were.
+
+Removing a directory never happens in a request or job: discard() renames it
+into workspaces/.trash/, which is instant, and a background reaper deletes it.
+
+Configured in config.json:
+    workspace_disk_budget_gb  total size workspaces may use before eviction starts (default 0, no limit)
+"""
+import os
+import time
+import uuid
+import json
+import shutil
+import threading
+import subprocess
+from datetime import datetime
+
+from config import WORKSPACES_DIR, OUTPUTS_DIR, load_config
+from task_cache import get_task, update_task
+from jobs import job_queue, task_lock
+from diff_cache import worktree_tree
+from git_mirror import prepare_workspace
+from offload import run_blocking
+
+SWEEP_INTERVAL = 300  # seconds between size measurements and budget checks
+BUNDLE_FILE = 'workspace.bundle'
+SNAPSHOT_REF = 'refs/task-manager/snapshot'
+ACTIVE_STATUSES = ('queued', 'streaming', 'actioning')
+SNAPSHOT_IDENTITY = {
+    'GIT_AUTHOR_NAME': 'Claude Task Manager', 'GIT_AUTHOR_EMAIL': 'task-manager@localhost',
+    'GIT_COMMITTER_NAME': 'Claude Task Manager', 'GIT_COMMITTER_EMAIL': 'task-manager@localhost',
+}
+
+
+def _git(workspace_dir, *args, env=None):
+    result = subprocess.run(['git', *args], cwd=workspace_dir, check=True, env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    return result.stdout.strip()
+
+
+def directory_size(path):
+    """Bytes used by the files under path (without following symlinks)"""
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def get_bundle_path(task_id):
+    return os.path.join(OUTPUTS_DIR, task_id, BUNDLE_FILE)
+
+
+class WorkspaceManager:
+    """Measures workspaces, evicts over budget and reaps discarded directories"""
+
+    def __init__(self, workspaces_dir=WORKSPACES_DIR):
+        self.workspaces_dir = workspaces_dir
+        self.trash_dir = os.path.join(workspaces_dir, '.trash')
+        self.access_file = os.path.join(workspaces_dir, '.access.json')
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._sizes = {}  # task_id -> {'size': bytes, 'measured_at': time}
+        self._accessed = self._load_access()
+        self.evicted = 0
+        self.reaped = 0
+        self.last_sweep = None
+        self.last_error = None
+
+    def _load_access(self):
+        try:
+            with open(self.access_file, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_access(self):
+        with self._lock:
+            accessed = dict(self._accessed)
+        tmp_path = self.access_file + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(accessed, f)
+        os.replace(tmp_path, self.access_file)
+
+    def start(self):
+        """Start the background sweep and reaper thread (idempotent)"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        next_sweep = 0
+        while True:
+            try:
+                self._reap()
+                if time.time() >= next_sweep:
+                    next_sweep = time.time() + SWEEP_INTERVAL
+                    self.sweep()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"DEBUG: Workspace manager error: {e}")
+            self._wake.wait(SWEEP_INTERVAL)
+            self._wake.clear()
+
+    def touch(self, task_id):
+        """Record that a task's workspace was just used"""
+        with self._lock:
+            self._accessed[task_id] = time.time()
+
+    def last_access(self, task_id):
+        path = os.path.join(self.workspaces_dir, task_id)
+        with self._lock:
+            accessed = self._accessed.get(task_id, 0)
+        try:
+            return max(accessed, os.path.getmtime(path))
+        except OSError:
+            return accessed
+
+    def discard(self, path):
+        """Remove a directory without waiting: move it to the trash for the reaper"""
+        if not path or not os.path.exists(path):
+            return
+        os.makedirs(self.trash_dir, exist_ok=True)
+        target = os.path.join(self.trash_dir, f"{os.path.basename(path)}-{uuid.uuid4().hex[:8]}")
+        try:
+            os.rename(path, target)
+        except OSError as e:
+            # Not on the same filesystem: fall back to deleting in place
+            print(f"DEBUG: Could not move {path} to trash ({e}); deleting it directly")
+            shutil.rmtree(path, ignore_errors=True)
+            return
+        self._wake.set()
+
+    def _reap(self):
+        if not os.path.isdir(self.trash_dir):
+            return
+        for name in os.listdir(self.trash_dir):
+            shutil.rmtree(os.path.join(self.trash_dir, name), ignore_errors=True)
+            self.reaped += 1
+
+    def _is_evictable(self, task):
+        return (task['status'] not in ACTIVE_STATUSES
+                and not job_queue.is_active(task.get('job_id')))
+
+    def sweep(self):
+        """Measure workspaces and evict the least recently used ones while over budget"""
+        budget = float(load_config().get('workspace_disk_budget_gb', 0)) * 1024 ** 3
+        candidates = []
+        total = 0
+        for task_id in os.listdir(self.workspaces_dir):
+            path = os.path.join(self.workspaces_dir, task_id)
+            if task_id.startswith('.') or not os.path.isdir(path):
+                continue
+            task = get_task(task_id)
+            if task is None:
+                # Left behind by a task that no longer exists
+                self.discard(path)
+                continue
+            accessed = self.last_access(task_id)
+            with self._lock:
+                measured = self._sizes.get(task_id)
+            # Idle workspaces keep their last measurement; walking them again would find the same size
+            if (measured is None or accessed >= measured['measured_at']
+                    or task['status'] in ACTIVE_STATUSES):
+                measured = {'size': run_blocking(directory_size, path), 'measured_at': time.time()}
+                with self._lock:
+                    self._sizes[task_id] = measured
+            total += measured['size']
+            if os.path.abspath(task.get('workspace_dir') or '') == os.path.abspath(path):
+                candidates.append((task['status'] != 'completed', accessed, task_id))
+
+        if budget:
+            for _, _, task_id in sorted(candidates):
+                if total <= budget:
+                    break
+                try:
+                    total -= self.evict_if_idle(task_id)
+                except subprocess.CalledProcessError as e:
+                    print(f"DEBUG: Could not evict workspace of task {task_id}: {e.stderr}")
+
+        # Forget workspaces that are gone (task deleted or workspace evicted)
+        with self._lock:
+            for entries in (self._sizes, self._accessed):
+                for task_id in list(entries):
+                    if not os.path.isdir(os.path.join(self.workspaces_dir, task_id)):
+                        del entries[task_id]
+        self._save_access()
+        self.last_sweep = time.time()
+
+    def evict_if_idle(self, task_id):
+        """Evict the task's workspace unless a job started using it; returns the bytes freed"""
+        # Same lock as job submission: no job can start for the task until eviction is recorded
+        with task_lock(task_id):
+            task = get_task(task_id)
+            if task is None or task.get('workspace_evicted') or not self._is_evictable(task):
+                return 0
+            return self.evict(task)
+
+    def evict(self, task):
+        """Bundle anything not on a remote, then discard the workspace; returns the bytes freed"""
+        task_id = task['id']
+        workspace_dir = task['workspace_dir']
+        head = _git(workspace_dir, 'rev-parse', 'HEAD')
+        branch = _git(workspace_dir, 'rev-parse', '--abbrev-ref', 'HEAD')
+
+        # Commit the uncommitted and untracked changes (without touching the branch or index)
+        tree = worktree_tree(workspace_dir)
+        has_changes = tree != _git(workspace_dir, 'rev-parse', 'HEAD^{tree}')
+        snapshot = head
+        if has_changes:
+            snapshot = _git(workspace_dir, 'commit-tree', tree, '-p', head, '-m', 'Workspace snapshot',
+                            env=dict(os.environ, **SNAPSHOT_IDENTITY))
+        _git(workspace_dir, 'update-ref', SNAPSHOT_REF, snapshot)
+
+        bundle_path = None
+        if int(_git(workspace_dir, 'rev-list', '--count', SNAPSHOT_REF, '--not', '--remotes')):
+            bundle_path = get_bundle_path(task_id)
+            os.makedirs(os.path.dirname(bundle_path), exist_ok=True)
+            _git(workspace_dir, 'bundle', 'create', os.path.abspath(bundle_path), SNAPSHOT_REF, '--not', '--remotes')
+
+        with self._lock:
+            size = self._sizes.get(task_id, {}).get('size')
+        size = size or run_blocking(directory_size, workspace_dir)
+        update_task(task_id, {'workspace_evicted': {
+            'evicted_at': datetime.now().isoformat(),
+            'size': size,
+            'head': head,
+            'branch': branch,
+            'has_changes': has_changes,
+            'bundle': bundle_path,
+        }})
+        self.discard(workspace_dir)
+        with self._lock:
+            self._sizes.pop(task_id, None)
+            self._accessed.pop(task_id, None)
+        self.evicted += 1
+        print(f"DEBUG: Evicted workspace of task {task_id} ({size} bytes, bundle {bundle_path})")
+        return size
+
+    def restore(self, task, config):
+        """Recreate an evicted workspace with its commits and uncommitted changes.
+
+        Raises subprocess.CalledProcessError if a git step fails.
+        """
+        evicted = task['workspace_evicted']
+        workspace_dir = task['workspace_dir']
+        prepare_workspace(config, workspace_dir)
+        if evicted.get('bundle'):
+            _git(workspace_dir, 'fetch', '-q', os.path.abspath(evicted['bundle']), f'{SNAPSHOT_REF}:{SNAPSHOT_REF}')
+        if evicted['branch'] == 'HEAD':
+            _git(workspace_dir, 'checkout', '-q', '--detach', evicted['head'])
+        else:
+            _git(workspace_dir, 'checkout', '-q', '-B', evicted['branch'], evicted['head'])
+        if evicted.get('has_changes'):
+            # Put the snapshot's files in place, then unstage them so they are uncommitted again
+            _git(workspace_dir, 'read-tree', '-u', '--reset', SNAPSHOT_REF)
+            _git(workspace_dir, 'reset', '-q')
+        if evicted.get('bundle') and os.path.exists(evicted['bundle']):
+            os.remove(evicted['bundle'])
+        self.touch(task['id'])
+
+    def stats(self):
+        with self._lock:
+            sizes = dict(self._sizes)
+        trash = os.listdir(self.trash_dir) if os.path.isdir(self.trash_dir) else []
+        return {
+            'workspaces': len(sizes),
+            'total_size': sum(entry['size'] for entry in sizes.values()),
+            'budget_gb': float(load_config().get('workspace_disk_budget_gb', 0)),
+            'evicted': self.evicted,
+            'pending_deletes': len(trash),
+            'reaped': self.reaped,
+            'last_sweep': self.last_sweep,
+            'last_error': self.last_error,
+        }
+
+
+workspace_manager = WorkspaceManager()
@@ -0,0 +1,222 @@
+"""
+Pre-warmed workspace pool
+
+A background thread keeps a number of clean checkouts of the configured
+repository's default branch ready under workspaces/.pool/. Starting a task
+takes one of them and renames it into workspaces/<task_id>, which is atomic
+and instant. When the pool runs dry the task falls back to a normal checkout
+from the mirror (a "cold start").
+
+Configured in config.json:
+    workspace_pool_size       number of ready checkouts to keep (0 disables the pool)
+    workspace_pool_low_water  refill the pool when fewer than this many are ready
+"""
+import os
+import time
+import uuid
+import shutil
+import threading
+import subprocess
+
+from config import WORKSPACES_DIR, load_config
+from workspace_manager import workspace_manager
+from git_mirror import (
+    DEFAULT_FETCH_INTERVAL, run_git, get_mirror_dir, update_mirror,
+    prepare_workspace, record_workspace_creation
+)
+
+POOL_DIR = os.path.join(WORKSPACES_DIR, '.pool')
+POLL_INTERVAL = 5  # seconds between pool maintenance passes
+
+
+def _pool_settings(config):
+    size = int(config.get('workspace_pool_size', 0))
+    low_water = int(config.get('workspace_pool_low_water', max(1, size // 2)))
+    return size, min(low_water, size)
+
+
+class WorkspacePool:
+    """Keeps ready checkouts of the default branch and hands them to tasks"""
+
+    def __init__(self, pool_dir=POOL_DIR):
+        self.pool_dir = pool_dir
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._repo_url = None
+        self._ready = []  # [{'path': ..., 'head': ...}]
+        self.hits = 0
+        self.cold_starts = 0
+        self.created = 0
+        self.refreshed = 0
+        self.last_error = None
+
+    def start(self):
+        """Start the background maintenance thread (idempotent)"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self._maintain()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"DEBUG: Workspace pool error: {e}")
+            self._wake.wait(POLL_INTERVAL)
+            self._wake.clear()
+
+    def _repo_pool_dir(self, repo_url):
+        return os.path.join(self.pool_dir, os.path.basename(get_mirror_dir(repo_url)))
+
+    def _drain(self):
+        with self._lock:
+            self._ready = []
+            self._repo_url = None
+        if os.path.exists(self.pool_dir):
+            shutil.rmtree(self.pool_dir, ignore_errors=True)
+
+    def _scan(self, repo_dir):
+        """Rebuild the ready list from checkouts left by a previous run"""
+        ready = []
+        os.makedirs(repo_dir, exist_ok=True)
+        for name in os.listdir(repo_dir):
+            path = os.path.join(repo_dir, name)
+            if name.startswith('.'):
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            try:
+                head = run_git('rev-parse HEAD', cwd=path).stdout.strip()
+                ready.append({'path': path, 'head': head})
+            except subprocess.CalledProcessError:
+                shutil.rmtree(path, ignore_errors=True)
+        return ready
+
+    def _maintain(self):
+        config = load_config()
+        repo_url = config.get('github_repo')
+        size, low_water = _pool_settings(config)
+
+        if not size or not repo_url or not config.get('use_mirror', True):
+            if self._ready or os.path.exists(self.pool_dir):
+                self._drain()
+            return
+
+        repo_dir = self._repo_pool_dir(repo_url)
+        if repo_url != self._repo_url:
+            # Repository changed (or first run): discard checkouts of anything else
+            if os.path.exists(self.pool_dir):
+                for name in os.listdir(self.pool_dir):
+                    if os.path.join(self.pool_dir, name) != repo_dir:
+                        shutil.rmtree(os.path.join(self.pool_dir, name), ignore_errors=True)
+            ready = self._scan(repo_dir)
+            with self._lock:
+                self._repo_url = repo_url
+                self._ready = ready
+
+        mirror_dir = update_mirror(repo_url, config.get('mirror_fetch_interval', DEFAULT_FETCH_INTERVAL))
+        head = run_git('rev-parse HEAD', cwd=mirror_dir).stdout.strip()
+
+        # Bring checkouts up to date when the default branch has moved upstream
+        with self._lock:
+            stale = [entry for entry in self._ready if entry['head'] != head]
+            self._ready = [entry for entry in self._ready if entry['head'] == head]
+        for entry in stale:
+            self._refresh(entry, head)
+
+        with self._lock:
+            ready_count = len(self._ready)
+            excess = self._ready[size:]
+            self._ready = self._ready[:size]
+        for entry in excess:
+            shutil.rmtree(entry['path'], ignore_errors=True)
+
+        if ready_count < low_water:
+            for _ in range(size - ready_count):
+                self._create(repo_dir, mirror_dir, head)
+
+    def _create(self, repo_dir, mirror_dir, head):
+        name = uuid.uuid4().hex
+        building = os.path.join(repo_dir, f'.building-{name}')
+        run_git(f'clone --shared "{os.path.abspath(mirror_dir)}" "{building}"')
+        path = os.path.join(repo_dir, name)
+        os.rename(building, path)
+        with self._lock:
+            self._ready.append({'path': path, 'head': head})
+            self.created += 1
+
+    def _refresh(self, entry, head):
+        try:
+            run_git('fetch --prune origin', cwd=entry['path'])
+            run_git(f'reset --hard {head}', cwd=entry['path'])
+            run_git('clean -fdx', cwd=entry['path'])
+        except subprocess.CalledProcessError:
+            shutil.rmtree(entry['path'], ignore_errors=True)
+            return
+        with self._lock:
+            self._ready.append({'path': entry['path'], 'head': head})
+            self.refreshed += 1
+
+    def acquire(self, repo_url, workspace_dir):
+        """Move a ready checkout to workspace_dir. Returns False if none was available."""
+        with self._lock:
+            if repo_url != self._repo_url or not self._ready:
+                return False
+            entry = self._ready.pop(0)
+        self._wake.set()
+
+        started = time.time()
+        try:
+            os.rename(entry['path'], workspace_dir)
+            run_git(f'remote set-url origin "{repo_url}"', cwd=workspace_dir)
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"DEBUG: Could not use pooled workspace {entry['path']}: {e}")
+            shutil.rmtree(workspace_dir, ignore_errors=True)
+            return False
+        record_workspace_creation(repo_url, time.time() - started)
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def record_cold_start(self):
+        with self._lock:
+            self.cold_starts += 1
+        self._wake.set()
+
+    def stats(self):
+        config = load_config()
+        size, low_water = _pool_settings(config)
+        with self._lock:
+            return {
+                'size': size,
+                'low_water': low_water,
+                'ready': len(self._ready),
+                'hits': self.hits,
+                'cold_starts': self.cold_starts,
+                'created': self.created,
+                'refreshed': self.refreshed,
+                'last_error': self.last_error,
+            }
+
+
+workspace_pool = WorkspacePool()
+
+
+def create_task_workspace(config, workspace_dir):
+    """Give a task a fresh checkout, from the pool if possible.
+
+    Raises subprocess.CalledProcessError if a cold checkout fails.
+    """
+    # Move any previous checkout aside; it is deleted in the background
+    workspace_manager.discard(workspace_dir)
+
+    if workspace_pool.acquire(config['github_repo'], workspace_dir):
+        return True
+
+    if _pool_settings(config)[0]:
+        workspace_pool.record_cold_start()
+    prepare_workspace(config, workspace_dir)
+    return False